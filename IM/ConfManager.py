@@ -100,7 +100,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                         else:
                             self.log_warn("Configuration process of VM %s in unfinished state." % vm.im_id)
                         # Force to save the data to store the log data ()
-                        IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                        IM.InfrastructureList.InfrastructureList.save_data(self.inf)
                 else:
                     # General Infrastructure tasks
                     if vm.is_ctxt_process_running():
@@ -117,7 +117,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                         else:
                             self.log_warn("Configuration process of master node in unfinished state.")
                         # Force to save the data to store the log data
-                        IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                        IM.InfrastructureList.InfrastructureList.save_data(self.inf)
 
         return res
 
@@ -334,7 +334,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                             # assigned
                             vm.ctxt_pid = VirtualMachine.WAIT_TO_PID
                         # Force to save the data to store the log data
-                        IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                        IM.InfrastructureList.InfrastructureList.save_data(self.inf)
                 else:
                     # Launch the Infrastructure tasks
                     vm.configured = None
@@ -347,7 +347,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                         vms_configuring[step] = []
                     vms_configuring[step].append(vm)
                     # Force to save the data to store the log data
-                    IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                    IM.InfrastructureList.InfrastructureList.save_data(self.inf)
 
                 last_step = step
 
@@ -889,7 +889,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                 self.inf.ansible_configured = True
                 self.inf.set_configured(True)
                 # Force to save the data to store the log data
-                IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                IM.InfrastructureList.InfrastructureList.save_data(self.inf)
             else:
                 self.inf.ansible_configured = False
                 self.inf.set_configured(False)
@@ -957,7 +957,7 @@ class ConfManager(LoggerMixin, threading.Thread):
                 self.change_master_credentials(ssh)
 
                 # Force to save the data to store the log data
-                IM.InfrastructureList.InfrastructureList.save_data(self.inf.id)
+                IM.InfrastructureList.InfrastructureList.save_data(self.inf)
 
                 self.inf.set_configured(True)
             except Exception:
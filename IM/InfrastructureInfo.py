@@ -23,10 +23,12 @@ import json
 import IM.ConfManager
 from datetime import datetime, timedelta
 from radl.radl import RADL, Feature, deploy, system, contextualize_item
-from radl.radl_parse import parse_radl
 from radl.radl_json import radlToSimple
 from IM.openid.JWT import JWT
 from IM.config import Config
+from IM.serialization import DataSerializer, RadlFragments, LazyAttribute, LazyValue
+from IM.events import ChangeEvents, NotifiedAttribute
+from IM.logbuffer import LogAttribute
 try:
     from Queue import PriorityQueue
 except ImportError:
@@ -63,7 +65,7 @@ class IncorrectStateException(Exception):
         self.message = msg
 
 
-class InfrastructureInfo:
+class InfrastructureInfo(object):
     """
     Stores all the information about a registered infrastructure.
     """
@@ -73,6 +75,37 @@ class InfrastructureInfo:
 
     FAKE_SYSTEM = "F0000__FAKE_SYSTEM__"
     OPENID_USER_PREFIX = "__OPENID__"
+    SEARCH_SEPARATOR = "\x1e"
+
+    @staticmethod
+    def _load_extra_info(extra_info):
+        """ Deserialize the extra_info of an Inf loaded from the DB """
+        if extra_info and "TOSCA" in extra_info:
+            try:
+                extra_info['TOSCA'] = Tosca.deserialize(extra_info['TOSCA'])
+            except Exception:
+                del extra_info['TOSCA']
+                InfrastructureInfo.logger.exception("Error deserializing TOSCA document")
+        return extra_info
+
+    @staticmethod
+    def _serialize_extra_info(extra_info):
+        """ Serialize the extra_info to be stored in the DB """
+        if extra_info and "TOSCA" in extra_info:
+            return {'TOSCA': extra_info['TOSCA'].serialize()}
+        return extra_info
+
+    radl = LazyAttribute('radl', RadlFragments.parse)
+    """RADL of the Inf (parsed on first access if loaded from the DB)."""
+
+    extra_info = LazyAttribute('extra_info', lambda data: InfrastructureInfo._load_extra_info(data))
+    """Extra information about the Inf (TOSCA loaded on first access if loaded from the DB)."""
+
+    configured = NotifiedAttribute('configured', lambda inf: inf.__dict__.get('id'))
+    """Configure flag (its changes are published to the ChangeEvents of the Inf)."""
+
+    cont_out = LogAttribute('cont_out', lambda inf: (inf.id, -1) if inf.__dict__.get('id') else None)
+    """Contextualization output message (the older parts are moved to the DB if it grows too much)."""
 
     def __init__(self):
         self._lock = threading.Lock()
@@ -111,19 +144,36 @@ class InfrastructureInfo:
         """ Extra information about the Infrastructure."""
         self.last_access = datetime.now()
         """ Time of the last access to this Inf. """
+        self.creation_date = int(time.time())
+        """ Creation time of this Inf (in secs since the epoch). None in the Infs created by previous versions. """
         self.snapshots = []
         """ List of URLs of snapshots made to this Inf that must be deleted on finalization """
         self.adding = False
         """Flag to specify that this Inf is adding resources """
         self.deleting = False
         """Flag to specify that this Inf is deleting resources """
+        self.db_rows = {}
+        """Digest and version of the rows of this Inf stored in the DB, to save only the changed ones """
+        self.db_lock = threading.Lock()
+        """Threading Lock to avoid concurrent saves of this Inf in the DB."""
 
-    def serialize(self):
+    def serialize(self, include_vms=True, compress=False):
+        """
+        Serialize this Inf in JSON format or in the compressed format, where
+        the RADL fragments shared by the Inf and the VMs are stored only once.
+
+        Args:
+
+        - include_vms(bool): Flag to include the list of VMs in the data.
+        - compress(bool): Flag to use the compressed format instead of JSON.
+        """
         with self._lock:
             odict = self.__dict__.copy()
         # Quit the ConfManager object and the lock to the data to be stored
         del odict['cm']
         del odict['_lock']
+        del odict['db_rows']
+        del odict['db_lock']
         del odict['ctxt_tasks']
         del odict['conf_threads']
         del odict['adding']
@@ -132,38 +182,71 @@ class InfrastructureInfo:
             del odict['last_access']
         if odict['vm_master']:
             odict['vm_master'] = odict['vm_master'].im_id
-        vm_list = []
-        for vm in odict['vm_list']:
-            vm_list.append(vm.serialize())
-        odict['vm_list'] = vm_list
+        odict['cont_out'] = InfrastructureInfo.cont_out.get_data(self, compress)
+        fragments = RadlFragments() if compress else None
+        if include_vms:
+            vm_list = []
+            for vm in odict['vm_list']:
+                vm_list.append(vm.serialize(fragments=fragments))
+            odict['vm_list'] = vm_list
+        else:
+            del odict['vm_list']
         if odict['auth']:
             odict['auth'] = odict['auth'].serialize()
         if odict['radl']:
-            odict['radl'] = str(odict['radl'])
-        if odict['extra_info'] and "TOSCA" in odict['extra_info']:
-            odict['extra_info'] = {'TOSCA': odict['extra_info']['TOSCA'].serialize()}
+            if compress:
+                odict['radl'] = fragments.add(LazyAttribute.get_data(odict['radl'], None))
+            else:
+                odict['radl'] = RadlFragments.to_str(LazyAttribute.get_data(odict['radl'], None))
+        odict['extra_info'] = LazyAttribute.get_data(odict['extra_info'], InfrastructureInfo._serialize_extra_info)
+        if compress:
+            odict['radl_fragments'] = fragments.fragments
+            return DataSerializer.dumps(odict)
         return json.dumps(odict)
 
+    def serialize_rows(self):
+        """
+        Serialize this Inf as a header without the VMs plus the data of each VM,
+        to store them in different DB rows.
+
+        Returns: a tuple with the header data and a list of tuples (VM ID, VM data)
+        """
+        with self._lock:
+            vm_list = list(self.vm_list)
+        return (self.serialize(include_vms=False, compress=True),
+                [(vm.im_id, vm.serialize(compress=True)) for vm in vm_list])
+
     @staticmethod
-    def deserialize(str_data):
+    def deserialize(str_data, vm_list=None):
+        """
+        Create an Inf from its serialized data
+
+        Args:
+
+        - str_data(str): Data of the Inf in any of the supported formats.
+        - vm_list(list of str): Data of the VMs in case of they are not included in str_data.
+        """
         newinf = InfrastructureInfo()
-        dic = json.loads(str_data)
-        vm_list = dic['vm_list']
+        dic = DataSerializer.loads(str_data)
+        fragments = RadlFragments(dic.pop('radl_fragments', None))
+        if 'vm_list' in dic:
+            vm_list = dic['vm_list']
+        elif vm_list is None:
+            vm_list = []
         vm_master_id = dic['vm_master']
         dic['vm_master'] = None
         dic['vm_list'] = []
         if dic['auth']:
             dic['auth'] = Authentication.deserialize(dic['auth'])
+        # The RADL and the TOSCA documents are parsed when they are accessed
         if dic['radl']:
-            dic['radl'] = parse_radl(dic['radl'])
+            dic['radl'] = LazyValue(fragments.get(dic['radl']))
         else:
             dic['radl'] = RADL()
         if 'extra_info' in dic and dic['extra_info'] and "TOSCA" in dic['extra_info']:
-            try:
-                dic['extra_info']['TOSCA'] = Tosca.deserialize(dic['extra_info']['TOSCA'])
-            except Exception:
-                del dic['extra_info']['TOSCA']
-                InfrastructureInfo.logger.exception("Error deserializing TOSCA document")
+            dic['extra_info'] = LazyValue(dic['extra_info'])
+        if 'creation_date' not in dic:
+            dic['creation_date'] = None
         newinf.__dict__.update(dic)
         newinf.cloud_connector = None
         # Set the ConfManager object and the lock to the data loaded
@@ -171,7 +254,7 @@ class InfrastructureInfo:
         newinf.ctxt_tasks = PriorityQueue()
         newinf.conf_threads = []
         for vm_data in vm_list:
-            vm = VirtualMachine.deserialize(vm_data)
+            vm = VirtualMachine.deserialize(vm_data, fragments)
             vm.inf = newinf
             if vm.im_id == vm_master_id:
                 newinf.vm_master = vm
@@ -186,7 +269,7 @@ class InfrastructureInfo:
         Only Loads auth data
         """
         newinf = InfrastructureInfo()
-        dic = json.loads(str_data)
+        dic = DataSerializer.loads(str_data)
         newinf.deleted = dic['deleted']
         newinf.id = dic['id']
         if dic['auth']:
@@ -224,6 +307,7 @@ class InfrastructureInfo:
         """
         self.stop()
         self.deleted = True
+        ChangeEvents.publish(self.id, remove=True)
 
     def stop(self):
         """
@@ -259,7 +343,7 @@ class InfrastructureInfo:
         # Set the Infrastructure as deleted
         self.delete()
         InfrastructureInfo.logger.info("Inf ID: %s: Successfully destroyed" % self.id)
-        IM.InfrastructureList.InfrastructureList.save_data(self.id)
+        IM.InfrastructureList.InfrastructureList.save_data(self, sync=True)
         IM.InfrastructureList.InfrastructureList.remove_inf(self)
 
     def get_cont_out(self):
@@ -281,7 +365,8 @@ class InfrastructureInfo:
             if vm.creation_im_id is None:
                 vm.creation_im_id = vm.im_id
             self.vm_list.append(vm)
-        IM.InfrastructureList.InfrastructureList.save_data(self.id)
+        ChangeEvents.publish(self.id)
+        IM.InfrastructureList.InfrastructureList.save_data(self)
 
     def add_cont_msg(self, msg):
         """
@@ -291,7 +376,7 @@ class InfrastructureInfo:
             str_msg = str(msg.decode('utf8', 'ignore'))
         except Exception:
             str_msg = msg
-        self.cont_out += str(datetime.now()) + ": " + str_msg + "\n"
+        InfrastructureInfo.cont_out.append(self, str(datetime.now()) + ": " + str_msg + "\n")
 
     def remove_creating_vms(self):
         """
@@ -308,6 +393,50 @@ class InfrastructureInfo:
             res = [vm for vm in self.vm_list if not vm.destroy]
         return res
 
+    def get_aggregated_state(self, vm_list=None):
+        """ Get the aggregated state of the infrastructure from the current state of its VMs """
+        if vm_list is None:
+            vm_list = self.get_vm_list()
+        state = None
+        for vm in vm_list:
+            if vm.state == VirtualMachine.FAILED:
+                state = VirtualMachine.FAILED
+                break
+            elif vm.state == VirtualMachine.UNKNOWN:
+                state = VirtualMachine.UNKNOWN
+                break
+            elif vm.state == VirtualMachine.PENDING:
+                state = VirtualMachine.PENDING
+            elif vm.state == VirtualMachine.RUNNING:
+                if state != VirtualMachine.PENDING:
+                    state = VirtualMachine.RUNNING
+            elif vm.state == VirtualMachine.STOPPED:
+                if state is None:
+                    state = VirtualMachine.STOPPED
+            elif vm.state == VirtualMachine.OFF:
+                if state is None:
+                    state = VirtualMachine.OFF
+            elif vm.state == VirtualMachine.CONFIGURED:
+                if state is None:
+                    state = VirtualMachine.CONFIGURED
+            elif vm.state == VirtualMachine.UNCONFIGURED:
+                if state is None or state == VirtualMachine.CONFIGURED:
+                    state = VirtualMachine.UNCONFIGURED
+
+        if state is None:
+            if self.configured is False:
+                state = VirtualMachine.FAILED
+            elif not vm_list and self.configured is None:
+                # if there are no vms we probably are in the vm creation process
+                state = VirtualMachine.PENDING
+            else:
+                state = VirtualMachine.UNKNOWN
+
+        if self.deleting:
+            state = VirtualMachine.DELETING
+
+        return state
+
     def get_vm(self, str_vm_id):
         """
         Get the VM with the specified ID (if it is not destroyed)
@@ -460,6 +589,23 @@ class InfrastructureInfo:
 
         return radl
 
+    def get_search_text(self, force=True):
+        """
+        Get the text where the filters of GetInfrastructureList are applied:
+        the RADL and the TOSCA document of this Inf separated by SEARCH_SEPARATOR.
+        If force is False and the RADL has not been loaded from the DB (so it has not
+        been modified), None is returned to avoid parsing it.
+        """
+        radl = self.__dict__.get('radl')
+        if not force and isinstance(radl, LazyValue) and not radl.loaded:
+            return None
+        tosca = ""
+        # Get the TOSCA document without deserializing it
+        extra_info = LazyAttribute.get_data(self.__dict__.get('extra_info'), self._serialize_extra_info)
+        if extra_info and "TOSCA" in extra_info:
+            tosca = extra_info["TOSCA"]
+        return str(self.get_radl()) + self.SEARCH_SEPARATOR + tosca
+
     def select_vm_master(self):
         """
         Select the VM master of the infrastructure.
@@ -596,10 +742,11 @@ class InfrastructureInfo:
             ctxt_task.append((-1, 0, self, ['generate_playbooks_and_hosts']))
 
             use_dist = len(self.get_vm_list()) > Config.VM_NUM_USE_CTXT_DIST
+            # Assure to update the VM status before running the ctxt process
+            # (the VMs of the same cloud provider with a single request if possible)
+            for group in VirtualMachine.group_by_cloud(self.get_vm_list()):
+                VirtualMachine.update_status_batch(group, auth)
             for cont, vm in enumerate(self.get_vm_list()):
-                # Assure to update the VM status before running the ctxt
-                # process
-                vm.update_status(auth)
                 vm.cont_out = ""
                 vm.cloud_connector = None
                 vm.configured = None
@@ -704,6 +851,12 @@ class InfrastructureInfo:
         """
         self.last_access = datetime.now()
 
+    def get_db_version(self):
+        """
+        Get the version of this Inf stored in the DB (0 if it has not been stored)
+        """
+        return self.db_rows.get(None, (None, 0))[1]
+
     def has_expired(self):
         """
         Check if the info of this Inf has expired (for HA mode)
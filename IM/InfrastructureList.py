@@ -15,23 +15,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import re
 import sys
 import time
+import hashlib
 import logging
 import threading
 
-from IM.db import DataBase
+from IM.db import DataBase, DataBasePool
 from IM.config import Config
+from IM.openid.JWT import JWT
+from IM.serialization import DataSerializer
+from IM.cache import LRUCache
+from IM.events import ChangeEvents
+from multiprocessing.pool import ThreadPool
 import IM.InfrastructureInfo
 
+try:
+    import sre_parse
+    import sre_constants
+except ImportError:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+
 
 class InfrastructureList():
     """
     Class to manage the list of infrastructures and the serialization of the data
     """
 
-    infrastructure_list = {}
-    """Map from string to :py:class:`InfrastructureInfo`."""
+    infrastructure_list = LRUCache(Config.INF_CACHE_SIZE, Config.INF_CACHE_MAX_VMS,
+                                   lambda inf: InfrastructureList._get_inf_weight(inf),
+                                   lambda inf: InfrastructureList._is_pinned(inf))
+    """LRU cache of :py:class:`InfrastructureInfo` indexed by Inf ID (see _new_inf_caches)."""
 
     logger = logging.getLogger('InfrastructureManager')
     """Logger object."""
@@ -39,8 +55,26 @@ class InfrastructureList():
     _lock = threading.Lock()
     """Threading Lock to avoid concurrency problems."""
 
-    infrastructure_auth = {}
-    """Map from string to :py:class:`Authentication`."""
+    infrastructure_auth = LRUCache(Config.INF_AUTH_CACHE_SIZE)
+    """LRU cache of :py:class:`InfrastructureInfo` with only the auth data, indexed by Inf ID."""
+
+    _initialized_dbs = set()
+    """Set of DB URLs where the IM tables have been already created."""
+
+    _pending_infs = {}
+    """Map from string to :py:class:`InfrastructureInfo` with the Infs waiting to be saved."""
+
+    _pending_cond = threading.Condition(threading.Lock())
+    """Condition to protect the pending Infs and wake up the persistence thread."""
+
+    _flush_lock = threading.Lock()
+    """Threading Lock to avoid concurrent flushes of the pending Infs."""
+
+    _persist_thread = None
+    """Thread that saves the pending Infs in the DB."""
+
+    _loading = {}
+    """Map from string to threading Lock to load each Inf from the DB only once."""
 
     @staticmethod
     def add_infrastructure(inf):
@@ -61,51 +95,272 @@ class InfrastructureList():
                 del InfrastructureList.infrastructure_list[del_inf.id]
 
     @staticmethod
-    def get_inf_ids(auth=None):
-        """ Get the IDs of the Infrastructures """
+    def get_inf_ids(auth=None, flt=None, limit=None, after=None):
+        """
+        Get the IDs of the Infrastructures
+
+        Args:
+
+        - auth(Authentication): only get the Infs of this user (all if None).
+        - flt(str): regex to be applied in the RADL or TOSCA of the Infs (only used with auth).
+        - limit(int): max number of IDs to return (only used with auth, None or 0 means no limit).
+        - after(str): only get the Infs after this one in the list (only used with auth).
+        """
         if auth:
-            # In this case only loads the auth data to improve performance
-            inf_ids = []
-            for inf_id in InfrastructureList._get_inf_ids_from_db():
-                # I we have the data in memory, use it
-                if inf_id in InfrastructureList.infrastructure_auth:
-                    inf = InfrastructureList.infrastructure_auth[inf_id]
-                    if inf.is_authorized(auth):
-                        inf_ids.append(inf_id)
-                else:
-                    res = InfrastructureList._get_data_from_db(Config.DATA_DB, inf_id, auth)
-                    if res:
-                        inf = res[inf_id]
-                        # store in memory to improve later requests
-                        InfrastructureList.infrastructure_auth[inf_id] = inf
-                        if inf and inf.is_authorized(auth):
-                            inf_ids.append(inf.id)
-            return inf_ids
+            return [inf[0] for inf in InfrastructureList.get_inf_list(auth, flt, limit, after)]
         else:
             return InfrastructureList._get_inf_ids_from_db()
 
     @staticmethod
-    def get_infrastructure(inf_id):
-        """ Get the infrastructure object """
-        if inf_id in InfrastructureList.infrastructure_list:
-            inf = InfrastructureList.infrastructure_list[inf_id]
-            if not inf.has_expired():
-                inf.touch()
-                return inf
-
-        if inf_id in InfrastructureList.get_inf_ids():
-            # Load the data from DB:
-            res = InfrastructureList._get_data_from_db(Config.DATA_DB, inf_id)
-            if res:
-                inf = res[inf_id]
-                InfrastructureList.infrastructure_list[inf_id] = inf
-                return inf
-            else:
+    def get_inf_list(auth, flt=None, limit=None, after=None):
+        """
+        Get the Infrastructures of a user sorted by creation date (the newest first).
+
+        Args:
+
+        - auth(Authentication): only get the Infs of this user.
+        - flt(str): regex to be applied in the RADL or TOSCA of the Infs.
+        - limit(int): max number of Infs to return (None or 0 means no limit).
+        - after(str): only get the Infs after the one with this ID in the list.
+
+        Returns: a list of tuples (inf_id, creation date, state, number of VMs) where the date is None
+                 in the Infs created by previous versions. The state and the number of VMs are got from
+                 the Infs in memory, or from the values stored in the DB in the last save of the other
+                 ones (None in the Infs not stored since previous versions).
+        """
+        owner = InfrastructureList._get_owner(auth)
+        literals = InfrastructureList._get_regex_literals(flt) if flt else None
+        start = None
+        if after:
+            # The Inf may have been deleted or filtered, so its creation date is got from the DB
+            created = InfrastructureList._get_inf_created_from_db(after, owner)
+            if created is False:
+                raise Exception("Incorrect value in after parameter: Inf ID %s not found." % after)
+            start = (created, after)
+
+        res = []
+        while True:
+            # Only get the rows needed to fill the page, and the next ones if some of them are discarded
+            batch = limit - len(res) if limit else None
+            rows = InfrastructureList._get_inf_ids_by_owner_from_db(owner, literals, batch, start)
+            for inf_id, inf_owner, search, created, state, vm_count in rows:
+                # The owner column has been already checked in the query
+                # The Infs stored without owner (previous versions) must be checked one by one
+                if not inf_owner and not InfrastructureList._is_authorized_without_owner(inf_id, auth):
+                    continue
+                if flt and not InfrastructureList._match_search_text(inf_id, flt, search):
+                    continue
+                # The Infs deleted or modified in memory may not be stored yet in the DB
+                inf = InfrastructureList._get_cached_inf(inf_id)
+                if inf:
+                    if inf.deleted:
+                        continue
+                    vm_list = inf.get_vm_list()
+                    state, vm_count = inf.get_aggregated_state(vm_list), len(vm_list)
+                res.append((inf_id, created, state, vm_count))
+            if not batch or len(rows) < batch or len(res) >= limit:
+                return res
+            start = (rows[-1][3], rows[-1][0])
+
+    @staticmethod
+    def _is_authorized_without_owner(inf_id, auth):
+        """ Check if the user is authorized to access an Inf stored without owner """
+        if inf_id in InfrastructureList.infrastructure_auth:
+            # I we have the data in memory, use it
+            return InfrastructureList.infrastructure_auth[inf_id].is_authorized(auth)
+        # In this case only loads the auth data to improve performance
+        res = InfrastructureList._get_data_from_db(Config.DATA_DB, inf_id, auth)
+        if res:
+            inf = res[inf_id]
+            # store in memory to improve later requests
+            InfrastructureList.infrastructure_auth[inf_id] = inf
+            return inf.is_authorized(auth)
+        return False
+
+    @staticmethod
+    def _match_search_text(inf_id, flt, search):
+        """ Check if the regex flt is found in the RADL or TOSCA of an Inf, using its search text """
+        # The search text stored in the DB is not updated until the pending saves are done
+        inf = InfrastructureList._pending_infs.get(inf_id)
+        if inf is None and search is None:
+            # Infs stored by previous versions have no search text
+            inf = InfrastructureList.get_infrastructure(inf_id)
+        if inf is not None:
+            search = inf.get_search_text()
+        if search is None:
+            return False
+        for text in search.split(IM.InfrastructureInfo.InfrastructureInfo.SEARCH_SEPARATOR, 1):
+            if re.search(flt, text):
+                return True
+        return False
+
+    @staticmethod
+    def _get_regex_literals(flt, min_len=3):
+        """
+        Get the literal strings (with at least min_len chars) that any string matching
+        the regex flt must contain, to pre-filter the Infs in the DB.
+        """
+        literals = []
+        try:
+            if re.compile(flt).flags & re.IGNORECASE:
+                return []
+            current = ""
+            for op, value in list(sre_parse.parse(flt)) + [(None, None)]:
+                if op == sre_constants.LITERAL:
+                    current += chr(value)
+                else:
+                    if len(current) >= min_len:
+                        literals.append(current)
+                    current = ""
+        except Exception:
+            return []
+        return literals
+
+    @staticmethod
+    def _escape_like(value):
+        """ Escape a value to be used in a SQL like pattern with "!" as escape char """
+        return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+    @staticmethod
+    def _get_owner(auth):
+        """
+        Get the hash of the IM credentials used to index the Infs by owner.
+
+        Args:
+
+        - auth(Authentication): IM credentials of the Inf or of the user.
+
+        Returns: a str with the hash or None if the credentials are not valid to own an Inf.
+        """
+        if auth is None:
+            return None
+        im_auth = auth.getAuthInfo("InfrastructureManager")
+        if not im_auth or 'username' not in im_auth[0] or 'password' not in im_auth[0]:
+            return None
+        im_auth = im_auth[0]
+
+        # Apply the same restrictions than InfrastructureInfo.is_authorized
+        if im_auth['username'].startswith(IM.InfrastructureInfo.InfrastructureInfo.OPENID_USER_PREFIX):
+            if 'token' not in im_auth:
                 return None
-        else:
-            InfrastructureList.logger.warning("%s not in list of Inf IDs." % inf_id)
+            decoded_token = JWT().get_info(im_auth['token'])
+            if im_auth['password'] != str(decoded_token['iss']) + str(decoded_token['sub']):
+                return None
+
+        owner = im_auth['username'] + ":" + im_auth['password']
+        return hashlib.sha256(owner.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _new_inf_caches():
+        """ Create the caches of Infs with the sizes set in the config """
+        InfrastructureList.infrastructure_list = LRUCache(Config.INF_CACHE_SIZE, Config.INF_CACHE_MAX_VMS,
+                                                          InfrastructureList._get_inf_weight,
+                                                          InfrastructureList._is_pinned)
+        InfrastructureList.infrastructure_auth = LRUCache(Config.INF_AUTH_CACHE_SIZE)
+
+    @staticmethod
+    def _get_inf_weight(inf):
+        """ Weight of an Inf in the cache: the number of VMs (plus the Inf itself) """
+        return len(inf.vm_list) + 1
+
+    @staticmethod
+    def _is_pinned(inf):
+        """ Infs that must not be evicted from memory as they are being modified """
+        return bool(inf.adding or inf.deleting or inf.id in InfrastructureList._pending_infs or
+                    (inf.cm is not None and inf.cm.is_alive()) or inf.is_ctxt_process_running())
+
+    @staticmethod
+    def get_cache_stats():
+        """ Get the counters of the caches of Infs """
+        res = {}
+        for name, cache in [("infrastructures", InfrastructureList.infrastructure_list),
+                            ("auth", InfrastructureList.infrastructure_auth)]:
+            if isinstance(cache, LRUCache):
+                res[name] = cache.get_stats()
+        return res
+
+    @staticmethod
+    def _get_cached_inf(inf_id):
+        """ Get an Inf from memory (without counting it as a hit or a miss) """
+        try:
+            return InfrastructureList.infrastructure_list[inf_id]
+        except KeyError:
             return None
 
+    @staticmethod
+    def has_infrastructure(inf_id):
+        """ Check if an Inf exists and it is not deleted, without loading it """
+        inf = InfrastructureList._get_cached_inf(inf_id)
+        if inf and not inf.has_expired():
+            return True
+        return inf_id in InfrastructureList._get_inf_ids_from_db(inf_id)
+
+    @staticmethod
+    def get_infrastructure(inf_id):
+        """ Get the infrastructure object (loading it from the DB if it is not in memory) """
+        inf = InfrastructureList.infrastructure_list.get(inf_id)
+        if inf and not inf.has_expired():
+            inf.touch()
+            return inf
+
+        # Avoid loading the same Inf several times if it is requested by different threads
+        with InfrastructureList._lock:
+            load_lock = InfrastructureList._loading.setdefault(inf_id, threading.Lock())
+        with load_lock:
+            try:
+                new_inf = InfrastructureList._get_cached_inf(inf_id)
+                if new_inf is not None and new_inf is not inf:
+                    # It has been loaded by other thread while waiting for the lock
+                    new_inf.touch()
+                    return new_inf
+
+                version = InfrastructureList._get_inf_version_from_db(inf_id)
+                if version is not None and inf is not None and version == inf.get_db_version():
+                    # The Inf has expired but it has not been modified by other IM node
+                    inf.touch()
+                    return inf
+
+                if version is not None:
+                    # Load the data from DB:
+                    res = InfrastructureList._get_data_from_db(Config.DATA_DB, inf_id)
+                    if res:
+                        inf = res[inf_id]
+                        InfrastructureList.infrastructure_list[inf_id] = inf
+                        return inf
+                    else:
+                        return None
+                else:
+                    InfrastructureList.logger.warning("%s not in list of Inf IDs." % inf_id)
+                    return None
+            finally:
+                with InfrastructureList._lock:
+                    InfrastructureList._loading.pop(inf_id, None)
+
+    @staticmethod
+    def resume_infrastructures(num_threads=1):
+        """
+        Launch a thread to load in background the Infs that were being contextualized
+        when the IM service was stopped, using num_threads threads to load them.
+        """
+        t = threading.Thread(name="ResumeInfs", target=InfrastructureList._resume_infrastructures,
+                             args=(num_threads,))
+        t.daemon = True
+        t.start()
+        return t
+
+    @staticmethod
+    def _resume_infrastructures(num_threads):
+        inf_ids = InfrastructureList._get_ctxt_inf_ids_from_db()
+        InfrastructureList.logger.info("Loading %d infrastructures with contextualization in progress." %
+                                       len(inf_ids))
+        if num_threads > 1:
+            pool = ThreadPool(processes=num_threads)
+            pool.map(InfrastructureList.get_infrastructure, inf_ids)
+            pool.close()
+        else:
+            for inf_id in inf_ids:
+                InfrastructureList.get_infrastructure(inf_id)
+
     @staticmethod
     def stop():
         """ Stop securely the IM service """
@@ -114,6 +369,10 @@ class InfrastructureList():
             # Stop all the Ctxt threads of the Infrastructures
             for inf in InfrastructureList.infrastructure_list.values():
                 inf.stop()
+        # Store the pending changes
+        InfrastructureList.flush()
+        # Close the idle DB connections
+        DataBasePool.close_all()
 
     @staticmethod
     def load_data():
@@ -121,53 +380,334 @@ class InfrastructureList():
         with InfrastructureList._lock:
             try:
                 inf_list = InfrastructureList._get_data_from_db(Config.DATA_DB)
-                InfrastructureList.infrastructure_list = inf_list
+                InfrastructureList._new_inf_caches()
+                for inf_id, inf in inf_list.items():
+                    InfrastructureList.infrastructure_list[inf_id] = inf
             except Exception as ex:
                 InfrastructureList.logger.exception("ERROR loading data. Correct or delete it!!")
                 sys.stderr.write("ERROR loading data: " + str(ex) + ".\nCorrect or delete it!! ")
                 sys.exit(-1)
 
     @staticmethod
-    def save_data(inf_id=None):
+    def save_data(inf_id=None, sync=False):
         """
-        Save data to DB
+        Save data to DB.
+        If SAVE_DATA_DELAY is set, the save of an Inf is delayed to coalesce it with later saves
+        of the same Inf, unless sync is set.
+        The operations that modify an Inf must pass the object they have modified, as it may have been
+        evicted from memory (or replaced by a copy loaded again from the DB) during the operation.
+        In this case the Inf is put back in memory, as it has the last changes (unless the copy in memory
+        has newer changes stored by other IM node).
 
         Args:
 
-        - inf_id(str): ID of the infrastructure to save. If None all will be saved.
+        - inf_id(str or InfrastructureInfo): infrastructure (or its ID) to save. If None all will be saved.
+        - sync(bool): Flag to save the data before returning. In this case an exception is raised if the
+          Inf cannot be saved (i.e. it has been modified by other IM node).
         """
-        with InfrastructureList._lock:
+        if isinstance(inf_id, IM.InfrastructureInfo.InfrastructureInfo):
+            inf = inf_id
+            inf_id = inf.id
+            with InfrastructureList._lock:
+                cached_inf = InfrastructureList._get_cached_inf(inf_id)
+                if not inf.deleted and cached_inf is not inf and (cached_inf is None or
+                                                                  cached_inf.get_db_version() <= inf.get_db_version()):
+                    InfrastructureList.logger.warning("Inf ID %s evicted from memory while it was"
+                                                      " being modified. Adding it again." % inf_id)
+                    InfrastructureList.infrastructure_list[inf_id] = inf
+            infs = {inf_id: inf}
+        elif inf_id is None:
+            with InfrastructureList._lock:
+                infs = dict(InfrastructureList.infrastructure_list)
+        elif inf_id in InfrastructureList.infrastructure_list:
+            infs = {inf_id: InfrastructureList.infrastructure_list[inf_id]}
+        else:
+            InfrastructureList.logger.error("ERROR saving data. Inf ID %s not in the list of Infs." % inf_id)
+            return
+
+        if inf_id and not sync and Config.SAVE_DATA_DELAY > 0:
+            with InfrastructureList._pending_cond:
+                InfrastructureList._pending_infs.update(infs)
+                InfrastructureList._start_persist_thread()
+                InfrastructureList._pending_cond.notify()
+        else:
+            with InfrastructureList._pending_cond:
+                for elem in infs:
+                    InfrastructureList._pending_infs.pop(elem, None)
+            if not InfrastructureList._save_infs(infs) and inf_id:
+                raise Exception("Error saving Inf ID %s: it has been modified by other IM node or the"
+                                " database is not available. Changes not stored." % inf_id)
+
+    @staticmethod
+    def flush():
+        """
+        Save synchronously all the Infs with delayed saves pending.
+        """
+        with InfrastructureList._flush_lock:
+            with InfrastructureList._pending_cond:
+                infs = InfrastructureList._pending_infs
+                InfrastructureList._pending_infs = {}
+            if infs:
+                InfrastructureList.logger.debug("Saving %d pending infrastructures." % len(infs))
+                InfrastructureList._save_infs(infs)
+
+    @staticmethod
+    def _save_infs(infs):
+        """ Save a dict of Infs to the DB, returning False in case of error """
+        try:
+            res = InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+            if not res:
+                InfrastructureList.logger.error("ERROR saving data.\nChanges not stored!!")
+                sys.stderr.write("ERROR saving data.\nChanges not stored!!")
+            return bool(res)
+        except Exception as ex:
+            InfrastructureList.logger.exception("ERROR saving data. Changes not stored!!")
+            sys.stderr.write("ERROR saving data: " + str(ex) + ".\nChanges not stored!!")
+            return False
+
+    @staticmethod
+    def _start_persist_thread():
+        """ Launch the persistence thread if it is not running (called with the _pending_cond acquired) """
+        if InfrastructureList._persist_thread is None or not InfrastructureList._persist_thread.is_alive():
+            t = threading.Thread(name="PersistInfs", target=InfrastructureList._persist_loop)
+            t.daemon = True
+            t.start()
+            InfrastructureList._persist_thread = t
+
+    @staticmethod
+    def _persist_loop():
+        """ Wait for pending Infs and save them after SAVE_DATA_DELAY secs """
+        while True:
+            with InfrastructureList._pending_cond:
+                while not InfrastructureList._pending_infs:
+                    InfrastructureList._pending_cond.wait()
+            # Wait to coalesce the saves of the same Infs
+            time.sleep(Config.SAVE_DATA_DELAY)
+            InfrastructureList.flush()
+
+    @staticmethod
+    def start_archive_job():
+        """
+        Launch a thread that archives the destroyed Infs every ARCHIVE_INTERVAL secs.
+        """
+        t = threading.Thread(name="ArchiveInfs", target=InfrastructureList._archive_loop)
+        t.daemon = True
+        t.start()
+        return t
+
+    @staticmethod
+    def _archive_loop():
+        while True:
             try:
-                res = InfrastructureList._save_data_to_db(Config.DATA_DB,
-                                                          InfrastructureList.infrastructure_list,
-                                                          inf_id)
-                if not res:
-                    InfrastructureList.logger.error("ERROR saving data.\nChanges not stored!!")
-                    sys.stderr.write("ERROR saving data.\nChanges not stored!!")
-            except Exception as ex:
-                InfrastructureList.logger.exception("ERROR saving data. Changes not stored!!")
-                sys.stderr.write("ERROR saving data: " + str(ex) + ".\nChanges not stored!!")
+                InfrastructureList.archive_deleted_infs(Config.ARCHIVE_DELETED_INFS_AFTER, Config.ARCHIVE_BATCH_SIZE)
+            except Exception:
+                InfrastructureList.logger.exception("ERROR archiving the deleted infrastructures.")
+            time.sleep(Config.ARCHIVE_INTERVAL)
 
     @staticmethod
-    def init_table():
-        """ Creates de database """
-        db = DataBase(Config.DATA_DB)
-        if db.connect():
-            if not db.table_exists("inf_list"):
-                InfrastructureList.logger.debug("Creating the IM database!.")
-                if db.db_type == DataBase.MYSQL:
-                    db.execute("CREATE TABLE inf_list(rowid INTEGER NOT NULL AUTO_INCREMENT UNIQUE,"
-                               " id VARCHAR(255) PRIMARY KEY, deleted INTEGER, date TIMESTAMP, data LONGBLOB)")
-                elif db.db_type == DataBase.SQLITE:
-                    db.execute("CREATE TABLE inf_list(id VARCHAR(255) PRIMARY KEY, deleted INTEGER,"
-                               " date TIMESTAMP, data LONGBLOB)")
-                db.close()
-            return True
-        else:
+    def archive_deleted_infs(max_age, batch_size=100, db_url=None):
+        """
+        Move the Infs destroyed more than max_age secs ago from the inf_list and vm_list tables
+        to the inf_archive table, storing the header and the VMs of each one in a single compressed blob.
+
+        Args:
+
+        - max_age(int): time (in secs) since the Infs were destroyed.
+        - batch_size(int): number of Infs archived in each DB operation.
+        - db_url(str): URL of the DB (DATA_DB by default).
+
+        Returns: the number of archived Infs.
+        """
+        if db_url is None:
+            db_url = Config.DATA_DB
+        if not InfrastructureList._check_table(db_url):
             InfrastructureList.logger.error("ERROR connecting with the database!.")
+            return 0
+
+        start = time.time()
+        total = 0
+        with InfrastructureList.get_db_pool(db_url).connection() as db:
+            if db:
+                while True:
+                    num = InfrastructureList._archive_batch(db, max_age, batch_size)
+                    total += num
+                    if num < batch_size:
+                        break
+            else:
+                InfrastructureList.logger.error("ERROR connecting with the database!.")
+
+        if total:
+            elapsed = max(time.time() - start, 0.001)
+            InfrastructureList.logger.info("%d deleted infrastructures archived in %.2f secs (%.1f infs/sec)." %
+                                           (total, elapsed, total / elapsed))
+        return total
+
+    @staticmethod
+    def _archive_batch(db, max_age, batch_size):
+        """ Archive the oldest batch_size Infs destroyed more than max_age secs ago """
+        if db.db_type == DataBase.MONGO:
+            res = [(elem['id'], elem.get('date'), elem.get('owner'), elem['data'])
+                   for elem in db.find("inf_list", {"deleted": 1, "date": {"$lt": time.time() - max_age}},
+                                       {"id": True, "date": True, "owner": True, "data": True},
+                                       [('_id', 1)], batch_size)]
+        elif db.db_type == DataBase.SQLITE:
+            # SQLite stores only the date (without time)
+            res = db.select("select id, date, owner, data from inf_list where deleted = 1 and"
+                            " date < date('now', %s) order by rowid limit %s", ("-%d seconds" % max_age, batch_size))
+        else:
+            res = db.select("select id, date, owner, data from inf_list where deleted = 1 and"
+                            " date < now() - interval %s second order by rowid limit %s", (max_age, batch_size))
+        if not res:
+            return 0
+
+        inf_ids = [elem[0] for elem in res]
+        if db.db_type == DataBase.MONGO:
+            vm_res = [(elem['inf_id'], elem['data'])
+                      for elem in db.find("vm_list", {"inf_id": {"$in": inf_ids}}, {"inf_id": True, "data": True},
+                                          [('inf_id', 1), ('vm_id', 1)])]
+        else:
+            vm_res = db.select("select inf_id, data from vm_list where inf_id in (" +
+                               ", ".join(["%s"] * len(inf_ids)) + ") order by inf_id, vm_id", inf_ids)
+        vm_rows = {}
+        for inf_id, data in vm_res:
+            vm_rows.setdefault(inf_id, []).append(data)
+
+        if db.db_type == DataBase.MONGO:
+            msg_res = [(elem['inf_id'], elem['vm_id'], elem['data'])
+                       for elem in db.find("cont_msg_list", {"inf_id": {"$in": inf_ids}},
+                                           {"inf_id": True, "vm_id": True, "data": True},
+                                           [('inf_id', 1), ('vm_id', 1), ('seq', 1)])]
+        else:
+            msg_res = db.select("select inf_id, vm_id, data from cont_msg_list where inf_id in (" +
+                                ", ".join(["%s"] * len(inf_ids)) + ") order by inf_id, vm_id, seq", inf_ids)
+        cont_msgs = {}
+        for inf_id, vm_id, data in msg_res:
+            inf_msgs = cont_msgs.setdefault(inf_id, {})
+            inf_msgs[vm_id] = inf_msgs.get(vm_id, "") + data
+
+        for inf_id, date, owner, data in res:
+            archive_data = InfrastructureList._get_archive_data(inf_id, data, vm_rows.get(inf_id, []),
+                                                                cont_msgs.get(inf_id))
+            if db.db_type == DataBase.MONGO:
+                db.replace("inf_archive", {"id": inf_id}, {"id": inf_id, "date": date, "archived": time.time(),
+                                                           "owner": owner, "data": archive_data})
+            else:
+                db.execute("replace into inf_archive (id, date, archived, owner, data) values (%s, %s, now(), %s, %s)",
+                           (inf_id, date, owner, archive_data))
+
+        if db.db_type == DataBase.MONGO:
+            db.delete("cont_msg_list", {"inf_id": {"$in": inf_ids}})
+            db.delete("vm_list", {"inf_id": {"$in": inf_ids}})
+            db.delete("inf_list", {"id": {"$in": inf_ids}})
+        else:
+            in_ids = "(" + ", ".join(["%s"] * len(inf_ids)) + ")"
+            db.execute("delete from cont_msg_list where inf_id in " + in_ids, inf_ids)
+            db.execute("delete from vm_list where inf_id in " + in_ids, inf_ids)
+            db.execute("delete from inf_list where id in " + in_ids, inf_ids)
+        return len(inf_ids)
+
+    @staticmethod
+    def _get_archive_data(inf_id, header, vms, cont_msgs=None):
+        """
+        Get a single compressed blob with the header and the VM rows of an Inf
+        (and the parts of its contextualization logs moved to the DB).
+        """
+        try:
+            data = {"inf": DataSerializer.loads(header), "vms": [DataSerializer.loads(vm_data) for vm_data in vms]}
+            if cont_msgs:
+                # Use str keys as the VM IDs (-1 for the log of the Inf)
+                data["cont_msg"] = dict((str(vm_id), msg) for vm_id, msg in cont_msgs.items())
+            return DataSerializer.dumps(data)
+        except Exception:
+            InfrastructureList.logger.exception("Error reading data of Inf ID %s. Archiving it as is." % inf_id)
+            return header
+
+    @staticmethod
+    def get_db_pool(db_url=None):
+        """ Get the pool of connections to the IM DB """
+        if db_url is None:
+            db_url = Config.DATA_DB
+        return DataBasePool.get_pool(db_url, Config.DB_POOL_SIZE, Config.DB_POOL_TIMEOUT)
+
+    @staticmethod
+    def init_table(db_url=None):
+        """ Creates de database """
+        if db_url is None:
+            db_url = Config.DATA_DB
+        with InfrastructureList.get_db_pool(db_url).connection() as db:
+            if db:
+                if not db.table_exists("inf_list"):
+                    InfrastructureList.logger.debug("Creating the IM database!.")
+                    if db.db_type == DataBase.MYSQL:
+                        db.execute("CREATE TABLE inf_list(rowid INTEGER NOT NULL AUTO_INCREMENT UNIQUE,"
+                                   " id VARCHAR(255) PRIMARY KEY, deleted INTEGER, date TIMESTAMP, data LONGBLOB,"
+                                   " owner VARCHAR(255), version INTEGER DEFAULT 0, search LONGTEXT, created INTEGER,"
+                                   " state VARCHAR(255), vm_count INTEGER)")
+                        db.execute("CREATE INDEX inf_list_owner ON inf_list(owner)")
+                    elif db.db_type == DataBase.SQLITE:
+                        db.execute("CREATE TABLE inf_list(id VARCHAR(255) PRIMARY KEY, deleted INTEGER,"
+                                   " date TIMESTAMP, data LONGBLOB, owner VARCHAR(255), version INTEGER DEFAULT 0,"
+                                   " search TEXT, created INTEGER, state VARCHAR(255), vm_count INTEGER)")
+                        db.execute("CREATE INDEX inf_list_owner ON inf_list(owner)")
+                if db.db_type == DataBase.MONGO:
+                    db.create_index("inf_list", [("owner", 1)])
+                    db.create_index("inf_list", [("deleted", 1), ("_id", -1)])
+                    db.create_index("inf_list", [("owner", 1), ("created", -1), ("id", -1)])
+                    db.create_index("cont_msg_list", [("inf_id", 1), ("vm_id", 1), ("seq", 1)])
+                elif not db.column_exists("inf_list", "owner"):
+                    # Tables created by previous versions
+                    InfrastructureList.logger.debug("Adding the owner column to the IM database!.")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN owner VARCHAR(255)")
+                    db.execute("CREATE INDEX inf_list_owner ON inf_list(owner)")
+                if not db.column_exists("inf_list", "version"):
+                    InfrastructureList.logger.debug("Adding the version column to the IM database!.")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN version INTEGER DEFAULT 0")
+                if not db.column_exists("inf_list", "search"):
+                    InfrastructureList.logger.debug("Adding the search column to the IM database!.")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN search LONGTEXT")
+                if not db.column_exists("inf_list", "created"):
+                    InfrastructureList.logger.debug("Adding the created column to the IM database!.")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN created INTEGER")
+                if not db.column_exists("inf_list", "state"):
+                    InfrastructureList.logger.debug("Adding the state and vm_count columns to the IM database!.")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN state VARCHAR(255)")
+                    db.execute("ALTER TABLE inf_list ADD COLUMN vm_count INTEGER")
+                if db.db_type != DataBase.MONGO and not db.table_exists("vm_list"):
+                    InfrastructureList.logger.debug("Creating the VM table of the IM database!.")
+                    db.execute("CREATE TABLE vm_list(inf_id VARCHAR(255) NOT NULL, vm_id INTEGER NOT NULL,"
+                               " version INTEGER, data LONGBLOB, PRIMARY KEY (inf_id, vm_id))")
+                if db.db_type != DataBase.MONGO and not db.index_exists("inf_list", "inf_list_deleted"):
+                    InfrastructureList.logger.debug("Adding the deleted index to the IM database!.")
+                    if db.db_type == DataBase.MYSQL:
+                        db.execute("CREATE INDEX inf_list_deleted ON inf_list(deleted, rowid)")
+                    else:
+                        # SQLite indexes already include the rowid
+                        db.execute("CREATE INDEX inf_list_deleted ON inf_list(deleted)")
+                if db.db_type != DataBase.MONGO and not db.index_exists("inf_list", "inf_list_created"):
+                    InfrastructureList.logger.debug("Adding the created index to the IM database!.")
+                    db.execute("CREATE INDEX inf_list_created ON inf_list(owner, created, id)")
+                if db.db_type != DataBase.MONGO and not db.table_exists("inf_archive"):
+                    InfrastructureList.logger.debug("Creating the archive table of the IM database!.")
+                    db.execute("CREATE TABLE inf_archive(id VARCHAR(255) PRIMARY KEY, date TIMESTAMP,"
+                               " archived TIMESTAMP, owner VARCHAR(255), data LONGBLOB)")
+                if db.db_type != DataBase.MONGO and not db.table_exists("cont_msg_list"):
+                    InfrastructureList.logger.debug("Creating the contextualization log table of the IM database!.")
+                    db.execute("CREATE TABLE cont_msg_list(inf_id VARCHAR(255) NOT NULL, vm_id INTEGER NOT NULL,"
+                               " seq INTEGER NOT NULL, data LONGTEXT, PRIMARY KEY (inf_id, vm_id, seq))")
+                InfrastructureList._initialized_dbs.add(db_url)
+                return True
+            else:
+                InfrastructureList.logger.error("ERROR connecting with the database!.")
 
         return False
 
+    @staticmethod
+    def _check_table(db_url):
+        """ Creates de database only if it has not been previously done """
+        if db_url in InfrastructureList._initialized_dbs:
+            return True
+        return InfrastructureList.init_table(db_url)
+
     @staticmethod
     def _get_data_from_db(db_url, inf_id=None, auth=None):
         """
@@ -175,107 +715,525 @@ class InfrastructureList():
         If no inf_id specified all Infrastructures are loaded.
         If auth is specified only auth data will be loaded.
         """
-        if InfrastructureList.init_table():
-            db = DataBase(db_url)
-            if db.connect():
-                inf_list = {}
-                if inf_id:
-                    if db.db_type == DataBase.MONGO:
-                        res = db.find("inf_list", {"id": inf_id}, {"data": True})
-                    else:
-                        res = db.select("select data from inf_list where id = %s", (inf_id,))
-                else:
-                    if db.db_type == DataBase.MONGO:
-                        res = db.find("inf_list", {"deleted": 0}, {"data": True}, [('_id', -1)])
+        if InfrastructureList._check_table(db_url):
+            with InfrastructureList.get_db_pool(db_url).connection() as db:
+                if db:
+                    inf_list = {}
+                    if inf_id:
+                        if db.db_type == DataBase.MONGO:
+                            res = db.find("inf_list", {"id": inf_id}, {"id": True, "data": True, "version": True})
+                        else:
+                            res = db.select("select id, data, version from inf_list where id = %s", (inf_id,))
                     else:
-                        res = db.select("select data from inf_list where deleted = 0 order by rowid desc")
-                if len(res) > 0:
-                    for elem in res:
                         if db.db_type == DataBase.MONGO:
-                            data = elem['data']
+                            res = db.find("inf_list", {"deleted": 0}, {"id": True, "data": True, "version": True},
+                                          [('_id', -1)])
                         else:
-                            data = elem[0]
-                        try:
-                            if auth:
-                                inf = IM.InfrastructureInfo.InfrastructureInfo.deserialize_auth(data)
+                            res = db.select("select id, data, version from inf_list where deleted = 0"
+                                            " order by rowid desc")
+                    if len(res) > 0:
+                        vm_rows = {}
+                        if not auth:
+                            vm_rows = InfrastructureList._get_vm_rows_from_db(db, inf_id)
+                        for elem in res:
+                            if db.db_type == DataBase.MONGO:
+                                data = elem['data']
+                                elem_id = elem['id']
+                                version = elem.get('version')
                             else:
-                                inf = IM.InfrastructureInfo.InfrastructureInfo.deserialize(data)
-                            inf_list[inf.id] = inf
-                        except Exception:
-                            InfrastructureList.logger.exception(
-                                "ERROR reading infrastructure from database, ignoring it!.")
-                else:
-                    msg = ""
-                    if inf_id:
-                        msg = " for inf ID: %s" % inf_id
-                    InfrastructureList.logger.warn("No data in database%s!." % msg)
+                                elem_id, data, version = elem
+                            try:
+                                if auth:
+                                    inf = IM.InfrastructureInfo.InfrastructureInfo.deserialize_auth(data)
+                                else:
+                                    rows = vm_rows.get(elem_id, [])
+                                    inf = IM.InfrastructureInfo.InfrastructureInfo.deserialize(
+                                        data, [vm_data for _, _, vm_data in rows])
+                                    for vm_id, vm_version, vm_data in rows:
+                                        inf.db_rows[vm_id] = (InfrastructureList._get_digest(vm_data), vm_version)
+                                    inf.db_rows[None] = (InfrastructureList._get_digest(data), version or 0)
+                                inf_list[inf.id] = inf
+                            except Exception:
+                                InfrastructureList.logger.exception(
+                                    "ERROR reading infrastructure from database, ignoring it!.")
+                    else:
+                        msg = ""
+                        if inf_id:
+                            msg = " for inf ID: %s" % inf_id
+                        InfrastructureList.logger.warn("No data in database%s!." % msg)
 
-                db.close()
-                return inf_list
-            else:
-                InfrastructureList.logger.error("ERROR connecting with the database!.")
-                return {}
+                    return inf_list
+                else:
+                    InfrastructureList.logger.error("ERROR connecting with the database!.")
+                    return {}
         else:
             InfrastructureList.logger.error("ERROR connecting with the database!.")
             return {}
 
     @staticmethod
-    def _save_data_to_db(db_url, inf_list, inf_id=None):
-        db = DataBase(db_url)
-        if db.connect():
-            infs_to_save = inf_list
+    def _get_vm_rows_from_db(db, inf_id=None):
+        """
+        Get the VM rows of an Inf (or of all the non deleted Infs if inf_id is None).
+
+        Returns: a dict indexed by Inf ID with a sorted list of tuples (vm_id, version, data).
+        """
+        if db.db_type == DataBase.MONGO:
             if inf_id:
-                infs_to_save = {inf_id: inf_list[inf_id]}
+                filt = {"inf_id": inf_id}
+            else:
+                filt = {"inf_id": {"$in": [elem['id'] for elem in db.find("inf_list", {"deleted": 0},
+                                                                          {"id": True})]}}
+            res = [(elem['inf_id'], elem['vm_id'], elem['version'], elem['data'])
+                   for elem in db.find("vm_list", filt, {"inf_id": True, "vm_id": True,
+                                                         "version": True, "data": True},
+                                       [('inf_id', 1), ('vm_id', 1)])]
+        else:
+            if inf_id:
+                res = db.select("select inf_id, vm_id, version, data from vm_list where inf_id = %s"
+                                " order by vm_id", (inf_id,))
+            else:
+                res = db.select("select v.inf_id, v.vm_id, v.version, v.data from vm_list v, inf_list i"
+                                " where v.inf_id = i.id and i.deleted = 0 order by v.inf_id, v.vm_id")
 
-            for inf in infs_to_save.values():
-                data = inf.serialize()
-                if db.db_type == DataBase.MONGO:
-                    res = db.replace("inf_list", {"id": inf.id}, {"id": inf.id, "deleted": int(inf.deleted),
-                                                                  "data": data, "date": time.time()})
-                else:
-                    res = db.execute("replace into inf_list (id, deleted, data, date) values (%s, %s, %s, now())",
-                                     (inf.id, int(inf.deleted), data))
+        vm_rows = {}
+        for elem_inf_id, vm_id, version, data in res:
+            vm_rows.setdefault(elem_inf_id, []).append((vm_id, version, data))
+        return vm_rows
+
+    @staticmethod
+    def _get_digest(data):
+        """ Get the digest of the data stored in a DB row """
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _save_inf_to_db(db, inf):
+        """
+        Save an Inf in the DB as a header row plus one row per VM.
+        Only the rows that have changed since the last time they were stored are written.
+        The version of the header row is increased in each save using a compare-and-swap, so
+        the changes made by other IM nodes (in HA mode) are not overwritten. In this case the Inf
+        is evicted from memory, to load the changes of the other node in the next access.
+        The header and the VM rows are written in a single transaction. MongoDB has no transactions,
+        so the VM rows are written before the header, once checked that the Inf has not been modified.
+        The stored changes are published as a change of the Inf (see :py:class:`ChangeEvents`).
+        """
+        header, vms = inf.serialize_rows()
+
+        vm_rows = []
+        for vm_id, data in vms:
+            digest = InfrastructureList._get_digest(data)
+            old_digest, version = inf.db_rows.get(vm_id, (None, 0))
+            if digest != old_digest:
+                vm_rows.append((vm_id, data, digest, version + 1))
+
+        # Remove the rows of the VMs that are not in the Inf anymore
+        vm_ids = [vm_id for vm_id, _ in vms]
+        old_ids = [vm_id for vm_id in inf.db_rows if vm_id is not None and vm_id not in vm_ids]
+
+        # The header row uses None as key
+        digest = InfrastructureList._get_digest(header)
+        old_digest, version = inf.db_rows.get(None, (None, 0))
+        if digest == old_digest and not vm_rows and not old_ids:
+            return True
+
+        if db.db_type == DataBase.MONGO:
+            saved = False
+            if None not in inf.db_rows or [elem.get('version') or 0 for elem in
+                                           db.find("inf_list", {"id": inf.id}, {"version": True})] == [version]:
+                InfrastructureList._save_vm_rows_to_db(db, inf, vm_rows, old_ids)
+                saved = InfrastructureList._save_header_to_db(db, inf, header, digest != old_digest)
+        else:
+            with db.transaction():
+                saved = InfrastructureList._save_header_to_db(db, inf, header, digest != old_digest)
+                if saved:
+                    InfrastructureList._save_vm_rows_to_db(db, inf, vm_rows, old_ids)
+
+        if not saved:
+            InfrastructureList.logger.error("Inf ID %s has been modified by other IM node (version %d is not"
+                                            " the last one). Changes not stored!!" % (inf.id, version))
+            with InfrastructureList._lock:
+                if InfrastructureList._get_cached_inf(inf.id) is inf:
+                    del InfrastructureList.infrastructure_list[inf.id]
+            return False
+
+        inf.db_rows[None] = (digest, version + 1)
+        for vm_id, _, vm_digest, vm_version in vm_rows:
+            inf.db_rows[vm_id] = (vm_digest, vm_version)
+        for vm_id in old_ids:
+            del inf.db_rows[vm_id]
+
+        ChangeEvents.publish(inf.id)
+        return True
 
-            db.close()
-            return res
+    @staticmethod
+    def _save_vm_rows_to_db(db, inf, vm_rows, old_ids):
+        """ Write the changed VM rows of an Inf and remove the ones of the VMs not in the Inf anymore """
+        for vm_id, data, _, vm_version in vm_rows:
+            if db.db_type == DataBase.MONGO:
+                db.replace("vm_list", {"inf_id": inf.id, "vm_id": vm_id},
+                           {"inf_id": inf.id, "vm_id": vm_id, "version": vm_version, "data": data})
+            else:
+                db.execute("replace into vm_list (inf_id, vm_id, version, data) values (%s, %s, %s, %s)",
+                           (inf.id, vm_id, vm_version, data))
+
+        if old_ids:
+            if db.db_type == DataBase.MONGO:
+                db.delete("vm_list", {"inf_id": inf.id, "vm_id": {"$in": old_ids}})
+            else:
+                db.execute("delete from vm_list where inf_id = %s and vm_id in (" +
+                           ", ".join(["%s"] * len(old_ids)) + ")", [inf.id] + old_ids)
+
+    @staticmethod
+    def _save_header_to_db(db, inf, header, changed=True):
+        """
+        Save the header row of an Inf increasing its version, only if the version stored
+        in the DB is the one of the Inf (the first save of an Inf is always written).
+        The aggregated state and the number of VMs of the Inf are also stored, to list
+        the Infs without loading them.
+
+        Args:
+
+        - db(DataBase): connected DataBase object.
+        - inf(InfrastructureInfo): the Inf to save.
+        - header(str): the serialized header of the Inf.
+        - changed(bool): flag to specify if the header data has changed.
+
+        Returns: True if the row has been written or False if the version is not the last one.
+        """
+        old_version = inf.get_db_version()
+        owner = InfrastructureList._get_owner(inf.auth)
+        vm_list = inf.get_vm_list()
+        state, vm_count = inf.get_aggregated_state(vm_list), len(vm_list)
+        if db.db_type == DataBase.MONGO:
+            doc = {"id": inf.id, "deleted": int(inf.deleted), "data": header, "date": time.time(),
+                   "owner": owner, "version": old_version + 1, "search": inf.get_search_text(),
+                   "created": inf.creation_date, "state": state, "vm_count": vm_count}
+            if None not in inf.db_rows:
+                return db.replace("inf_list", {"id": inf.id}, doc)
+            # The Infs stored by previous versions have no version field
+            versions = [old_version, None] if old_version == 0 else [old_version]
+            return db.replace("inf_list", {"id": inf.id, "version": {"$in": versions}}, doc, False)
+        elif None not in inf.db_rows:
+            return db.execute("replace into inf_list (id, deleted, data, date, owner, version, search, created,"
+                              " state, vm_count) values (%s, %s, %s, now(), %s, %s, %s, %s, %s, %s)",
+                              (inf.id, int(inf.deleted), header, owner, old_version + 1, inf.get_search_text(),
+                               inf.creation_date, state, vm_count))
+        elif changed:
+            # The search text is not updated if the RADL has not been loaded
+            return db.execute("update inf_list set deleted = %s, data = %s, date = now(), owner = %s, version = %s,"
+                              " search = coalesce(%s, search), created = coalesce(created, %s), state = %s,"
+                              " vm_count = %s where id = %s and version = %s",
+                              (int(inf.deleted), header, owner, old_version + 1, inf.get_search_text(False),
+                               inf.creation_date, state, vm_count, inf.id, old_version), rowcount=True) > 0
         else:
+            return db.execute("update inf_list set date = now(), version = %s, state = %s, vm_count = %s"
+                              " where id = %s and version = %s",
+                              (old_version + 1, state, vm_count, inf.id, old_version), rowcount=True) > 0
+
+    @staticmethod
+    def _save_data_to_db(db_url, inf_list, inf_id=None):
+        with InfrastructureList.get_db_pool(db_url).connection() as db:
+            if db:
+                infs_to_save = inf_list
+                if inf_id:
+                    infs_to_save = {inf_id: inf_list[inf_id]}
+
+                res = True
+                for inf in infs_to_save.values():
+                    # Avoid concurrent saves of the same Inf
+                    with inf.db_lock:
+                        res = InfrastructureList._save_inf_to_db(db, inf) and res
+
+                return res
+            else:
+                InfrastructureList.logger.error("ERROR connecting with the database!.")
+                return None
+
+    @staticmethod
+    def save_cont_msg_chunk(inf_id, vm_id, seq, data):
+        """
+        Store in the DB a chunk of a contextualization log moved out of memory.
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - vm_id(int): VM ID (-1 for the log of the Inf).
+        - seq(int): number of the chunk in the log.
+        - data(str): content of the chunk.
+
+        Returns: True if the chunk has been stored or False otherwise.
+        """
+        try:
+            if InfrastructureList._check_table(Config.DATA_DB):
+                with InfrastructureList.get_db_pool().connection() as db:
+                    if db:
+                        if db.db_type == DataBase.MONGO:
+                            db.replace("cont_msg_list", {"inf_id": inf_id, "vm_id": vm_id, "seq": seq},
+                                       {"inf_id": inf_id, "vm_id": vm_id, "seq": seq, "data": data})
+                        else:
+                            db.execute("replace into cont_msg_list (inf_id, vm_id, seq, data) values"
+                                       " (%s, %s, %s, %s)", (inf_id, vm_id, seq, data))
+                        return True
             InfrastructureList.logger.error("ERROR connecting with the database!.")
-            return None
+        except Exception:
+            InfrastructureList.logger.exception("ERROR saving contextualization log of Inf ID %s." % inf_id)
+        return False
+
+    @staticmethod
+    def get_cont_msg_chunk(inf_id, vm_id, seq):
+        """
+        Get from the DB a chunk of a contextualization log stored with save_cont_msg_chunk.
+
+        Returns: a str with the content of the chunk or None if it is not found.
+        """
+        try:
+            with InfrastructureList.get_db_pool().connection() as db:
+                if db:
+                    if db.db_type == DataBase.MONGO:
+                        res = [(elem['data'],) for elem in db.find("cont_msg_list", {"inf_id": inf_id, "vm_id": vm_id,
+                                                                                     "seq": seq}, {"data": True})]
+                    else:
+                        res = db.select("select data from cont_msg_list where inf_id = %s and vm_id = %s and"
+                                        " seq = %s", (inf_id, vm_id, seq))
+                    if res:
+                        return res[0][0]
+                else:
+                    InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR loading contextualization log of Inf ID %s." % inf_id)
+        return None
 
     @staticmethod
-    def _get_inf_ids_from_db():
+    def delete_cont_msg_chunks(inf_id, vm_id):
+        """ Delete from the DB the chunks of a contextualization log """
         try:
-            db = DataBase(Config.DATA_DB)
-            if db.connect():
-                inf_list = []
-                if db.db_type == DataBase.MONGO:
-                    res = db.find("inf_list", {"deleted": 0}, {"id": True}, [('id', -1)])
+            with InfrastructureList.get_db_pool().connection() as db:
+                if db:
+                    if db.db_type == DataBase.MONGO:
+                        db.delete("cont_msg_list", {"inf_id": inf_id, "vm_id": vm_id})
+                    else:
+                        db.execute("delete from cont_msg_list where inf_id = %s and vm_id = %s", (inf_id, vm_id))
                 else:
-                    res = db.select("select id from inf_list where deleted = 0 order by rowid desc")
-                for elem in res:
+                    InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR deleting contextualization log of Inf ID %s." % inf_id)
+
+    @staticmethod
+    def _get_inf_ids_from_db(inf_id=None):
+        """
+        Get the IDs of the non deleted Infs (or only inf_id if it is set and it is not deleted).
+        """
+        try:
+            with InfrastructureList.get_db_pool().connection() as db:
+                if db:
+                    inf_list = []
                     if db.db_type == DataBase.MONGO:
-                        inf_list.append(elem['id'])
+                        filt = {"deleted": 0}
+                        if inf_id:
+                            filt["id"] = inf_id
+                        res = db.find("inf_list", filt, {"id": True}, [('id', -1)])
+                    elif inf_id:
+                        res = db.select("select id from inf_list where id = %s and deleted = 0", (inf_id,))
                     else:
-                        inf_list.append(elem[0])
+                        res = db.select("select id from inf_list where deleted = 0 order by rowid desc")
+                    for elem in res:
+                        if db.db_type == DataBase.MONGO:
+                            inf_list.append(elem['id'])
+                        else:
+                            inf_list.append(elem[0])
 
-                db.close()
-                return inf_list
-            else:
-                InfrastructureList.logger.error("ERROR connecting with the database!.")
-                return []
+                    return inf_list
+                else:
+                    InfrastructureList.logger.error("ERROR connecting with the database!.")
+                    return []
         except Exception:
             InfrastructureList.logger.exception("ERROR loading data. Correct or delete it!!")
             return []
 
+    @staticmethod
+    def _get_inf_version_from_db(inf_id):
+        """
+        Get the version of the header row of an Inf.
+
+        Returns: the version of the Inf or None if it does not exist or it is deleted.
+        """
+        try:
+            if InfrastructureList._check_table(Config.DATA_DB):
+                with InfrastructureList.get_db_pool().connection() as db:
+                    if db:
+                        if db.db_type == DataBase.MONGO:
+                            res = [(elem.get('version'),) for elem in db.find("inf_list", {"id": inf_id, "deleted": 0},
+                                                                              {"version": True})]
+                        else:
+                            res = db.select("select version from inf_list where id = %s and deleted = 0", (inf_id,))
+                        if res:
+                            return res[0][0] or 0
+                    else:
+                        InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR loading data. Correct or delete it!!")
+        return None
+
+    @staticmethod
+    def _get_inf_ids_by_owner_from_db(owner, literals=None, limit=None, start=None):
+        """
+        Get the IDs of the non deleted Infs owned by owner, plus the ones stored without owner,
+        sorted by creation date (the newest first, and the Infs without creation date at the end)
+        and then by ID.
+        If literals is set the search text of the Infs is also returned, and only the Infs
+        with a search text that contains all the literals (or without search text) are returned.
+
+        Args:
+
+        - owner(str): owner of the Infs.
+        - literals(list of str): literals that the search text of the Infs must contain.
+        - limit(int): max number of Infs to return (None or 0 means no limit).
+        - start(tuple): (creation date, ID) of the Inf after which the Infs are returned.
+
+        Returns: a list of tuples (inf_id, owner, search, created, state, vm_count) where owner is None if
+                 the Inf has no owner set, search is None if it has not been requested or the Inf has no search
+                 text, created is the creation date of the Inf (None in the Infs created by previous versions)
+                 and state and vm_count are the ones stored in the last save of the Inf (None in the Infs not
+                 stored since previous versions).
+        """
+        try:
+            if InfrastructureList._check_table(Config.DATA_DB):
+                with InfrastructureList.get_db_pool().connection() as db:
+                    if db:
+                        if db.db_type == DataBase.MONGO:
+                            owners = [None]
+                            if owner:
+                                owners.append(owner)
+                            filt = {"deleted": 0, "owner": {"$in": owners}}
+                            projection = {"id": True, "owner": True, "created": True, "state": True,
+                                          "vm_count": True}
+                            if literals is not None:
+                                projection["search"] = True
+                            conds = []
+                            if literals:
+                                conds.append({"$or": [{"search": None},
+                                                      {"$and": [{"search": {"$regex": re.escape(literal)}}
+                                                                for literal in literals]}]})
+                            if start:
+                                created, inf_id = start
+                                # The null values are the lowest ones in the sort
+                                if created is None:
+                                    conds.append({"created": None, "id": {"$lt": inf_id}})
+                                else:
+                                    conds.append({"$or": [{"created": {"$lt": created}}, {"created": None},
+                                                          {"created": created, "id": {"$lt": inf_id}}]})
+                            if conds:
+                                filt["$and"] = conds
+                            sort = [('created', -1), ('id', -1)]
+                            res = [(elem['id'], elem.get('owner'), elem.get('search'), elem.get('created'),
+                                    elem.get('state'), elem.get('vm_count'))
+                                   for elem in db.find("inf_list", filt, projection, sort, limit or 0)]
+                        else:
+                            sql = ("select id, owner, %s, created, state, vm_count from inf_list where deleted = 0"
+                                   " and " % ("null" if literals is None else "search"))
+                            if owner:
+                                sql += "(owner = %s or owner is null)"
+                                args = [owner]
+                            else:
+                                sql += "owner is null"
+                                args = []
+                            if literals:
+                                sql += (" and (search is null or (" +
+                                        " and ".join(["search like %s escape '!'"] * len(literals)) + "))")
+                                args.extend(["%" + InfrastructureList._escape_like(literal) + "%"
+                                             for literal in literals])
+                            if start:
+                                created, inf_id = start
+                                # The null values are the lowest ones in the sort
+                                if created is None:
+                                    sql += " and created is null and id < %s"
+                                    args.append(inf_id)
+                                else:
+                                    sql += " and (created < %s or created is null or (created = %s and id < %s))"
+                                    args.extend([created, created, inf_id])
+                            sql += " order by created desc, id desc"
+                            if limit:
+                                sql += " limit %d" % limit
+                            res = db.select(sql, args)
+                        return [(inf_id, inf_owner, search, created, state, vm_count)
+                                for inf_id, inf_owner, search, created, state, vm_count in res]
+                    else:
+                        InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR loading data. Correct or delete it!!")
+        return []
+
+    @staticmethod
+    def _get_inf_created_from_db(inf_id, owner):
+        """
+        Get the creation date of an Inf of a user (or stored without owner), even if it is deleted.
+
+        Returns: the creation date of the Inf (None if it is not set) or False if it does not exist.
+        """
+        try:
+            if InfrastructureList._check_table(Config.DATA_DB):
+                with InfrastructureList.get_db_pool().connection() as db:
+                    if db:
+                        if db.db_type == DataBase.MONGO:
+                            filt = {"id": inf_id, "owner": {"$in": [None, owner]}}
+                            res = [(elem.get('created'),) for elem in db.find("inf_list", filt, {"created": True})]
+                        else:
+                            res = db.select("select created from inf_list where id = %s and"
+                                            " (owner = %s or owner is null)", (inf_id, owner))
+                        if res:
+                            return res[0][0]
+                    else:
+                        InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR loading data. Correct or delete it!!")
+        return False
+
+    @staticmethod
+    def _get_ctxt_inf_ids_from_db():
+        """
+        Get the IDs of the non deleted Infs with the contextualization in progress.
+        """
+        inf_ids = []
+        try:
+            with InfrastructureList.get_db_pool().connection() as db:
+                if db:
+                    if db.db_type == DataBase.MONGO:
+                        res = [(elem['id'], elem['data'])
+                               for elem in db.find("inf_list", {"deleted": 0}, {"id": True, "data": True})]
+                    else:
+                        res = db.select("select id, data from inf_list where deleted = 0")
+                    for inf_id, data in res:
+                        try:
+                            # Only decode the header, without deserializing the Inf
+                            if DataSerializer.loads(data).get('configured', False) is None:
+                                inf_ids.append(inf_id)
+                        except Exception:
+                            InfrastructureList.logger.exception("Error reading data of Inf ID %s." % inf_id)
+                else:
+                    InfrastructureList.logger.error("ERROR connecting with the database!.")
+        except Exception:
+            InfrastructureList.logger.exception("ERROR loading data.")
+        return inf_ids
+
     @staticmethod
     def _reinit():
         """Restart the class attributes to initial values."""
-        InfrastructureList.infrastructure_list = {}
+        InfrastructureList._new_inf_caches()
         InfrastructureList._lock = threading.Lock()
-        db = DataBase(Config.DATA_DB)
-        if db.connect():
-            if db.db_type == DataBase.MONGO:
-                db.delete("inf_list", {})
-            else:
-                db.execute("delete from inf_list")
-            db.close()
+        InfrastructureList._loading = {}
+        with InfrastructureList._pending_cond:
+            InfrastructureList._pending_infs = {}
+        with InfrastructureList.get_db_pool().connection() as db:
+            if db:
+                if db.db_type == DataBase.MONGO:
+                    db.delete("inf_list", {})
+                    db.delete("vm_list", {})
+                    db.delete("inf_archive", {})
+                    db.delete("cont_msg_list", {})
+                else:
+                    db.execute("delete from inf_list")
+                    db.execute("delete from vm_list")
+                    db.execute("delete from inf_archive")
+                    db.execute("delete from cont_msg_list")
@@ -14,7 +14,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import re
 import yaml
 import json
 import os
@@ -22,6 +21,8 @@ import string
 import random
 import logging
 import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 import IM.InfrastructureInfo
 import IM.InfrastructureList
@@ -39,10 +40,10 @@ from radl.radl_json import dump_radl as dump_radl_json
 
 from IM.openid.JWT import JWT
 from IM.openid.OpenIDClient import OpenIDClient
-
-
-if Config.MAX_SIMULTANEOUS_LAUNCHES > 1:
-    from multiprocessing.pool import ThreadPool
+from IM.admission import AdmissionControl, BusyException
+from IM.events import ChangeEvents
+from IM.poller import VMStatusPoller
+from IM.request import get_lanes_stats
 
 try:
     unicode("hola")
@@ -106,6 +107,15 @@ class InfrastructureManager:
     logger = logging.getLogger('InfrastructureManager')
     """Logger object."""
 
+    INF_LIST_FIELDS = ["state", "vm_count", "creation_date"]
+    """Fields that can be included in the items returned by GetInfrastructureList."""
+
+    _update_pool = None
+    """Pool of threads shared by all the requests to update the status of the VMs."""
+
+    _update_pool_lock = threading.Lock()
+    """Lock to create the pool of threads to update the status of the VMs."""
+
     @staticmethod
     def _reinit():
         """Restart the class attributes to initial values."""
@@ -231,7 +241,7 @@ class InfrastructureManager:
     def get_infrastructure(inf_id, auth):
         """Return infrastructure info with some id if valid authorization provided."""
 
-        if inf_id not in IM.InfrastructureList.InfrastructureList.get_inf_ids():
+        if not IM.InfrastructureList.InfrastructureList.has_infrastructure(inf_id):
             InfrastructureManager.logger.error("Error, incorrect Inf ID: %s" % inf_id)
             raise IncorrectInfrastructureException()
         sel_inf = IM.InfrastructureList.InfrastructureList.get_infrastructure(inf_id)
@@ -247,6 +257,62 @@ class InfrastructureManager:
 
         return sel_inf
 
+    @staticmethod
+    def _get_vm_ids(vm_list, function):
+        """ Get the list of VM ids from a str (comma separated), int or list of str parameter """
+        if isinstance(vm_list, str):
+            return vm_list.split(",")
+        elif isinstance(vm_list, int):
+            return [str(vm_list)]
+        elif isinstance(vm_list, list):
+            return vm_list
+        else:
+            raise Exception(
+                'Incorrect parameter type to %s function: expected: str, int or list of str.' % function)
+
+    @staticmethod
+    def _get_update_pool():
+        """ Get the pool of threads shared by all the requests to update the status of the VMs """
+        with InfrastructureManager._update_pool_lock:
+            if InfrastructureManager._update_pool is None:
+                InfrastructureManager._update_pool = ThreadPool(processes=Config.VM_INFO_UPDATE_THREADS)
+            return InfrastructureManager._update_pool
+
+    @staticmethod
+    def _update_vms_status(vm_list, auth, timeout=None):
+        """
+        Update the status of a list of VMs, requesting in parallel the info of the ones that are outdated.
+        It waits at most timeout secs (VM_INFO_UPDATE_TIMEOUT by default) for the updates, the VMs not
+        updated in time keep their cached status (and they are updated in background).
+
+        Return: the list of VMs whose status could not be updated in time.
+        """
+        if timeout is None:
+            timeout = Config.VM_INFO_UPDATE_TIMEOUT
+        outdated = [vm for vm in vm_list if vm.is_update_needed()]
+        stale = []
+        if Config.VM_INFO_UPDATE_THREADS > 0 and outdated:
+            pool = InfrastructureManager._get_update_pool()
+            results = []
+            # The VMs of the same cloud provider are updated with a single request if the connector supports it
+            for group in VirtualMachine.group_by_cloud(outdated):
+                if len(group) > 1:
+                    results.append((group, pool.apply_async(VirtualMachine.update_status_batch, (group, auth))))
+                else:
+                    results.append((group, pool.apply_async(group[0].update_status, (auth,))))
+            deadline = time.time() + timeout
+            for group, result in results:
+                result.wait(max(0, deadline - time.time()))
+                if not result.ready():
+                    stale.extend(group)
+            if stale:
+                InfrastructureManager.logger.warn("The status of %d VMs could not be updated in %s secs." %
+                                                  (len(stale), timeout))
+            vm_list = [vm for vm in vm_list if vm not in outdated]
+        for vm in vm_list:
+            vm.update_status(auth)
+        return stale
+
     @staticmethod
     def get_vm_from_inf(inf_id, vm_id, auth):
         """Return VirtualMachie info with some id of an infrastructure if valid authorization provided."""
@@ -341,7 +407,7 @@ class InfrastructureManager:
         sel_inf.ansible_configured = None
         sel_inf.Contextualize(auth, vm_list)
 
-        IM.InfrastructureList.InfrastructureList.save_data(inf_id)
+        IM.InfrastructureList.InfrastructureList.save_data(sel_inf, sync=True)
 
         return ""
 
@@ -493,7 +559,8 @@ class InfrastructureManager:
     @staticmethod
     def AddResource(inf_id, radl_data, auth, context=True):
         """
-        Add the resources in the RADL to the infrastructure.
+        Add the resources in the RADL to the infrastructure,
+        if the admission control limits of the user and the clouds are not exceeded.
 
         Args:
 
@@ -509,6 +576,23 @@ class InfrastructureManager:
 
         auth = InfrastructureManager.check_auth_data(auth)
 
+        with AdmissionControl.admit(auth):
+            return InfrastructureManager._add_resource(inf_id, radl_data, auth, context)
+
+    @staticmethod
+    def _add_resource(inf_id, radl_data, auth, context=True):
+        """
+        Add the resources in the RADL to the infrastructure.
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - radl(str): RADL description.
+        - auth(Authentication): parsed authentication tokens.
+        - context(bool): Flag to specify if the ctxt step will be made
+
+        Return(list of int): ids of the new virtual machine created.
+        """
         InfrastructureManager.logger.info("Adding resources to Inf ID: " + str(inf_id))
 
         sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
@@ -590,34 +674,46 @@ class InfrastructureManager:
         deploys_group_cloud = InfrastructureManager.sort_by_score(sel_inf, concrete_systems, cloud_list,
                                                                   deploy_groups, auth)
 
+        # Wait for free slots in the cloud providers selected to launch the VMs
+        clouds = [cloud_list[deploys_group_cloud[id(deploy_group)]].cloud for deploy_group in deploy_groups
+                  if id(deploy_group) in deploys_group_cloud]
+        try:
+            ticket = AdmissionControl.admit(auth, clouds)
+        except BusyException as ex:
+            if sel_inf.configured is None:
+                sel_inf.configured = False
+            sel_inf.add_cont_msg("Error launching the VMs: %s" % str(ex))
+            raise ex
+
         # We are going to start adding resources
         sel_inf.set_adding()
 
-        # Launch every group in the same cloud provider
-        deployed_vm = {}
-        for deploy_group in deploy_groups:
-            if not deploy_group:
-                InfrastructureManager.logger.warning("Inf ID: %s: No VMs to deploy!" % sel_inf.id)
-                sel_inf.add_cont_msg("No VMs to deploy. Exiting.")
-                if sel_inf.configured is None:
-                    sel_inf.configured = False
-                return []
-
-            cloud_id = deploys_group_cloud[id(deploy_group)]
-            cloud = cloud_list[cloud_id]
-            if Config.MAX_SIMULTANEOUS_LAUNCHES > 1:
-                pool = ThreadPool(processes=Config.MAX_SIMULTANEOUS_LAUNCHES)
-                pool.map(
-                    lambda deploy: InfrastructureManager._launch_deploy(sel_inf, deploy, cloud_id,
-                                                                        cloud, concrete_systems, radl, auth,
-                                                                        deployed_vm),
-                    deploy_group)
-                pool.close()
-            else:
-                for deploy in deploy_group:
-                    InfrastructureManager._launch_deploy(sel_inf, deploy, cloud_id,
-                                                         cloud, concrete_systems, radl,
-                                                         auth, deployed_vm)
+        with ticket:
+            # Launch every group in the same cloud provider
+            deployed_vm = {}
+            for deploy_group in deploy_groups:
+                if not deploy_group:
+                    InfrastructureManager.logger.warning("Inf ID: %s: No VMs to deploy!" % sel_inf.id)
+                    sel_inf.add_cont_msg("No VMs to deploy. Exiting.")
+                    if sel_inf.configured is None:
+                        sel_inf.configured = False
+                    return []
+
+                cloud_id = deploys_group_cloud[id(deploy_group)]
+                cloud = cloud_list[cloud_id]
+                if Config.MAX_SIMULTANEOUS_LAUNCHES > 1:
+                    pool = ThreadPool(processes=Config.MAX_SIMULTANEOUS_LAUNCHES)
+                    pool.map(
+                        lambda deploy: InfrastructureManager._launch_deploy(sel_inf, deploy, cloud_id,
+                                                                            cloud, concrete_systems, radl, auth,
+                                                                            deployed_vm),
+                        deploy_group)
+                    pool.close()
+                else:
+                    for deploy in deploy_group:
+                        InfrastructureManager._launch_deploy(sel_inf, deploy, cloud_id,
+                                                             cloud, concrete_systems, radl,
+                                                             auth, deployed_vm)
 
         # We make this to maintain the order of the VMs in the sel_inf.vm_list
         # according to the deploys shown in the RADL
@@ -675,7 +771,7 @@ class InfrastructureManager:
         if context and new_vms and not all_failed:
             sel_inf.Contextualize(auth)
 
-        IM.InfrastructureList.InfrastructureList.save_data(inf_id)
+        IM.InfrastructureList.InfrastructureList.save_data(sel_inf, sync=True)
 
         if all_failed and new_vms:
             # if there are no VMs, set it as unconfigured
@@ -688,7 +784,8 @@ class InfrastructureManager:
     @staticmethod
     def RemoveResource(inf_id, vm_list, auth, context=True):
         """
-        Remove a list of resources from the infrastructure.
+        Remove a list of resources from the infrastructure,
+        if the admission control limits of the user and the clouds are not exceeded.
 
         Args:
 
@@ -707,20 +804,28 @@ class InfrastructureManager:
         InfrastructureManager.logger.info("Removing the VMs: " + str(vm_list) + " from Inf ID: '" + str(inf_id) + "'")
 
         sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
+        vm_ids = InfrastructureManager._get_vm_ids(vm_list, "RemoveResource")
+        delete_list = [sel_inf.get_vm(vmid) for vmid in vm_ids]
 
-        if isinstance(vm_list, str):
-            vm_ids = vm_list.split(",")
-        elif isinstance(vm_list, int):
-            vm_ids = [str(vm_list)]
-        elif isinstance(vm_list, list):
-            vm_ids = vm_list
-        else:
-            raise Exception(
-                'Incorrect parameter type to RemoveResource function: expected: str, int or list of str.')
+        with AdmissionControl.admit(auth, [vm.cloud for vm in delete_list]):
+            return InfrastructureManager._remove_resource(sel_inf, delete_list, auth, context)
+
+    @staticmethod
+    def _remove_resource(sel_inf, delete_list, auth, context=True):
+        """
+        Remove a list of resources from the infrastructure.
+
+        Args:
+
+        - sel_inf(InfrastructureInfo): infrastructure.
+        - delete_list(list of VirtualMachine): virtual machines to remove.
+        - auth(Authentication): parsed authentication tokens.
+        - context(bool): Flag to specify if the ctxt step will be made
 
+        Return(int): number of undeployed virtual machines.
+        """
         cont = 0
         exceptions = []
-        delete_list = [sel_inf.get_vm(vmid) for vmid in vm_ids]
         for vm in delete_list:
             if vm.delete(delete_list, auth, exceptions):
                 cont += 1
@@ -731,7 +836,7 @@ class InfrastructureManager:
             # Now test again if the infrastructure is contextualizing
             sel_inf.Contextualize(auth)
 
-        IM.InfrastructureList.InfrastructureList.save_data(inf_id)
+        IM.InfrastructureList.InfrastructureList.save_data(sel_inf, sync=True)
 
         if exceptions:
             InfrastructureManager.logger.exception("Inf ID: " + sel_inf.id + ": Error removing resources")
@@ -794,6 +899,43 @@ class InfrastructureManager:
         else:
             return vm.get_vm_info()
 
+    @staticmethod
+    def GetVMsInfo(inf_id, vm_list, auth, json_res=False):
+        """
+        Get information about a list of virtual machines in an infrastructure.
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - vm_list(str, int or list of str): list of virtual machine ids. If empty all the VMs will be returned.
+        - auth(Authentication): parsed authentication tokens.
+        - json_res(bool): Flag to return the info in RADL JSON format
+
+        Return: a dict indexed with the VM ID and the RADL with the information about the VM
+                (or a str with the JSON data if json_res flag) as value.
+        """
+        auth = InfrastructureManager.check_auth_data(auth)
+
+        InfrastructureManager.logger.info(
+            "Get information about the vms: '" + str(vm_list) + "' from Inf ID: " + str(inf_id))
+
+        sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
+        if vm_list or vm_list == 0:
+            vm_ids = InfrastructureManager._get_vm_ids(vm_list, "GetVMsInfo")
+            vms = [sel_inf.get_vm(vm_id) for vm_id in vm_ids]
+        else:
+            vms = sel_inf.get_vm_list()
+
+        InfrastructureManager._update_vms_status(vms, auth)
+
+        res = {}
+        for vm in vms:
+            if json_res:
+                res[str(vm.im_id)] = dump_radl_json(vm.get_vm_info())
+            else:
+                res[str(vm.im_id)] = vm.get_vm_info()
+        return res
+
     @staticmethod
     def GetVMContMsg(inf_id, vm_id, auth):
         """
@@ -815,10 +957,78 @@ class InfrastructureManager:
         vm = InfrastructureManager.get_vm_from_inf(inf_id, vm_id, auth)
 
         cont_msg = vm.get_cont_msg()
-        InfrastructureManager.logger.debug("Inf ID: " + str(inf_id) + ": " + cont_msg)
+        InfrastructureManager.logger.debug("Inf ID: " + str(inf_id) + ": Returning %d chars of the VM cont msg." %
+                                           len(cont_msg))
 
         return cont_msg
 
+    @staticmethod
+    def GetVMContMsgFragment(inf_id, vm_id, auth, offset=0, tail=None):
+        """
+        Get a fragment of the contextualization log of a virtual machine in an infrastructure.
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - vm_id(str): virtual machine id.
+        - auth(Authentication): parsed authentication tokens.
+        - offset(int): position (in chars) of the log where the fragment starts.
+        - tail(int): if set, return only the last tail lines of the log (from the offset).
+
+        Return: a tuple with the list of str of the fragment and the offset of the end of the log.
+        """
+        auth = InfrastructureManager.check_auth_data(auth)
+
+        InfrastructureManager.logger.info(
+            "Get contextualization log of the vm: '" + str(vm_id) + "' from Inf ID: " + str(inf_id))
+
+        vm = InfrastructureManager.get_vm_from_inf(inf_id, vm_id, auth)
+        return InfrastructureManager._get_log_fragment(vm.get_cont_msg_parts(True), offset, tail)
+
+    @staticmethod
+    def _get_log_fragment(parts, offset=0, tail=None):
+        """
+        Get a fragment of a log composed by a list of str, without joining the whole log.
+
+        Args:
+
+        - parts(list of str): parts of the log.
+        - offset(int): position (in chars) of the log where the fragment starts.
+        - tail(int): if set, return only the last tail lines of the log (from the offset).
+
+        Return: a tuple with the list of str of the fragment and the offset of the end of the log.
+        """
+        size = sum(len(part) for part in parts)
+        start = max(offset or 0, 0)
+        if tail is not None:
+            # Find the newline before the last tail lines
+            # (the newline at the end of the log does not start a new line)
+            non_empty = [part for part in parts if part]
+            newlines = tail + 1 if non_empty and non_empty[-1].endswith("\n") else tail
+            tail_start = 0 if newlines else size
+            pos = size
+            for part in reversed(parts):
+                if not newlines:
+                    break
+                end = len(part)
+                while newlines:
+                    end = part.rfind("\n", 0, end)
+                    if end == -1:
+                        break
+                    newlines -= 1
+                if not newlines:
+                    tail_start = pos - len(part) + end + 1
+                pos -= len(part)
+            start = max(start, tail_start)
+
+        res = []
+        pos = 0
+        for part in parts:
+            if pos + len(part) > start:
+                res.append(part[max(start - pos, 0):])
+            pos += len(part)
+        return res, size
+
     @staticmethod
     def AlterVM(inf_id, vm_id, radl_data, auth):
         """
@@ -858,7 +1068,7 @@ class InfrastructureManager:
             raise Exception("Error modifying the information about the VM %s: %s" % (vm_id, alter_res))
 
         vm.update_status(auth)
-        IM.InfrastructureList.InfrastructureList.save_data(inf_id)
+        IM.InfrastructureList.InfrastructureList.save_data(vm.inf, sync=True)
 
         return vm.info
 
@@ -925,19 +1135,130 @@ class InfrastructureManager:
             "Getting cont msg of the Inf ID: " + str(inf_id))
 
         sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
-        res = sel_inf.cont_out
+        res = "".join(InfrastructureManager._get_inf_cont_msg_parts(sel_inf, headeronly))
+
+        InfrastructureManager.logger.debug("Inf ID: " + sel_inf.id + ": Returning %d chars of cont msg." % len(res))
+        return res
+
+    @staticmethod
+    def GetInfrastructureContMsgFragment(inf_id, auth, headeronly=False, offset=None, tail=None):
+        """
+        Get a fragment of the cont msg of an infrastructure.
+
+        As the logs of the infrastructure and the VMs grow independently, the position in the
+        cont msg is a cursor with the offset of each log: "<inf offset>[,<vm id>:<vm offset>]*".
+        The fragment contains the new content of the infrastructure log followed by the new
+        content of each VM log (with the same VM header and separator of the whole cont msg).
 
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - auth(Authentication): parsed authentication tokens.
+        - headeronly(bool): Flag to return only the header part of the infra log.
+        - offset(str): cursor returned by a previous call (see :py:meth:`parse_cont_msg_cursor`).
+        - tail(int): if set, return only the last tail lines of the fragment.
+
+        Return: a tuple with the list of str of the fragment and the cursor of the end of the logs.
+        """
+        auth = InfrastructureManager.check_auth_data(auth)
+        inf_offset, vm_offsets = InfrastructureManager.parse_cont_msg_cursor(offset)
+
+        InfrastructureManager.logger.info(
+            "Getting cont msg of the Inf ID: " + str(inf_id))
+
+        sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
+        inf_parts = IM.InfrastructureInfo.InfrastructureInfo.cont_out.get_parts(sel_inf, True)
+        res, size = InfrastructureManager._get_new_log_content(inf_parts, inf_offset)
+        cursor = [str(size)]
         if not headeronly:
             for vm in sel_inf.get_vm_list():
-                if vm.get_cont_msg():
-                    res += "VM " + str(vm.im_id) + ":\n" + vm.get_cont_msg() + "\n"
-                    res += "***************************************************************************\n"
+                vm_res, size = InfrastructureManager._get_new_log_content(vm.get_cont_msg_parts(True),
+                                                                          vm_offsets.get(str(vm.im_id), 0))
+                cursor.append("%s:%d" % (vm.im_id, size))
+                if any(vm_res):
+                    res.append("VM " + str(vm.im_id) + ":\n")
+                    res.extend(vm_res)
+                    res.append("\n***************************************************************************\n")
+        if tail is not None:
+            res, _ = InfrastructureManager._get_log_fragment(res, 0, tail)
+        return res, ",".join(cursor)
 
-        InfrastructureManager.logger.debug("Inf ID: " + sel_inf.id + ": " + res)
+    @staticmethod
+    def parse_cont_msg_cursor(cursor):
+        """
+        Parse a cursor of the cont msg of an infrastructure: "<inf offset>[,<vm id>:<vm offset>]*".
+        A plain integer is the offset of the infrastructure log (the VM logs start from the beginning).
+        Raises ValueError if it is not valid.
+
+        Return: a tuple with the offset of the infrastructure log and a dict with the offsets of the VM logs.
+        """
+        if cursor is None or cursor == "":
+            return 0, {}
+        items = str(cursor).split(",")
+        inf_offset = int(items[0])
+        vm_offsets = {}
+        for item in items[1:]:
+            vm_id, vm_offset = item.split(":")
+            vm_offsets[vm_id] = int(vm_offset)
+        if inf_offset < 0 or any(value < 0 for value in vm_offsets.values()):
+            raise ValueError("Negative offset value")
+        return inf_offset, vm_offsets
+
+    @staticmethod
+    def _get_new_log_content(parts, offset):
+        """
+        Get the content of a log from the offset and the size of the log.
+        If the log is shorter than the offset it has been restarted, so the whole log is returned.
+        """
+        res, size = InfrastructureManager._get_log_fragment(parts, offset)
+        if offset > size:
+            res, size = InfrastructureManager._get_log_fragment(parts)
+        return res, size
+
+    @staticmethod
+    def _get_inf_cont_msg_parts(sel_inf, headeronly=False):
+        """
+        Get the list of str that compose the cont msg of an infrastructure.
+        """
+        res = IM.InfrastructureInfo.InfrastructureInfo.cont_out.get_parts(sel_inf)
+        if not headeronly:
+            for vm in sel_inf.get_vm_list():
+                vm_parts = vm.get_cont_msg_parts()
+                if any(vm_parts):
+                    res.append("VM " + str(vm.im_id) + ":\n")
+                    res.extend(vm_parts)
+                    res.append("\n***************************************************************************\n")
         return res
 
     @staticmethod
-    def GetInfrastructureState(inf_id, auth):
+    def GetInfrastructureETag(inf_id, auth, update_vms=None, variant=""):
+        """
+        Get an entity tag of the current content of an infrastructure, so the conditional requests
+        can be answered without building their response (see :py:meth:`ChangeEvents.get_etag`).
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - auth(Authentication): parsed authentication tokens.
+        - update_vms(bool or list of str): update the status of all the VMs (True) or the ones in the list
+          before getting the tag, as the request of the content would do.
+        - variant(str): representation of the content (i.e. the request and its parameters).
+
+        Return: a str with the entity tag.
+        """
+        auth = InfrastructureManager.check_auth_data(auth)
+
+        sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
+        if update_vms is True:
+            InfrastructureManager._update_vms_status(sel_inf.get_vm_list(), auth)
+        elif update_vms:
+            vm_ids = InfrastructureManager._get_vm_ids(update_vms, "GetInfrastructureETag")
+            InfrastructureManager._update_vms_status([sel_inf.get_vm(vm_id) for vm_id in vm_ids], auth)
+
+        return ChangeEvents.get_etag(sel_inf.id, sel_inf.get_db_version(), variant)
+
+    @staticmethod
+    def GetInfrastructureState(inf_id, auth, wait_version=None, timeout=None):
         """
         Get the aggregated state of an infrastructure.
 
@@ -945,10 +1266,14 @@ class InfrastructureManager:
 
         - inf_id(str): infrastructure id.
         - auth(Authentication): parsed authentication tokens.
+        - wait_version(int): if set, wait until the version of the Inf is different from this one.
+        - timeout(int): max time to wait for a change (limited to MAX_STATE_WAIT).
 
-        Return: a dict with two elements:
+        Return: a dict with four elements:
             - 'state': str with the aggregated state of the infrastructure
             - 'vm_states': a dict indexed with the id of the VM and its state as value
+            - 'version': int with the version of the last change of the Inf
+            - 'stale': list of ids of the VMs whose state could not be updated in time
         """
         auth = InfrastructureManager.check_auth_data(auth)
 
@@ -956,54 +1281,39 @@ class InfrastructureManager:
 
         sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
 
+        if wait_version is not None:
+            InfrastructureManager._wait_infrastructure_change(sel_inf, auth, wait_version, timeout)
+
+        # Get the version before updating the states, to not miss any change
+        version = ChangeEvents.get_version(sel_inf.id)
         vm_list = sel_inf.get_vm_list()
+        # First try to update the status of the VMs
+        stale = InfrastructureManager._update_vms_status(vm_list, auth)
         vm_states = {}
         for vm in vm_list:
-            # First try to update the status of the VM
-            vm.update_status(auth)
             vm_states[str(vm.im_id)] = vm.state
 
-        state = None
-        for vm in vm_list:
-            # First try to update the status of the VM
-            if vm.state == VirtualMachine.FAILED:
-                state = VirtualMachine.FAILED
-                break
-            elif vm.state == VirtualMachine.UNKNOWN:
-                state = VirtualMachine.UNKNOWN
-                break
-            elif vm.state == VirtualMachine.PENDING:
-                state = VirtualMachine.PENDING
-            elif vm.state == VirtualMachine.RUNNING:
-                if state != VirtualMachine.PENDING:
-                    state = VirtualMachine.RUNNING
-            elif vm.state == VirtualMachine.STOPPED:
-                if state is None:
-                    state = VirtualMachine.STOPPED
-            elif vm.state == VirtualMachine.OFF:
-                if state is None:
-                    state = VirtualMachine.OFF
-            elif vm.state == VirtualMachine.CONFIGURED:
-                if state is None:
-                    state = VirtualMachine.CONFIGURED
-            elif vm.state == VirtualMachine.UNCONFIGURED:
-                if state is None or state == VirtualMachine.CONFIGURED:
-                    state = VirtualMachine.UNCONFIGURED
-
-        if state is None:
-            if sel_inf.configured is False:
-                state = VirtualMachine.FAILED
-            elif not vm_list and sel_inf.configured is None:
-                # if there are no vms we probably are in the vm creation process
-                state = VirtualMachine.PENDING
-            else:
-                state = VirtualMachine.UNKNOWN
-
-        if sel_inf.deleting:
-            state = VirtualMachine.DELETING
+        state = sel_inf.get_aggregated_state(vm_list)
 
         InfrastructureManager.logger.info("Inf ID: " + str(inf_id) + " is in state: " + state)
-        return {'state': state, 'vm_states': vm_states}
+        return {'state': state, 'vm_states': vm_states, 'version': version,
+                'stale': [str(vm.im_id) for vm in stale]}
+
+    @staticmethod
+    def _wait_infrastructure_change(sel_inf, auth, version, timeout=None):
+        """
+        Wait until the version of the Inf is different from the specified one.
+        Meanwhile the status of the VMs is updated every VM_INFO_UPDATE_FREQUENCY secs,
+        so all the clients waiting for the same Inf share the requests to the cloud providers.
+        The updates never wait beyond the end of the wait.
+        """
+        if timeout is None or timeout > Config.MAX_STATE_WAIT:
+            timeout = Config.MAX_STATE_WAIT
+        end = time.time() + timeout
+        while ChangeEvents.get_version(sel_inf.id) == version and time.time() < end:
+            InfrastructureManager._update_vms_status(sel_inf.get_vm_list(), auth,
+                                                     max(0, min(end - time.time(), Config.VM_INFO_UPDATE_TIMEOUT)))
+            ChangeEvents.wait(sel_inf.id, version, min(end - time.time(), Config.VM_INFO_UPDATE_FREQUENCY))
 
     @staticmethod
     def _stop_vm(vm, auth, exceptions):
@@ -1252,17 +1562,15 @@ class InfrastructureManager:
         auth = InfrastructureManager.check_auth_data(auth)
 
         sel_inf = InfrastructureManager.get_infrastructure(inf_id, auth)
-        # First set this infra as "deleting"
-        sel_inf.set_deleting()
-
-        if async_call:
-            t = threading.Thread(name="DestroyResource-%s" % sel_inf.id,
-                                 target=sel_inf.destroy,
-                                 args=(auth, force))
-            t.daemon = True
-            t.start()
-        else:
-            sel_inf.destroy(auth, force)
+        with AdmissionControl.admit(auth, [vm.cloud for vm in sel_inf.get_vm_list()]) as ticket:
+            # First set this infra as "deleting"
+            sel_inf.set_deleting()
+
+            if async_call:
+                AdmissionControl.start_thread(ticket, "DestroyResource-%s" % sel_inf.id, sel_inf.destroy,
+                                              (auth, force))
+            else:
+                sel_inf.destroy(auth, force)
         return ""
 
     @staticmethod
@@ -1415,10 +1723,8 @@ class InfrastructureManager:
     @staticmethod
     def CreateInfrastructure(radl_data, auth, async_call=False):
         """
-        Create a new infrastructure.
-
-        IM creates an infrastructure based on the RADL description and associated it to
-        the first valid IM user in the authentication tokens.
+        Create a new infrastructure,
+        if the admission control limits of the user and the clouds are not exceeded.
 
         Args:
 
@@ -1434,7 +1740,28 @@ class InfrastructureManager:
         # First check the auth data
         auth = InfrastructureManager.check_auth_data(auth)
 
-        # Then parse the RADL
+        # The slots of the clouds are acquired by AddResource once the VMs are scheduled
+        with AdmissionControl.admit(auth) as ticket:
+            return InfrastructureManager._create_infrastructure(radl_data, auth, async_call, ticket)
+
+    @staticmethod
+    def _create_infrastructure(radl_data, auth, async_call=False, ticket=None):
+        """
+        Create a new infrastructure.
+
+        IM creates an infrastructure based on the RADL description and associated it to
+        the first valid IM user in the authentication tokens.
+
+        Args:
+
+        - radl_data(RADL): RADL description.
+        - auth(Authentication): parsed authentication tokens.
+        - async_call(bool): Create the inf in an async way.
+        - ticket(AdmissionTicket): slots of the admission control to transfer to the async thread.
+
+        Return(int): the new infrastructure ID if successful.
+        """
+        # Parse the RADL
         if isinstance(radl_data, RADL):
             radl = radl_data
         else:
@@ -1446,18 +1773,22 @@ class InfrastructureManager:
         inf = IM.InfrastructureInfo.InfrastructureInfo()
         inf.auth = Authentication(auth.getAuthInfo("InfrastructureManager"))
         IM.InfrastructureList.InfrastructureList.add_infrastructure(inf)
-        IM.InfrastructureList.InfrastructureList.save_data(inf.id)
+        IM.InfrastructureList.InfrastructureList.save_data(inf, sync=True)
         InfrastructureManager.logger.info("Creating new Inf ID: " + str(inf.id))
 
         # Add the resources in radl_data
         try:
             if async_call:
                 InfrastructureManager.logger.debug("Inf ID: " + str(inf.id) + " created Async.")
-                t = threading.Thread(name="AddResource-%s" % inf.id,
-                                     target=InfrastructureManager.AddResource,
-                                     args=(inf.id, radl, auth))
-                t.daemon = True
-                t.start()
+                if ticket:
+                    AdmissionControl.start_thread(ticket, "AddResource-%s" % inf.id,
+                                                  InfrastructureManager.AddResource, (inf.id, radl, auth))
+                else:
+                    t = threading.Thread(name="AddResource-%s" % inf.id,
+                                         target=InfrastructureManager.AddResource,
+                                         args=(inf.id, radl, auth))
+                    t.daemon = True
+                    t.start()
             else:
                 # In case of sync call
                 vms = InfrastructureManager.AddResource(inf.id, radl, auth)
@@ -1483,7 +1814,7 @@ class InfrastructureManager:
         except Exception as e:
             InfrastructureManager.logger.exception("Error Creating Inf ID " + str(inf.id))
             inf.delete()
-            IM.InfrastructureList.InfrastructureList.save_data(inf.id)
+            IM.InfrastructureList.InfrastructureList.save_data(inf, sync=True)
             IM.InfrastructureList.InfrastructureList.remove_inf(inf)
             raise e
 
@@ -1492,7 +1823,7 @@ class InfrastructureManager:
         return inf.id
 
     @staticmethod
-    def GetInfrastructureList(auth, flt=None):
+    def GetInfrastructureList(auth, flt=None, limit=None, after=None, include=None):
         """
         Return the infrastructure ids associated to IM tokens.
 
@@ -1501,8 +1832,14 @@ class InfrastructureManager:
         - auth(Authentication): parsed authentication tokens.
         - flt(string): string to filter the list of returned infrastructures.
                           A regex to be applied in the RADL or TOSCA of the infra.
-
-        Return(list of int): list of infrastructure ids.
+        - limit(int): max number of infrastructures to return (None or 0 means no limit).
+        - after(str): return the infrastructures after the one with this id in the list.
+        - include(str or list of str): fields to add to each infrastructure (comma separated):
+                          "state", "vm_count" and/or "creation_date".
+
+        Return(list of str or list of dict): list of infrastructure ids sorted by creation date (the newest first)
+                          or, if include is set, a list of dicts with the "id" of each infrastructure
+                          and the requested fields.
         """
         auth = InfrastructureManager.check_auth_data(auth)
 
@@ -1513,20 +1850,39 @@ class InfrastructureManager:
             InfrastructureManager.logger.error("No correct auth data has been specified.")
             raise InvaliddUserException()
 
-        inf_ids = IM.InfrastructureList.InfrastructureList.get_inf_ids(auth)
-        if flt:
-            res = []
-            for infid in inf_ids:
-                inf = InfrastructureManager.get_infrastructure(infid, auth)
-                radl = str(inf.get_radl())
-                tosca = ""
-                if "TOSCA" in inf.extra_info:
-                    tosca = inf.extra_info["TOSCA"].serialize()
-
-                if re.search(flt, radl) or re.search(flt, tosca):
-                    res.append(infid)
-        else:
-            res = inf_ids
+        if include:
+            if not isinstance(include, list):
+                include = str(include).split(",")
+            for field in include:
+                if field not in InfrastructureManager.INF_LIST_FIELDS:
+                    raise Exception("Invalid field %s in include parameter. Valid values: %s." %
+                                    (field, ", ".join(InfrastructureManager.INF_LIST_FIELDS)))
+        if limit and (not isinstance(limit, int) or limit < 0):
+            raise Exception("Incorrect value in limit parameter: %s." % limit)
+
+        inf_list = IM.InfrastructureList.InfrastructureList.get_inf_list(auth, flt, limit, after)
+        if not include:
+            return [inf_id for inf_id, _, _, _ in inf_list]
+
+        res = []
+        for inf_id, created, state, vm_count in inf_list:
+            item = {"id": inf_id}
+            if "creation_date" in include:
+                # 0 in the Infs created by previous versions
+                item["creation_date"] = created or 0
+            if ("state" in include or "vm_count" in include) and state is None:
+                # The Infs not stored since previous versions must be loaded to get them
+                # The deleted ones have been already discarded in the list
+                sel_inf = IM.InfrastructureList.InfrastructureList.get_infrastructure(inf_id)
+                vm_list = sel_inf.get_vm_list() if sel_inf else []
+                state = sel_inf.get_aggregated_state(vm_list) if sel_inf else VirtualMachine.UNKNOWN
+                vm_count = len(vm_list)
+            # Use the data stored in the IM, without contacting the cloud providers
+            if "state" in include:
+                item["state"] = state
+            if "vm_count" in include:
+                item["vm_count"] = vm_count
+            res.append(item)
         return res
 
     @staticmethod
@@ -1542,7 +1898,7 @@ class InfrastructureManager:
         InfrastructureManager.logger.info("Exporting Inf ID: " + str(sel_inf.id))
         if delete:
             sel_inf.delete()
-            IM.InfrastructureList.InfrastructureList.save_data(sel_inf.id)
+            IM.InfrastructureList.InfrastructureList.save_data(sel_inf, sync=True)
             IM.InfrastructureList.InfrastructureList.remove_inf(sel_inf)
         return str_inf
 
@@ -1565,7 +1921,7 @@ class InfrastructureManager:
         IM.InfrastructureList.InfrastructureList.add_infrastructure(new_inf)
         InfrastructureManager.logger.info("Importing new infrastructure with Inf ID: " + str(new_inf.id))
         # Save the state
-        IM.InfrastructureList.InfrastructureList.save_data(new_inf.id)
+        IM.InfrastructureList.InfrastructureList.save_data(new_inf, sync=True)
         return new_inf.id
 
     @staticmethod
@@ -1602,6 +1958,49 @@ class InfrastructureManager:
         else:
             return image_url
 
+    @staticmethod
+    def get_stats():
+        """
+        Get the internal metrics of the IM service: the request queues and worker pools, the caches
+        of Infs, the admission control and the VM status poller.
+        """
+        return {"requests": get_lanes_stats(),
+                "caches": IM.InfrastructureList.InfrastructureList.get_cache_stats(),
+                "admission": AdmissionControl.get_stats(),
+                "poller": VMStatusPoller.get_stats()}
+
+    @staticmethod
+    def start_stats_log_job():
+        """
+        Launch a thread that logs the internal metrics of the IM service every STATS_LOG_INTERVAL secs.
+        """
+        t = threading.Thread(name="StatsLog", target=InfrastructureManager._stats_log_loop)
+        t.daemon = True
+        t.start()
+        return t
+
+    @staticmethod
+    def _stats_log_loop():
+        while True:
+            time.sleep(Config.STATS_LOG_INTERVAL)
+            InfrastructureManager.log_stats()
+
+    @staticmethod
+    def log_stats():
+        """
+        Log the internal metrics of the IM service in a single line.
+        """
+        try:
+            stats = json.dumps(InfrastructureManager.get_stats(), sort_keys=True)
+            InfrastructureManager.logger.info("IM stats: %s" % stats)
+        except Exception:
+            InfrastructureManager.logger.exception("ERROR getting the IM stats.")
+
     @staticmethod
     def stop():
+        VMStatusPoller.stop()
+        with InfrastructureManager._update_pool_lock:
+            if InfrastructureManager._update_pool:
+                InfrastructureManager._update_pool.close()
+                InfrastructureManager._update_pool = None
         IM.InfrastructureList.InfrastructureList.stop()
@@ -25,6 +25,7 @@ from IM.InfrastructureManager import (InfrastructureManager, DeletedInfrastructu
                                       IncorrectInfrastructureException, UnauthorizedUserException,
                                       InvaliddUserException, DisabledFunctionException)
 from IM.auth import Authentication
+from IM.admission import BusyException
 from IM.config import Config
 from IM import get_ex_error
 from radl.radl_json import parse_radl as parse_radl_json, dump_radl as dump_radl_json, featuresToSimple, radlToSimple
@@ -247,6 +248,27 @@ def format_output_json(res, field_name=None, list_field_name=None):
     return json.dumps(res_dict)
 
 
+def check_etag(infid, auth, update_vms=None):
+    """
+    Set the ETag header of the response with the entity tag of the current content of the
+    infrastructure, got before building the response.
+    In the conditional requests the status of the VMs in update_vms is updated before getting the
+    tag (see :py:meth:`InfrastructureManager.GetInfrastructureETag`), as building the response would do.
+
+    Return: True if it matches the If-None-Match header of the request (an empty 304 response must be returned).
+    """
+    if_none_match = bottle.request.headers.get('If-None-Match')
+    variant = "%s?%s;%s" % (bottle.request.path, bottle.request.query_string, bottle.request.headers.get('Accept'))
+    etag = InfrastructureManager.GetInfrastructureETag(infid, auth, update_vms if if_none_match else None, variant)
+    bottle.response.set_header('ETag', etag)
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags or "W/" + etag in tags:
+            bottle.response.status = 304
+            return True
+    return False
+
+
 def format_output(res, default_type="text/plain", field_name=None, list_field_name=None):
     """
     Format the output of the API responses
@@ -305,6 +327,43 @@ def format_output(res, default_type="text/plain", field_name=None, list_field_na
     return info
 
 
+def get_fragment_params(cursor=False):
+    """
+    Get the offset and tail parameters of the requests of fragments of a log.
+    With cursor set, the offset is the cursor of the cont msg of an infrastructure.
+    Raises ValueError if they are not valid.
+    """
+    offset = tail = None
+    if "offset" in bottle.request.params.keys():
+        offset = bottle.request.params.get("offset")
+        if cursor:
+            InfrastructureManager.parse_cont_msg_cursor(offset)
+        else:
+            offset = int(offset)
+    if "tail" in bottle.request.params.keys():
+        tail = int(bottle.request.params.get("tail"))
+        if tail < 0:
+            raise ValueError("Negative tail value")
+    return offset, tail
+
+
+def format_fragment(chunks, next_offset, field_name):
+    """
+    Format the output of a fragment of a log, setting the offset of the end of the log
+    in the X-Next-Offset header. In case of text/plain the chunks are streamed.
+    """
+    bottle.response.set_header('X-Next-Offset', str(next_offset))
+    accept = get_media_type('Accept') or ["text/plain"]
+    for accept_item in accept:
+        if accept_item in ["application/json", "application/*"]:
+            bottle.response.content_type = "application/json"
+            return json.dumps({field_name: "".join(chunks), "next_offset": next_offset})
+        elif accept_item in ["text/plain", "*/*", "text/*"]:
+            bottle.response.content_type = "text/plain"
+            return iter(chunks)
+    return return_error(415, "Unsupported Accept Media Types: %s" % ",".join(accept))
+
+
 @app.route('/infrastructures/:infid', method='DELETE')
 def RESTDestroyInfrastructure(infid=None):
     try:
@@ -346,6 +405,8 @@ def RESTDestroyInfrastructure(infid=None):
         return return_error(409, "Error Destroying Inf: %s" % get_ex_error(ex))
     except DisabledFunctionException as ex:
         return return_error(403, "Error Destroying Inf: %s" % get_ex_error(ex))
+    except BusyException as ex:
+        return return_error(429, "Error Destroying Inf: %s" % get_ex_error(ex))
     except Exception as ex:
         logger.exception("Error Destroying Inf")
         return return_error(400, "Error Destroying Inf: %s" % get_ex_error(ex))
@@ -359,6 +420,8 @@ def RESTGetInfrastructureInfo(infid=None):
         return return_error(401, "No authentication data provided")
 
     try:
+        if check_etag(infid, auth):
+            return ""
         vm_ids = InfrastructureManager.GetInfrastructureInfo(infid, auth)
         res = []
 
@@ -396,14 +459,29 @@ def RESTGetInfrastructureProperty(infid=None, prop=None):
                 else:
                     return return_error(400, "Incorrect value in headeronly parameter")
 
+            try:
+                offset, tail = get_fragment_params(True)
+            except ValueError:
+                return return_error(400, "Incorrect value in offset or tail parameters")
+            if offset is not None or tail is not None:
+                chunks, next_offset = InfrastructureManager.GetInfrastructureContMsgFragment(infid, auth, headeronly,
+                                                                                             offset, tail)
+                return format_fragment(chunks, next_offset, prop)
+
+            if check_etag(infid, auth):
+                return ""
             res = InfrastructureManager.GetInfrastructureContMsg(infid, auth, headeronly)
         elif prop == "radl":
+            if check_etag(infid, auth):
+                return ""
             res = InfrastructureManager.GetInfrastructureRADL(infid, auth)
         elif prop == "tosca":
             accept = get_media_type('Accept')
             if accept and "application/json" not in accept and "*/*" not in accept and "application/*" not in accept:
                 return return_error(415, "Unsupported Accept Media Types: %s" % accept)
             bottle.response.content_type = "application/json"
+            if check_etag(infid, auth):
+                return ""
             auth = InfrastructureManager.check_auth_data(auth)
             sel_inf = InfrastructureManager.get_infrastructure(infid, auth)
             if "TOSCA" in sel_inf.extra_info:
@@ -416,13 +494,26 @@ def RESTGetInfrastructureProperty(infid=None, prop=None):
             if accept and "application/json" not in accept and "*/*" not in accept and "application/*" not in accept:
                 return return_error(415, "Unsupported Accept Media Types: %s" % accept)
             bottle.response.content_type = "application/json"
-            res = InfrastructureManager.GetInfrastructureState(infid, auth)
+            wait_version = timeout = None
+            try:
+                if "wait" in bottle.request.params.keys():
+                    wait_version = int(bottle.request.params.get("wait"))
+                if "timeout" in bottle.request.params.keys():
+                    timeout = int(bottle.request.params.get("timeout"))
+            except ValueError:
+                return return_error(400, "Incorrect value in wait or timeout parameters")
+            # The requests waiting for a change are not conditional
+            if wait_version is None and check_etag(infid, auth, True):
+                return ""
+            res = InfrastructureManager.GetInfrastructureState(infid, auth, wait_version, timeout)
             return format_output(res, default_type="application/json", field_name="state")
         elif prop == "outputs":
             accept = get_media_type('Accept')
             if accept and "application/json" not in accept and "*/*" not in accept and "application/*" not in accept:
                 return return_error(415, "Unsupported Accept Media Types: %s" % accept)
             bottle.response.content_type = "application/json"
+            if check_etag(infid, auth):
+                return ""
             auth = InfrastructureManager.check_auth_data(auth)
             sel_inf = InfrastructureManager.get_infrastructure(infid, auth)
             if "TOSCA" in sel_inf.extra_info:
@@ -448,6 +539,19 @@ def RESTGetInfrastructureProperty(infid=None, prop=None):
 
             data = InfrastructureManager.ExportInfrastructure(infid, delete, auth)
             return format_output(data, default_type="application/json", field_name="data")
+        elif prop == "vms":
+            accept = get_media_type('Accept')
+            if accept and "application/json" not in accept and "*/*" not in accept and "application/*" not in accept:
+                return return_error(415, "Unsupported Accept Media Types: %s" % accept)
+            bottle.response.content_type = "application/json"
+            vm_list = None
+            if "vm_list" in bottle.request.params.keys():
+                vm_list = bottle.request.params.get("vm_list")
+            if check_etag(infid, auth, vm_list or True):
+                return ""
+            res = InfrastructureManager.GetVMsInfo(infid, vm_list, auth)
+            res = dict((vm_id, radlToSimple(radl)) for vm_id, radl in res.items())
+            return format_output(res, default_type="application/json", field_name="vms")
         else:
             return return_error(404, "Incorrect infrastructure property")
 
@@ -458,6 +562,10 @@ def RESTGetInfrastructureProperty(infid=None, prop=None):
         return return_error(404, "Error Getting Inf. prop: %s" % get_ex_error(ex))
     except UnauthorizedUserException as ex:
         return return_error(403, "Error Getting Inf. prop: %s" % get_ex_error(ex))
+    except DeletedVMException as ex:
+        return return_error(404, "Error Getting Inf. prop: %s" % get_ex_error(ex))
+    except IncorrectVMException as ex:
+        return return_error(404, "Error Getting Inf. prop: %s" % get_ex_error(ex))
     except Exception as ex:
         logger.exception("Error Getting Inf. prop")
         return return_error(400, "Error Getting Inf. prop: %s" % get_ex_error(ex))
@@ -475,10 +583,33 @@ def RESTGetInfrastructureList():
         if "filter" in bottle.request.params.keys():
             flt = bottle.request.params.get("filter")
 
-        inf_ids = InfrastructureManager.GetInfrastructureList(auth, flt)
-        res = []
+        limit = None
+        if "limit" in bottle.request.params.keys():
+            try:
+                limit = int(bottle.request.params.get("limit"))
+                if limit < 0:
+                    raise ValueError()
+            except ValueError:
+                return return_error(400, "Incorrect value in limit parameter")
+        after = include = None
+        if "after" in bottle.request.params.keys():
+            after = bottle.request.params.get("after")
+        if "include" in bottle.request.params.keys():
+            include = bottle.request.params.get("include")
+
+        inf_list = InfrastructureManager.GetInfrastructureList(auth, flt, limit, after, include)
+
+        if include:
+            # The projections are only available in JSON format
+            res = []
+            for item in inf_list:
+                item = dict(item)
+                item["uri"] = get_full_url('/infrastructures/%s' % item.pop("id"))
+                res.append(item)
+            return format_output(res, "application/json", "uri-list")
 
-        for inf_id in inf_ids:
+        res = []
+        for inf_id in inf_list:
             res.append(get_full_url('/infrastructures/%s' % inf_id))
 
         return format_output(res, "text/uri-list", "uri-list", "uri")
@@ -538,6 +669,8 @@ def RESTCreateInfrastructure():
         return return_error(401, "Error Getting Inf. info: %s" % get_ex_error(ex))
     except DisabledFunctionException as ex:
         return return_error(403, "Error Destroying Inf: %s" % get_ex_error(ex))
+    except BusyException as ex:
+        return return_error(429, "Error Creating Inf.: %s" % get_ex_error(ex))
     except Exception as ex:
         logger.exception("Error Creating Inf.")
         return return_error(400, "Error Creating Inf.: %s" % get_ex_error(ex))
@@ -581,6 +714,8 @@ def RESTGetVMInfo(infid=None, vmid=None):
         return return_error(401, "No authentication data provided")
 
     try:
+        if check_etag(infid, auth, [vmid]):
+            return ""
         radl = InfrastructureManager.GetVMInfo(infid, vmid, auth)
         return format_output(radl, field_name="radl")
     except DeletedInfrastructureException as ex:
@@ -607,6 +742,15 @@ def RESTGetVMProperty(infid=None, vmid=None, prop=None):
 
     try:
         if prop == 'contmsg':
+            try:
+                offset, tail = get_fragment_params()
+            except ValueError:
+                return return_error(400, "Incorrect value in offset or tail parameters")
+            if offset is not None or tail is not None:
+                chunks, next_offset = InfrastructureManager.GetVMContMsgFragment(infid, vmid, auth, offset, tail)
+                return format_fragment(chunks, next_offset, prop)
+            if check_etag(infid, auth):
+                return ""
             info = InfrastructureManager.GetVMContMsg(infid, vmid, auth)
         elif prop == 'command':
             auth = InfrastructureManager.check_auth_data(auth)
@@ -681,6 +825,8 @@ def RESTGetVMProperty(infid=None, vmid=None, prop=None):
             else:
                 info = None
         else:
+            if check_etag(infid, auth, [vmid]):
+                return ""
             info = InfrastructureManager.GetVMProperty(infid, vmid, prop, auth)
 
         if info is None:
@@ -764,6 +910,8 @@ def RESTAddResource(infid=None):
         return return_error(403, "Error Adding resources: %s" % get_ex_error(ex))
     except DisabledFunctionException as ex:
         return return_error(403, "Error Destroying Inf: %s" % get_ex_error(ex))
+    except BusyException as ex:
+        return return_error(429, "Error Adding resources: %s" % get_ex_error(ex))
     except Exception as ex:
         logger.exception("Error Adding resources")
         return return_error(400, "Error Adding resources: %s" % get_ex_error(ex))
@@ -802,6 +950,8 @@ def RESTRemoveResource(infid=None, vmid=None):
         return return_error(404, "Error Removing resources: %s" % get_ex_error(ex))
     except DisabledFunctionException as ex:
         return return_error(403, "Error Destroying Inf: %s" % get_ex_error(ex))
+    except BusyException as ex:
+        return return_error(429, "Error Removing resources: %s" % get_ex_error(ex))
     except Exception as ex:
         logger.exception("Error Removing resources")
         return return_error(400, "Error Removing resources: %s" % get_ex_error(ex))
@@ -22,6 +22,7 @@ from IM.request import Request, AsyncRequest
 import IM.InfrastructureManager
 from IM.config import Config
 from IM.auth import Authentication
+from IM.admission import BusyException
 from IM import __version__ as version
 from IM import get_ex_error
 
@@ -38,12 +39,14 @@ class IMBaseRequest(AsyncRequest):
     DESTROY_INFRASTRUCTURE = "DestroyInfrastructure"
     EXPORT_INFRASTRUCTURE = "ExportInfrastructure"
     GET_INFRASTRUCTURE_CONT_MSG = "GetInfrastructureContMsg"
+    GET_INFRASTRUCTURE_ETAG = "GetInfrastructureETag"
     GET_INFRASTRUCTURE_INFO = "GetInfrastructureInfo"
     GET_INFRASTRUCTURE_LIST = "GetInfrastructureList"
     GET_INFRASTRUCTURE_RADL = "GetInfrastructureRADL"
     GET_INFRASTRUCTURE_STATE = "GetInfrastructureState"
     GET_VM_CONT_MSG = "GetVMContMsg"
     GET_VM_INFO = "GetVMInfo"
+    GET_VMS_INFO = "GetVMsInfo"
     GET_VM_PROPERTY = "GetVMProperty"
     IMPORT_INFRASTRUCTURE = "ImportInfrastructure"
     RECONFIGURE = "Reconfigure"
@@ -56,6 +59,9 @@ class IMBaseRequest(AsyncRequest):
     GET_VERSION = "GetVersion"
     CREATE_DISK_SNAPSHOT = "CreateDiskSnapshot"
 
+    PRIORITY = Request.PRIORITY_NORMAL
+    """Priority of the requests of this class."""
+
     @staticmethod
     def create_request(function, arguments=()):
         if function == IMBaseRequest.ADD_RESOURCE:
@@ -70,6 +76,8 @@ class IMBaseRequest(AsyncRequest):
             return Request_ExportInfrastructure(arguments)
         elif function == IMBaseRequest.GET_INFRASTRUCTURE_CONT_MSG:
             return Request_GetInfrastructureContMsg(arguments)
+        elif function == IMBaseRequest.GET_INFRASTRUCTURE_ETAG:
+            return Request_GetInfrastructureETag(arguments)
         elif function == IMBaseRequest.GET_INFRASTRUCTURE_INFO:
             return Request_GetInfrastructureInfo(arguments)
         elif function == IMBaseRequest.GET_INFRASTRUCTURE_LIST:
@@ -80,6 +88,8 @@ class IMBaseRequest(AsyncRequest):
             return Request_GetVMContMsg(arguments)
         elif function == IMBaseRequest.GET_VM_INFO:
             return Request_GetVMInfo(arguments)
+        elif function == IMBaseRequest.GET_VMS_INFO:
+            return Request_GetVMsInfo(arguments)
         elif function == IMBaseRequest.GET_VM_PROPERTY:
             return Request_GetVMProperty(arguments)
         elif function == IMBaseRequest.IMPORT_INFRASTRUCTURE:
@@ -107,7 +117,9 @@ class IMBaseRequest(AsyncRequest):
         else:
             raise NotImplementedError("Function not Implemented")
 
-    def __init__(self, arguments=(), priority=Request.PRIORITY_NORMAL):
+    def __init__(self, arguments=(), priority=None):
+        if priority is None:
+            priority = self.PRIORITY
         AsyncRequest.__init__(self, arguments, priority)
         self._error_mesage = "Error."
 
@@ -122,6 +134,10 @@ class IMBaseRequest(AsyncRequest):
             res = self._call_function()
             self.set(res)
             return True
+        except BusyException as ex:
+            logger.warning("%s %s" % (self._error_mesage, get_ex_error(ex)))
+            self.set("Busy: %s" % get_ex_error(ex))
+            return False
         except Exception as ex:
             logger.exception(self._error_mesage)
             self.set(get_ex_error(ex))
@@ -158,6 +174,7 @@ class Request_GetInfrastructureInfo(IMBaseRequest):
     """
     Request class for the GetInfrastructureInfo function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error Getting Inf. Info."
@@ -169,6 +186,7 @@ class Request_GetVMInfo(IMBaseRequest):
     """
     Request class for the GetVMInfo function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error Getting VM Info."
@@ -178,10 +196,27 @@ class Request_GetVMInfo(IMBaseRequest):
                                                                             Config.VMINFO_JSON))
 
 
+class Request_GetVMsInfo(IMBaseRequest):
+    """
+    Request class for the GetVMsInfo function
+    """
+    LANE = Request.LANE_READ
+
+    def _call_function(self):
+        self._error_mesage = "Error Getting VMs Info."
+        (inf_id, vm_list, auth_data) = self.arguments
+        res = IM.InfrastructureManager.InfrastructureManager.GetVMsInfo(inf_id, vm_list,
+                                                                        Authentication(auth_data),
+                                                                        Config.VMINFO_JSON)
+        return dict((vm_id, str(info)) for vm_id, info in res.items())
+
+
 class Request_GetVMProperty(IMBaseRequest):
     """
     Request class for the GetVMProperty function
     """
+    LANE = Request.LANE_READ
+    PRIORITY = Request.PRIORITY_HIGH
 
     def _call_function(self):
         self._error_mesage = "Error Getting VM Property."
@@ -240,6 +275,7 @@ class Request_CreateInfrastructure(IMBaseRequest):
     """
     Request class for the CreateInfrastructure function
     """
+    PRIORITY = Request.PRIORITY_LOW
 
     def _call_function(self):
         self._error_mesage = "Error Creating Inf."
@@ -252,11 +288,13 @@ class Request_GetInfrastructureList(IMBaseRequest):
     """
     Request class for the GetInfrastructureList function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error Getting Inf. List."
-        (auth_data, flt) = self.arguments
-        return IM.InfrastructureManager.InfrastructureManager.GetInfrastructureList(Authentication(auth_data), flt)
+        (auth_data, flt, limit, after, include) = self.arguments
+        return IM.InfrastructureManager.InfrastructureManager.GetInfrastructureList(Authentication(auth_data), flt,
+                                                                                    limit, after, include)
 
 
 class Request_Reconfigure(IMBaseRequest):
@@ -275,6 +313,7 @@ class Request_ImportInfrastructure(IMBaseRequest):
     """
     Request class for the ImportInfrastructure function
     """
+    PRIORITY = Request.PRIORITY_LOW
 
     def _call_function(self):
         self._error_mesage = "Error Importing Inf."
@@ -298,6 +337,7 @@ class Request_GetInfrastructureRADL(IMBaseRequest):
     """
     Request class for the GetInfrastructureRADL function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error getting RADL of the Inf."
@@ -309,6 +349,7 @@ class Request_GetVMContMsg(IMBaseRequest):
     """
     Request class for the GetVMContMsg function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error Getting VM cont msg."
@@ -320,6 +361,7 @@ class Request_GetInfrastructureContMsg(IMBaseRequest):
     """
     Request class for the GetInfrastructureContMsg function
     """
+    LANE = Request.LANE_READ
 
     def _call_function(self):
         self._error_mesage = "Error gettinf the Inf. cont msg"
@@ -368,10 +410,26 @@ class Request_RebootVM(IMBaseRequest):
         return ""
 
 
+class Request_GetInfrastructureETag(IMBaseRequest):
+    """
+    Request class for the GetInfrastructureETag function
+    """
+    LANE = Request.LANE_READ
+    PRIORITY = Request.PRIORITY_HIGH
+
+    def _call_function(self):
+        self._error_mesage = "Error getting the Inf. entity tag"
+        (inf_id, auth_data, update_vms, variant) = self.arguments
+        return IM.InfrastructureManager.InfrastructureManager.GetInfrastructureETag(inf_id, Authentication(auth_data),
+                                                                                    update_vms, variant)
+
+
 class Request_GetInfrastructureState(IMBaseRequest):
     """
     Request class for the GetInfrastructureState function
     """
+    LANE = Request.LANE_READ
+    PRIORITY = Request.PRIORITY_HIGH
 
     def _call_function(self):
         self._error_mesage = "Error getting the Inf. state"
@@ -383,6 +441,8 @@ class Request_GetVersion(IMBaseRequest):
     """
     Request class for the GetVersion function
     """
+    LANE = Request.LANE_READ
+    PRIORITY = Request.PRIORITY_HIGH
 
     def _call_function(self):
         self._error_mesage = "Error getting IM service version"
@@ -29,6 +29,10 @@ from IM.LoggerMixin import LoggerMixin
 from IM.SSH import SSH
 from IM.SSHRetry import SSHRetry
 from IM.config import Config
+from IM.serialization import DataSerializer, RadlFragments, LazyAttribute, LazyValue
+from IM.events import ChangeEvents, NotifiedAttribute
+from IM.logbuffer import LogAttribute
+from IM.poller import VMStatusPoller
 from IM import get_user_pass_host_port
 import IM.CloudInfo
 
@@ -54,6 +58,24 @@ class VirtualMachine(LoggerMixin):
 
     logger = logging.getLogger('InfrastructureManager')
 
+    info = LazyAttribute('info', RadlFragments.parse)
+    """RADL with the information about the VM (parsed on first access if loaded from the DB)."""
+
+    requested_radl = LazyAttribute('requested_radl', RadlFragments.parse)
+    """RADL requested by the user (parsed on first access if loaded from the DB)."""
+
+    state = NotifiedAttribute('state', lambda vm: vm.inf.id if vm.__dict__.get('inf') else None)
+    """VM State (its changes are published to the ChangeEvents of the Inf)."""
+
+    configured = NotifiedAttribute('configured', lambda vm: vm.inf.id if vm.__dict__.get('inf') else None)
+    """Configure flag (its changes are published to the ChangeEvents of the Inf)."""
+
+    destroy = NotifiedAttribute('destroy', lambda vm: vm.inf.id if vm.__dict__.get('inf') else None)
+    """Destroyed flag (its changes are published to the ChangeEvents of the Inf)."""
+
+    cont_out = LogAttribute('cont_out', lambda vm: (vm.inf.id, vm.im_id) if vm.__dict__.get('inf') else None)
+    """Contextualization output message (the older parts are moved to the DB if it grows too much)."""
+
     def __init__(self, inf, cloud_id, cloud, info, requested_radl, cloud_connector=None, im_id=None):
         self._lock = threading.Lock()
         """Threading Lock to avoid concurrency problems."""
@@ -96,12 +118,24 @@ class VirtualMachine(LoggerMixin):
         """Message with the cause of the the error in the VM (if known) """
         self.deleting = False
         """Flag to specify that this VM is deletion process"""
+        self._last_refresh = (0, False, False)
+        """Tuple (start time, updated, failed) of the last request of the VM info to the cloud provider."""
+
+    def serialize(self, compress=False, fragments=None):
+        """
+        Serialize this VM
 
-    def serialize(self):
+        Args:
+
+        - compress(bool): Flag to use the compressed format instead of JSON.
+        - fragments(RadlFragments): Table of RADL fragments shared with other objects. If set
+          the VM is returned as a dict that must be included in the data of the Inf.
+        """
         with self._lock:
             odict = self.__dict__.copy()
         # Quit the lock to the data to be store by pickle
         del odict['_lock']
+        del odict['_last_refresh']
         del odict['cloud_connector']
         del odict['inf']
         # To avoid errors tests with Mock objects
@@ -110,23 +144,53 @@ class VirtualMachine(LoggerMixin):
         if 'get_ctxt_log' in odict:
             del odict['get_ctxt_log']
 
-        if odict['info']:
-            odict['info'] = str(odict['info'])
-        if odict['requested_radl']:
-            odict['requested_radl'] = str(odict['requested_radl'])
         if odict['cloud']:
             odict['cloud'] = odict['cloud'].serialize()
-        return json.dumps(odict)
+        odict['cont_out'] = VirtualMachine.cont_out.get_data(self, compress or fragments is not None)
+        if not compress and fragments is None:
+            if odict['info']:
+                odict['info'] = RadlFragments.to_str(LazyAttribute.get_data(odict['info'], None))
+            if odict['requested_radl']:
+                odict['requested_radl'] = RadlFragments.to_str(LazyAttribute.get_data(odict['requested_radl'], None))
+            return json.dumps(odict)
+
+        shared = fragments is not None
+        if not shared:
+            fragments = RadlFragments()
+        if odict['info']:
+            odict['info'] = fragments.add(LazyAttribute.get_data(odict['info'], None))
+        if odict['requested_radl']:
+            odict['requested_radl'] = fragments.add(LazyAttribute.get_data(odict['requested_radl'], None))
+        if shared:
+            return odict
+        odict['radl_fragments'] = fragments.fragments
+        return DataSerializer.dumps(odict)
 
     @staticmethod
-    def deserialize(str_data):
-        dic = json.loads(str_data)
+    def deserialize(str_data, fragments=None):
+        """
+        Create a VM from its serialized data
+
+        Args:
+
+        - str_data(str or dict): Data of the VM in any of the supported formats.
+        - fragments(RadlFragments): Table of RADL fragments of the Inf in case of str_data is a dict.
+        """
+        if isinstance(str_data, dict):
+            dic = str_data
+        else:
+            dic = DataSerializer.loads(str_data)
+        if 'radl_fragments' in dic:
+            fragments = RadlFragments(dic.pop('radl_fragments'))
+        elif fragments is None:
+            fragments = RadlFragments()
         if dic['cloud']:
             dic['cloud'] = IM.CloudInfo.CloudInfo.deserialize(dic['cloud'])
+        # The RADLs are parsed when they are accessed
         if dic['info']:
-            dic['info'] = parse_radl(dic['info'])
+            dic['info'] = LazyValue(fragments.get(dic['info']))
         if dic['requested_radl']:
-            dic['requested_radl'] = parse_radl(dic['requested_radl'])
+            dic['requested_radl'] = LazyValue(fragments.get(dic['requested_radl']))
 
         newvm = VirtualMachine(None, None, None, None, None, None, dic['im_id'])
         # Set creating to False as default to VMs stored with 1.5.5 or old versions
@@ -510,62 +574,184 @@ class VirtualMachine(LoggerMixin):
         """
         Update the status of this virtual machine.
         Only performs the update with UPDATE_FREQUENCY secs.
+        If the VMStatusPoller is active, the cloud provider is only contacted in the first access
+        to the Inf (or if force is set), as the state of the VM is refreshed in background.
         Args:
         - auth(Authentication): parsed authentication tokens.
         - force(boolean): force the VM update
         Return:
         - boolean: True if the information has been updated, false otherwise
         """
-        with self._lock:
-            # In case of a VM failed during creation, do not update
-            if self.state == VirtualMachine.FAILED and self.id is None:
-                return False
-
-            if self.deleting:
-                self.state = VirtualMachine.DELETING
-                return True
+        return VirtualMachine.update_status_batch([self], auth, force)[0]
 
+    @staticmethod
+    def update_status_batch(vm_list, auth, force=False):
+        """
+        Update the status of a list of VMs of the same Inf and cloud provider (see update_status),
+        getting the info of all of them with a single call to the updateVMInfoBatch function
+        of the connector.
+        Args:
+        - vm_list(list of VirtualMachine): VMs to update.
+        - auth(Authentication): parsed authentication tokens.
+        - force(boolean): force the VMs update
+        Return:
+        - list of boolean: True for each VM whose information has been updated, false otherwise
+        """
+        if not vm_list:
+            return []
+        requested = time.time()
+        polled = not force and VMStatusPoller.watch(vm_list[0].inf, auth)
+        # Always lock the VMs in the same order to avoid deadlocks
+        locked = sorted(vm_list, key=lambda vm: vm.im_id)
+        for vm in locked:
+            vm._lock.acquire()
+        try:
             now = int(time.time())
-            state = self.state
-            updated = False
-            # To avoid to refresh the information too quickly
-            if force or now - self.last_update > Config.VM_INFO_UPDATE_FREQUENCY:
-                success = False
+            refresh = []
+            for vm in vm_list:
+                if not vm._is_updatable():
+                    continue
+                start, _, failed = vm._last_refresh
+                if start >= requested:
+                    # The info has been requested by other thread while this one was waiting for the lock,
+                    # so its result is shared instead of requesting it again
+                    continue
+                if failed and not force and requested - start < Config.VM_INFO_UPDATE_ERROR_CACHE:
+                    # Do not request again too quickly the info of a VM that has just failed
+                    continue
+                # To avoid to refresh the information too quickly
+                if force or (not polled and now - vm.last_update > Config.VM_INFO_UPDATE_FREQUENCY):
+                    refresh.append(vm)
+
+            start = time.time()
+            results = [None] * len(refresh)
+            # The connectors modify the info of the VMs in place, so keep it to detect the changes
+            old_info = [str(vm.info) for vm in refresh]
+            if refresh:
                 try:
-                    (success, new_vm) = self.getCloudConnector().updateVMInfo(self, auth)
-                    if success:
-                        state = new_vm.state
-                        updated = True
-                        self.last_update = now
+                    conn = refresh[0].getCloudConnector()
+                    if len(refresh) == 1:
+                        results = [conn.updateVMInfo(refresh[0], auth)]
                     else:
-                        self.log_error("Error updating VM status: %s" % new_vm)
+                        results = conn.updateVMInfoBatch(refresh, auth)
                 except Exception:
-                    self.log_exception("Error updating VM status.")
-
-                if not success and self.creating:
-                    self.log_info("VM is in creation process, set pending state")
-                    state = VirtualMachine.PENDING
+                    refresh[0].log_exception("Error updating VM status.")
+
+            res = []
+            for vm in vm_list:
+                if vm in refresh:
+                    pos = refresh.index(vm)
+                    updated = vm._set_status(now, True, results[pos])
+                    vm._last_refresh = (start, updated, not updated)
+                    if updated and str(vm.info) != old_info[pos]:
+                        ChangeEvents.publish(vm.inf.id)
+                    res.append(updated)
+                elif vm._last_refresh[0] >= requested:
+                    vm._set_status(now, False)
+                    res.append(vm._last_refresh[1])
+                else:
+                    res.append(vm._set_status(now, False))
+            return res
+        finally:
+            for vm in locked:
+                vm._lock.release()
 
-            # If we have problems to update the VM info too much time, set to
-            # unknown unless we are still creating the VM
-            if now - self.last_update > Config.VM_INFO_UPDATE_ERROR_GRACE_PERIOD and not self.creating:
-                new_state = VirtualMachine.UNKNOWN
-                self.log_warn("Grace period to update VM info passed. Set state to 'unknown'")
+    @staticmethod
+    def group_by_cloud(vm_list):
+        """
+        Split a list of VMs in the groups that can be updated with a single call to update_status_batch:
+        the VMs of the same Inf and cloud provider, if its connector gets the info of all of them with
+        a single request, or single VMs otherwise.
+        """
+        res = []
+        groups = {}
+        for vm in vm_list:
+            try:
+                batch = vm.getCloudConnector().BATCH_UPDATE is True
+            except Exception:
+                batch = False
+            if batch:
+                groups.setdefault((id(vm.inf), vm.cloud.id), []).append(vm)
             else:
-                if state not in [VirtualMachine.RUNNING, VirtualMachine.CONFIGURED, VirtualMachine.UNCONFIGURED]:
-                    new_state = state
-                elif self.is_configured() is None:
-                    new_state = VirtualMachine.RUNNING
-                elif self.is_configured():
-                    new_state = VirtualMachine.CONFIGURED
+                res.append([vm])
+        return res + list(groups.values())
+
+    def _is_updatable(self):
+        """ Check if the info of the VM can be requested to the cloud provider """
+        # In case of a VM failed during creation, do not update
+        return not (self.state == VirtualMachine.FAILED and self.id is None) and not self.deleting
+
+    def _set_status(self, now, refreshed, result=None):
+        """
+        Set the status of the VM (with the lock acquired) after requesting its info to the cloud provider.
+        Args:
+        - now(int): time of the update.
+        - refreshed(boolean): flag to indicate that the info of the VM has been requested.
+        - result(tuple): result of the updateVMInfo function (None in case of exception).
+        Return:
+        - boolean: True if the information has been updated, false otherwise
+        """
+        # In case of a VM failed during creation, do not update
+        if self.state == VirtualMachine.FAILED and self.id is None:
+            return False
+
+        if self.deleting:
+            self.state = VirtualMachine.DELETING
+            return True
+
+        state = self.state
+        updated = False
+        if refreshed:
+            success = False
+            if result:
+                (success, new_vm) = result
+                if success:
+                    state = new_vm.state
+                    updated = True
+                    self.last_update = now
                 else:
-                    new_state = VirtualMachine.UNCONFIGURED
+                    self.log_error("Error updating VM status: %s" % new_vm)
+
+            if not success and self.creating:
+                self.log_info("VM is in creation process, set pending state")
+                state = VirtualMachine.PENDING
+
+        # If we have problems to update the VM info too much time, set to
+        # unknown unless we are still creating the VM
+        if now - self.last_update > Config.VM_INFO_UPDATE_ERROR_GRACE_PERIOD and not self.creating:
+            new_state = VirtualMachine.UNKNOWN
+            self.log_warn("Grace period to update VM info passed. Set state to 'unknown'")
+        else:
+            if state not in [VirtualMachine.RUNNING, VirtualMachine.CONFIGURED, VirtualMachine.UNCONFIGURED]:
+                new_state = state
+            elif self.is_configured() is None:
+                new_state = VirtualMachine.RUNNING
+            elif self.is_configured():
+                new_state = VirtualMachine.CONFIGURED
+            else:
+                new_state = VirtualMachine.UNCONFIGURED
 
-            self.state = new_state
-            self.info.systems[0].setValue("state", new_state)
+        self.state = new_state
+        self.info.systems[0].setValue("state", new_state)
 
         return updated
 
+    def is_update_needed(self):
+        """
+        Check if the info of the VM is older than VM_INFO_UPDATE_FREQUENCY, so update_status
+        will contact the cloud provider.
+        """
+        return int(time.time()) - self.last_update > Config.VM_INFO_UPDATE_FREQUENCY
+
+    def get_status_poll_interval(self):
+        """
+        Get the time (in secs) between the updates of the state of this VM made by the VMStatusPoller,
+        that is shorter in the transitional states.
+        """
+        if self.creating or self.state in [VirtualMachine.PENDING, VirtualMachine.UNKNOWN, VirtualMachine.DELETING]:
+            return Config.VM_POLLER_TRANSITION_INTERVAL
+        return Config.VM_POLLER_INTERVAL
+
     @staticmethod
     def add_public_net(radl):
         """
@@ -827,7 +1013,8 @@ class VirtualMachine(LoggerMixin):
             self.ctxt_pid = None
             self.configured = False
 
-        initial_count_out = self.cont_out
+        # Only the part of the log added by the ctxt process is updated
+        initial_count_out = VirtualMachine.cont_out.size(self)
         wait = 0
         while self.ctxt_pid:
             if self.destroy:
@@ -854,7 +1041,8 @@ class VirtualMachine(LoggerMixin):
                         self.ssh_connect_errors = 0
                         self.configured = False
                         self.ctxt_pid = None
-                        self.cont_out = initial_count_out + ("Too much errors getting the status of ctxt process."
+                        VirtualMachine.cont_out.replace_from(self, initial_count_out,
+                                                             "Too much errors getting the status of ctxt process."
                                                              " Check some network connection problems or if user "
                                                              "credentials has been changed.")
                         return None
@@ -870,10 +1058,10 @@ class VirtualMachine(LoggerMixin):
                     ctxt_log = self.get_ctxt_log(remote_dir, ssh, True)
                     msg = self.get_ctxt_output(remote_dir, ssh, True)
                     if ctxt_log:
-                        self.cont_out = initial_count_out + msg + ctxt_log
+                        VirtualMachine.cont_out.replace_from(self, initial_count_out, msg + ctxt_log)
                     else:
-                        self.cont_out = initial_count_out + msg + \
-                            "Error getting contextualization process log."
+                        VirtualMachine.cont_out.replace_from(self, initial_count_out, msg +
+                                                             "Error getting contextualization process log.")
                     self.ctxt_pid = None
                 else:
                     # Get the log of the process to update the cont_out
@@ -882,7 +1070,7 @@ class VirtualMachine(LoggerMixin):
                         wait = 0
                         self.log_info("Get the log of the ctxt process with pid: " + str(ctxt_pid))
                         ctxt_log = self.get_ctxt_log(remote_dir, ssh)
-                        self.cont_out = initial_count_out + ctxt_log
+                        VirtualMachine.cont_out.replace_from(self, initial_count_out, ctxt_log)
                     # The process is still running, wait
                     self.log_info("The process %s is still running. wait." % ctxt_pid)
                     time.sleep(Config.CHECK_CTXT_PROCESS_INTERVAL)
@@ -1030,12 +1218,19 @@ class VirtualMachine(LoggerMixin):
         return True
 
     def get_cont_msg(self):
+        return "".join(self.get_cont_msg_parts())
+
+    def get_cont_msg_parts(self, lazy=False):
+        """
+        Get the list of str that compose the contextualization message of the VM
+        (see :py:meth:`LogBuffer.get_parts` for the lazy flag)
+        """
+        res = []
         if self.error_msg:
-            res = self.error_msg + "\n" + self.cont_out
-        else:
-            res = self.cont_out
+            res.extend([self.error_msg, "\n"])
+        res.extend(VirtualMachine.cont_out.get_parts(self, lazy))
         if self.cloud_connector and self.cloud_connector.error_messages:
-            res += self.cloud_connector.error_messages
+            res.append(self.cloud_connector.error_messages)
         return res
 
     def is_last_in_cloud(self, delete_list, remain_vms):
@@ -0,0 +1,198 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+import threading
+
+from IM.config import Config
+
+
+class BusyException(Exception):
+    """ Too many operations in progress for the user or the cloud provider """
+
+    def __init__(self, msg="Too many operations in progress. Try again later."):
+        Exception.__init__(self, msg)
+        self.message = msg
+
+
+class AdmissionTicket:
+    """
+    Slots acquired by an operation in the admission control, that must be released when it finishes.
+    It can be used as a context manager.
+    """
+
+    def __init__(self, keys):
+        self.keys = keys
+        """List of keys (users and cloud endpoints) of the acquired slots."""
+        self._released = False
+        AdmissionControl._get_held_keys().update(keys)
+
+    def release(self):
+        """ Release the slots (only the first call has effect) """
+        if not self._released:
+            self._released = True
+            AdmissionControl._release(self.keys)
+
+    def detach(self):
+        """ Stop owning the slots in this thread (they must be released by other ticket) """
+        self._released = True
+        AdmissionControl._get_held_keys().difference_update(self.keys)
+        return self.keys
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class AdmissionControl:
+    """
+    Limit the number of mutating operations that are executed at the same time by each IM user
+    and in each cloud endpoint. The operations over the limits wait in a bounded queue, and
+    they are rejected with a BusyException if the queue is full or they wait too long.
+    """
+
+    logger = logging.getLogger('InfrastructureManager')
+    """Logger object."""
+
+    _cond = threading.Condition(threading.Lock())
+    """Condition to protect the counters and wait for free slots."""
+
+    _running = {}
+    """Map from key to the number of operations in progress."""
+
+    _waiting = {}
+    """Map from key to the number of operations waiting for a slot."""
+
+    _rejected = 0
+    """Number of operations rejected."""
+
+    _local = threading.local()
+    """Keys of the slots owned by each thread, to avoid acquiring them twice in nested operations."""
+
+    @staticmethod
+    def _get_held_keys():
+        if not hasattr(AdmissionControl._local, "keys"):
+            AdmissionControl._local.keys = set()
+        return AdmissionControl._local.keys
+
+    @staticmethod
+    def _get_limit(key):
+        if key.startswith("user:"):
+            return Config.MAX_USER_OPERATIONS
+        else:
+            return Config.MAX_CLOUD_OPERATIONS
+
+    @staticmethod
+    def get_keys(auth, clouds=None):
+        """
+        Get the keys of the IM user in the auth data and of the endpoints of the list of clouds.
+
+        Args:
+
+        - auth(Authentication): parsed authentication tokens.
+        - clouds(list of CloudInfo): cloud providers used by the operation.
+        """
+        keys = []
+        im_auth = auth.getAuthInfo("InfrastructureManager")
+        if im_auth and 'username' in im_auth[0]:
+            keys.append("user:%s" % im_auth[0]['username'])
+        for cloud in clouds or []:
+            if cloud.server:
+                keys.append("cloud:%s://%s:%s" % (cloud.type, cloud.server, cloud.port))
+            else:
+                keys.append("cloud:%s" % cloud.type)
+        return list(set(keys))
+
+    @staticmethod
+    def admit(auth, clouds=None):
+        """
+        Wait for a free slot for the IM user in the auth data and for the endpoints of the list of clouds.
+
+        Args:
+
+        - auth(Authentication): parsed authentication tokens.
+        - clouds(list of CloudInfo): cloud providers used by the operation.
+
+        Returns: an AdmissionTicket to release the slots when the operation finishes.
+        Raises: BusyException if the waiting queue is full or the slots are not freed
+                in ADMISSION_TIMEOUT secs.
+        """
+        held = AdmissionControl._get_held_keys()
+        keys = [key for key in AdmissionControl.get_keys(auth, clouds)
+                if AdmissionControl._get_limit(key) > 0 and key not in held]
+        end = time.time() + Config.ADMISSION_TIMEOUT
+        with AdmissionControl._cond:
+            while True:
+                busy = [key for key in keys
+                        if AdmissionControl._running.get(key, 0) >= AdmissionControl._get_limit(key)]
+                if not busy:
+                    break
+                remaining = end - time.time()
+                if remaining <= 0 or [key for key in busy if AdmissionControl._waiting.get(key, 0) >=
+                                      Config.ADMISSION_QUEUE_SIZE]:
+                    AdmissionControl._rejected += 1
+                    AdmissionControl.logger.warning("Operation rejected: too many operations in progress"
+                                                    " in %s." % ", ".join(busy))
+                    raise BusyException()
+                for key in busy:
+                    AdmissionControl._waiting[key] = AdmissionControl._waiting.get(key, 0) + 1
+                try:
+                    AdmissionControl._cond.wait(remaining)
+                finally:
+                    for key in busy:
+                        AdmissionControl._waiting[key] -= 1
+                        if not AdmissionControl._waiting[key]:
+                            del AdmissionControl._waiting[key]
+            for key in keys:
+                AdmissionControl._running[key] = AdmissionControl._running.get(key, 0) + 1
+        return AdmissionTicket(keys)
+
+    @staticmethod
+    def _release(keys):
+        AdmissionControl._get_held_keys().difference_update(keys)
+        with AdmissionControl._cond:
+            for key in keys:
+                AdmissionControl._running[key] -= 1
+                if not AdmissionControl._running[key]:
+                    del AdmissionControl._running[key]
+            AdmissionControl._cond.notify_all()
+
+    @staticmethod
+    def start_thread(ticket, name, target, args=()):
+        """
+        Launch a thread to execute an operation, transferring it the slots of the ticket,
+        that are released when the operation finishes.
+        """
+        keys = ticket.detach()
+
+        def run():
+            with AdmissionTicket(keys):
+                target(*args)
+
+        t = threading.Thread(name=name, target=run)
+        t.daemon = True
+        t.start()
+        return t
+
+    @staticmethod
+    def get_stats():
+        """ Get the number of operations in progress and waiting per key and the number of rejected ones """
+        with AdmissionControl._cond:
+            return {"running": dict(AdmissionControl._running), "waiting": dict(AdmissionControl._waiting),
+                    "rejected": AdmissionControl._rejected}
@@ -0,0 +1,141 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe dict-like object that evicts the least recently used elements
+    when it exceeds the maximum number of elements or the maximum total weight.
+    """
+
+    def __init__(self, max_size=0, max_weight=0, weight=None, pinned=None):
+        """
+        Args:
+
+        - max_size(int): max number of elements (0 means unbounded).
+        - max_weight(int): max sum of the weights of the elements (0 means unbounded).
+        - weight(function): function to get the weight of an element (1 by default).
+        - pinned(function): function to check if an element must not be evicted.
+        """
+        self.max_size = max_size
+        """Max number of elements."""
+        self.max_weight = max_weight
+        """Max sum of the weights of the elements."""
+        self.weight = weight or (lambda value: 1)
+        """Function to get the weight of an element."""
+        self.pinned = pinned or (lambda value: False)
+        """Function to check if an element must not be evicted."""
+        self.hits = 0
+        """Number of requested elements found in the cache."""
+        self.misses = 0
+        """Number of requested elements not found in the cache."""
+        self.evictions = 0
+        """Number of elements evicted from the cache."""
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _move_to_end(self, key):
+        value = self._data.pop(key)
+        self._data[key] = value
+
+    def get(self, key, default=None):
+        """ Get an element, marking it as the most recently used one """
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def __getitem__(self, key):
+        with self._lock:
+            self._move_to_end(key)
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            self.evict(keep=key)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def pop(self, key, *args):
+        with self._lock:
+            return self._data.pop(key, *args)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def values(self):
+        with self._lock:
+            return list(self._data.values())
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def get_weight(self):
+        """ Get the sum of the weights of the elements """
+        with self._lock:
+            return sum([self.weight(value) for value in self._data.values()])
+
+    def evict(self, keep=None):
+        """
+        Evict the least recently used (and not pinned) elements until the cache is within its bounds.
+
+        Args:
+
+        - keep(str): key of an element that must not be evicted.
+        """
+        with self._lock:
+            if not self.max_size and not self.max_weight:
+                return
+            size = len(self._data)
+            weight = self.get_weight() if self.max_weight else 0
+            for key, value in list(self._data.items()):
+                if (not self.max_size or size <= self.max_size) and (not self.max_weight or
+                                                                    weight <= self.max_weight):
+                    break
+                if key != keep and not self.pinned(value):
+                    del self._data[key]
+                    self.evictions += 1
+                    size -= 1
+                    if self.max_weight:
+                        weight -= self.weight(value)
+
+    def get_stats(self):
+        """ Get the counters of the cache """
+        with self._lock:
+            return {"size": len(self._data), "weight": self.get_weight(), "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
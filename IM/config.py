@@ -63,12 +63,28 @@ class Config:
     LOG_FILE = '/var/log/im/inf.log'
     LOG_FILE_MAX_SIZE = 10485760
     LOG_LEVEL = "INFO"
+    STATS_LOG_INTERVAL = 0
     CONTEXTUALIZATION_DIR = '/usr/share/im/contextualization'
     RECIPES_DIR = CONTEXTUALIZATION_DIR + '/AnsibleRecipes'
     RECIPES_DB_FILE = CONTEXTUALIZATION_DIR + '/recipes_ansible.db'
     MAX_CONTEXTUALIZATION_TIME = 7200
     MAX_SIMULTANEOUS_LAUNCHES = 1
+    READ_REQUEST_WORKERS = 10
+    WRITE_REQUEST_WORKERS = 20
+    MAX_USER_OPERATIONS = 0
+    MAX_CLOUD_OPERATIONS = 0
+    ADMISSION_QUEUE_SIZE = 10
+    ADMISSION_TIMEOUT = 5
     DATA_DB = '/etc/im/inf.dat'
+    DB_POOL_SIZE = 10
+    DB_POOL_TIMEOUT = 30
+    DB_SQLITE_WAL = True
+    DB_SQLITE_BUSY_TIMEOUT = 10
+    SAVE_DATA_DELAY = 1
+    RESUME_INFS_THREADS = 0
+    ARCHIVE_DELETED_INFS_AFTER = 0
+    ARCHIVE_INTERVAL = 3600
+    ARCHIVE_BATCH_SIZE = 100
     XMLRCP_SSL = False
     XMLRCP_SSL_KEYFILE = "/etc/im/pki/server-key.pem"
     XMLRCP_SSL_CERTFILE = "/etc/im/pki/server-cert.pem"
@@ -81,6 +97,16 @@ class Config:
     VM_INFO_UPDATE_FREQUENCY = 10
     # This value must be always higher than VM_INFO_UPDATE_FREQUENCY
     VM_INFO_UPDATE_ERROR_GRACE_PERIOD = 120
+    VM_INFO_UPDATE_ERROR_CACHE = 5
+    DRIVER_CACHE_TTL = 1800
+    VM_INFO_UPDATE_THREADS = 20
+    VM_INFO_UPDATE_TIMEOUT = 30
+    MAX_STATE_WAIT = 60
+    VM_POLLER_INTERVAL = 0
+    VM_POLLER_TRANSITION_INTERVAL = 5
+    VM_POLLER_THREADS = 10
+    VM_POLLER_MAX_CLOUD_UPDATES = 5
+    VM_POLLER_IDLE_TIME = 600
     REMOTE_CONF_DIR = "/var/tmp/.im"
     MAX_SSH_ERRORS = 5
     PRIVATE_NET_MASKS = ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16",
@@ -88,6 +114,7 @@ class Config:
     CHECK_CTXT_PROCESS_INTERVAL = 5
     CONFMAMAGER_CHECK_STATE_INTERVAL = 5
     UPDATE_CTXT_LOG_INTERVAL = 20
+    MAX_CONT_MSG_SIZE = 65536
     ANSIBLE_INSTALL_TIMEOUT = 500
     SINGLE_SITE = False
     SINGLE_SITE_TYPE = ''
@@ -96,6 +123,9 @@ class Config:
     OIDC_ISSUERS = []
     OIDC_AUDIENCE = None
     INF_CACHE_TIME = 0
+    INF_CACHE_SIZE = 1000
+    INF_CACHE_MAX_VMS = 0
+    INF_AUTH_CACHE_SIZE = 10000
     VMINFO_JSON = False
     OIDC_CLIENT_ID = None
     OIDC_CLIENT_SECRET = None
@@ -14,9 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
+import hashlib
 import operator
+import threading
 import time
+import datetime
 import yaml
 
 from cryptography.hazmat.backends import default_backend
@@ -41,7 +45,17 @@ class CloudConnector(LoggerMixin):
                     ">=": operator.ge, ">": operator.gt, "==": operator.eq}
     type = "BaseClass"
     """str with the name of the provider."""
+    BATCH_UPDATE = False
+    """Flag to indicate that updateVMInfoBatch gets the information of all the VMs with a single request."""
     DEFAULT_NET_CIDR = "10.0.*.0/24"
+    TOKEN_EXPIRATION_MARGIN = 60
+    """Time (in secs) before the expiration of the token of a cached driver to stop using it."""
+
+    _driver_cache = {}
+    """Map from the key of a cloud provider and credentials and the ID of the thread using it to a tuple
+    (driver, expiration time)."""
+    _driver_cache_lock = threading.Lock()
+    """Lock to access the cache of drivers."""
 
     def __init__(self, cloud_info, inf):
         self.cloud = cloud_info
@@ -70,6 +84,72 @@ class CloudConnector(LoggerMixin):
             except Exception:
                 pass
 
+    def get_driver_cache_key(self, auth, *args):
+        """
+        Get the key to store a driver in the cache of drivers: the cloud provider,
+        a fingerprint of the credentials and the rest of parameters of the driver.
+
+        Arguments:
+           - auth(dict): credentials of this cloud provider.
+           - args: other values used to create the driver.
+        """
+        fingerprint = hashlib.sha256(json.dumps(auth, sort_keys=True, default=str).encode()).hexdigest()
+        return (self.type, self.cloud.server, self.cloud.port, self.cloud.path, fingerprint) + args
+
+    @staticmethod
+    def _is_token_expired(driver):
+        """ Check if the auth token got by a driver expires soon (if the driver provides this info) """
+        expires = getattr(getattr(driver, "connection", None), "auth_token_expires", None)
+        if not isinstance(expires, datetime.datetime):
+            return False
+        now = datetime.datetime.now(expires.tzinfo) if expires.tzinfo else datetime.datetime.utcnow()
+        return expires - now < datetime.timedelta(seconds=CloudConnector.TOKEN_EXPIRATION_MARGIN)
+
+    @staticmethod
+    def get_cached_driver(key):
+        """
+        Get a driver from the cache of drivers shared by all the connectors of this process,
+        so all the VMs and Infs using the same credentials reuse the same authenticated session.
+        As the connections of the drivers are not thread-safe, each thread gets its own driver.
+
+        Returns: the driver or None if it is not found or it has expired.
+        """
+        thread_key = (key, threading.current_thread().ident)
+        with CloudConnector._driver_cache_lock:
+            if thread_key not in CloudConnector._driver_cache:
+                return None
+            driver, expires = CloudConnector._driver_cache[thread_key]
+            if time.time() > expires or CloudConnector._is_token_expired(driver):
+                del CloudConnector._driver_cache[thread_key]
+                return None
+            return driver
+
+    @staticmethod
+    def cache_driver(key, driver):
+        """
+        Store the driver of the current thread in the cache of drivers during DRIVER_CACHE_TTL secs.
+
+        Returns: True if the driver has been stored (so it must not be kept by the connector,
+        as it may be used later from other threads) or False if the cache is disabled.
+        """
+        if driver is None or Config.DRIVER_CACHE_TTL <= 0:
+            return False
+        now = time.time()
+        with CloudConnector._driver_cache_lock:
+            # Remove the expired drivers (also the ones of the finished threads)
+            for old_key, (_, expires) in list(CloudConnector._driver_cache.items()):
+                if now > expires:
+                    del CloudConnector._driver_cache[old_key]
+            thread_key = (key, threading.current_thread().ident)
+            CloudConnector._driver_cache[thread_key] = (driver, now + Config.DRIVER_CACHE_TTL)
+        return True
+
+    @staticmethod
+    def clear_driver_cache():
+        """ Remove all the drivers of the cache """
+        with CloudConnector._driver_cache_lock:
+            CloudConnector._driver_cache = {}
+
     def concreteSystem(self, radl_system, auth_data):
         """
         Return a list of compatible systems with the cloud
@@ -138,6 +218,27 @@ class CloudConnector(LoggerMixin):
 
         raise NotImplementedError("Should have implemented this")
 
+    def updateVMInfoBatch(self, vms, auth_data):
+        """
+        Updates the information of a list of VMs of this cloud provider.
+        The default implementation calls updateVMInfo for each VM. The connectors able to get the
+        information of all the VMs with a single request must override it and set BATCH_UPDATE.
+
+        Arguments:
+           - vms(list of :py:class:`IM.VirtualMachine`): VMs information to update.
+           - auth_data(:py:class:`dict` of str objects): Authentication data to access cloud provider.
+
+        Returns: a list with a tuple (success, vm), as returned by updateVMInfo, for each VM (in the same order).
+        """
+        res = []
+        for vm in vms:
+            try:
+                res.append(self.updateVMInfo(vm, auth_data))
+            except Exception as ex:
+                self.log_exception("Error updating VM %s info." % vm.id)
+                res.append((False, str(ex)))
+        return res
+
     def alterVM(self, vm, radl, auth_data):
         """
         Modifies the features of a VM
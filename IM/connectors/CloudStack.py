@@ -69,6 +69,13 @@ class CloudStackCloudConnector(LibCloudCloudConnector):
             return self.driver
         else:
             self.auth = auth_data
+
+            # Reuse the driver of other connectors with the same credentials
+            cache_key = self.get_driver_cache_key(auth)
+            driver = self.get_cached_driver(cache_key)
+            if driver:
+                return driver
+
             if 'username' in auth and 'password' in auth:
                 apikey = auth['username']
                 secretkey = auth['password']
@@ -81,7 +88,8 @@ class CloudStackCloudConnector(LibCloudCloudConnector):
 
                 Driver = get_driver(Provider.CLOUDSTACK)
                 driver = Driver(key=apikey, secret=secretkey, url=url)
-                self.driver = driver
+                if not self.cache_driver(cache_key, driver):
+                    self.driver = driver
 
                 return driver
             else:
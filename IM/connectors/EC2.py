@@ -79,6 +79,8 @@ class EC2CloudConnector(CloudConnector):
 
     type = "EC2"
     """str with the name of the provider."""
+    BATCH_UPDATE = True
+    """The info of the instances of each region is got with a single get_all_instances call."""
     INSTANCE_TYPE = 't1.micro'
     """str with the name of the default instance type to launch."""
 
@@ -1175,37 +1177,87 @@ class EC2CloudConnector(CloudConnector):
                 # sometime if you try to update a recently created instance
                 # this operation fails
                 instance.update()
-                if "IM-USER" not in instance.tags:
-                    im_username = "im_user"
-                    if auth_data.getAuthInfo('InfrastructureManager'):
-                        im_username = auth_data.getAuthInfo('InfrastructureManager')[0]['username']
-                    instance.add_tag("IM-USER", im_username)
             except Exception as ex:
                 self.log_exception("Error updating the instance " + instance_id)
                 return (False, "Error updating the instance " + instance_id + ": " + str(ex))
 
-            vm.info.systems[0].setValue("virtual_system_type", instance.virtualization_type)
-            vm.info.systems[0].setValue("availability_zone", instance.placement)
-
-            vm.state = self.VM_STATE_MAP.get(instance.state, VirtualMachine.UNKNOWN)
-
-            instance_type = self.get_instance_type_by_name(instance.instance_type)
-            self.update_system_info_from_instance(vm.info.systems[0], instance_type)
+            return self.update_vm_from_instance(vm, instance, conn, auth_data)
+        else:
+            self.log_warn("Error updating the instance %s. VM not found." % instance_id)
+            return (False, "Error updating the instance %s. VM not found." % instance_id)
 
-            self.setIPsFromInstance(vm, instance)
-            self.add_dns_entries(vm, auth_data)
-            self.addRouterInstance(vm, conn)
+    def updateVMInfoBatch(self, vms, auth_data):
+        # Get the instances of each region with a single request
+        regions = {}
+        for vm in vms:
+            region, instance_id = vm.id.split(";")[0:2]
+            # The spot requests are checked one by one
+            if instance_id[0] != "s":
+                regions.setdefault(region, []).append(instance_id)
+
+        instances = {}
+        for region, instance_ids in regions.items():
+            try:
+                conn = self.get_connection(region, auth_data)
+                for reservation in conn.get_all_instances(instance_ids=instance_ids):
+                    for instance in reservation.instances:
+                        instances[region + ";" + instance.id] = (instance, conn)
+            except Exception:
+                # Some instance may not exist, the VMs of this region are updated one by one
+                self.log_exception("Error getting the instances of region %s." % region)
 
+        res = []
+        for vm in vms:
             try:
-                vm.info.systems[0].setValue('launch_time', int(time.mktime(
-                    time.strptime(instance.launch_time[:19], '%Y-%m-%dT%H:%M:%S'))))
+                if vm.id in instances:
+                    instance, conn = instances[vm.id]
+                    res.append(self.update_vm_from_instance(vm, instance, conn, auth_data))
+                else:
+                    res.append(self.updateVMInfo(vm, auth_data))
             except Exception as ex:
-                self.log_warn("Error setting the launch_time of the instance. "
-                              "Probably the instance is not running:" + str(ex))
+                self.log_exception("Error updating VM %s info." % vm.id)
+                res.append((False, str(ex)))
+        return res
 
-        else:
-            self.log_warn("Error updating the instance %s. VM not found." % instance_id)
-            return (False, "Error updating the instance %s. VM not found." % instance_id)
+    def update_vm_from_instance(self, vm, instance, conn, auth_data):
+        """
+        Update the information of a VM with the data of an EC2 instance
+
+        Arguments:
+           - vm(:py:class:`IM.VirtualMachine`): VM information to update.
+           - instance(:py:class:`boto.ec2.instance`): EC2 instance of the VM.
+           - conn(:py:class:`boto.ec2.connection`): connection object.
+           - auth_data(:py:class:`dict` of str objects): Authentication data to access cloud provider.
+        Returns: a tuple (success, vm) as updateVMInfo.
+        """
+        try:
+            if "IM-USER" not in instance.tags:
+                im_username = "im_user"
+                if auth_data.getAuthInfo('InfrastructureManager'):
+                    im_username = auth_data.getAuthInfo('InfrastructureManager')[0]['username']
+                instance.add_tag("IM-USER", im_username)
+        except Exception as ex:
+            self.log_exception("Error updating the instance " + instance.id)
+            return (False, "Error updating the instance " + instance.id + ": " + str(ex))
+
+        vm.info.systems[0].setValue("virtual_system_type", instance.virtualization_type)
+        vm.info.systems[0].setValue("availability_zone", instance.placement)
+
+        vm.state = self.VM_STATE_MAP.get(instance.state, VirtualMachine.UNKNOWN)
+
+        instance_type = self.get_instance_type_by_name(instance.instance_type)
+        self.update_system_info_from_instance(vm.info.systems[0], instance_type)
+
+        self.setIPsFromInstance(vm, instance)
+        self.add_dns_entries(vm, auth_data)
+        self.addRouterInstance(vm, conn)
+
+        try:
+            vm.info.systems[0].setValue('launch_time', int(time.mktime(
+                time.strptime(instance.launch_time[:19], '%Y-%m-%dT%H:%M:%S'))))
+        except Exception as ex:
+            self.log_warn("Error setting the launch_time of the instance. "
+                          "Probably the instance is not running:" + str(ex))
 
         return (True, vm)
 
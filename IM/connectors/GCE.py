@@ -81,6 +81,12 @@ class GCECloudConnector(LibCloudCloudConnector):
             self.auth = auth_data
             self.datacenter = datacenter
 
+            # Reuse the driver (and its OAuth token) of other connectors with the same credentials
+            cache_key = self.get_driver_cache_key(auth, datacenter)
+            driver = self.get_cached_driver(cache_key)
+            if driver:
+                return driver
+
             if 'username' in auth and 'password' in auth and 'project' in auth:
                 cls = libcloud_get_driver(Provider.GCE)
                 # Patch to solve some client problems with \\n
@@ -92,7 +98,8 @@ class GCECloudConnector(LibCloudCloudConnector):
 
                 driver = cls(auth['username'], auth['password'], project=auth['project'], datacenter=datacenter)
 
-                self.driver = driver
+                if not self.cache_driver(cache_key, driver):
+                    self.driver = driver
                 return driver
             else:
                 self.log_error("No correct auth data has been specified to GCE: username, password and project")
@@ -34,6 +34,9 @@ class KubernetesCloudConnector(CloudConnector):
 
     type = "Kubernetes"
 
+    BATCH_UPDATE = True
+    """The info of the PODs of the Inf is got with a single request."""
+
     _port_base_num = 35000
     """ Base number to assign SSH port on Kubernetes node."""
     _port_counter = 0
@@ -394,17 +397,46 @@ class KubernetesCloudConnector(CloudConnector):
     def updateVMInfo(self, vm, auth_data):
         success, status, output = self._get_pod(vm, auth_data)
         if success:
-            output = json.loads(output)
-            vm.state = self.VM_STATE_MAP.get(
-                output["status"]["phase"], VirtualMachine.UNKNOWN)
-
-            # Update the network info
-            self.setIPs(vm, output)
-            return (True, vm)
+            return (True, self.update_vm_from_pod(vm, json.loads(output)))
         else:
             self.log_error("Error getting info about the POD: code: %s, msg: %s" % (status, output))
             return (False, "Error getting info about the POD: code: %s, msg: %s" % (status, output))
 
+    def updateVMInfoBatch(self, vms, auth_data):
+        # Get all the PODs of each namespace with a single request
+        pods = {}
+        for namespace in set([vm.inf.id for vm in vms]):
+            try:
+                apiVersion = self.get_api_version(auth_data)
+                uri = "/api/" + apiVersion + "/namespaces/" + namespace + "/pods"
+                resp = self.create_request('GET', uri, auth_data)
+                if resp.status_code == 200:
+                    for pod in json.loads(resp.text)["items"]:
+                        pods[(namespace, pod["metadata"]["name"])] = pod
+                else:
+                    self.log_error("Error getting the PODs of namespace %s: code: %s, msg: %s" %
+                                   (namespace, resp.status_code, resp.text))
+            except Exception:
+                self.log_exception("Error getting the PODs of namespace %s." % namespace)
+
+        res = []
+        for vm in vms:
+            if (vm.inf.id, vm.id) in pods:
+                res.append((True, self.update_vm_from_pod(vm, pods[(vm.inf.id, vm.id)])))
+            else:
+                res.append(self.updateVMInfo(vm, auth_data))
+        return res
+
+    def update_vm_from_pod(self, vm, pod_info):
+        """
+        Update the information of a VM with the JSON information about its POD
+        """
+        vm.state = self.VM_STATE_MAP.get(pod_info["status"]["phase"], VirtualMachine.UNKNOWN)
+
+        # Update the network info
+        self.setIPs(vm, pod_info)
+        return vm
+
     @staticmethod
     def setIPs(vm, pod_info):
         """
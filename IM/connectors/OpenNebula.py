@@ -88,6 +88,10 @@ class VM(XMLObject):
     numeric = ['ID', 'UID', 'STATE', 'LCM_STATE', 'STIME', 'ETIME']
 
 
+class VM_POOL(XMLObject):
+    tuples_lists = {'VM': VM}
+
+
 class LEASE(XMLObject):
     values = ['IP', 'MAC', 'USED']
 
@@ -163,6 +167,8 @@ class OpenNebulaCloudConnector(CloudConnector):
 
     type = "OpenNebula"
     """str with the name of the provider."""
+    BATCH_UPDATE = True
+    """The info of the VMs is got with one.vmpool.infoextended (or one.vmpool.info)."""
     DEFAULT_USER = 'root'
     """ default user to SSH access the VM """
 
@@ -180,6 +186,8 @@ class OpenNebulaCloudConnector(CloudConnector):
                                                 self.cloud.port, self.cloud.path)
         else:
             self.server_url = "http://%s:%d/RPC2" % (self.cloud.server, self.cloud.port)
+        self.infoextended = None
+        """Flag to specify if the ONE server supports the vmpool.infoextended function (None if unknown)."""
 
     def concrete_system(self, radl_system, str_url, auth_data):
         url = urlparse(str_url)
@@ -295,57 +303,98 @@ class OpenNebulaCloudConnector(CloudConnector):
 
         success, res_info = server.one.vm.info(session_id, int(vm.id))[0:2]
         if success:
-            res_vm = VM(res_info)
+            return (success, self.update_vm_from_info(vm, VM(res_info)))
+        else:
+            return (success, res_info)
 
-            vm.info.systems[0].setValue('instance_name', res_vm.NAME)
+    def updateVMInfoBatch(self, vms, auth_data):
+        server = ServerProxy(self.server_url, allow_none=True)
 
-            # update the state of the VM
-            if res_vm.STATE < 3:
+        session_id = self.getSessionID(auth_data)
+        if session_id is None:
+            return [(False, "Incorrect auth data, username and password must be specified for OpenNebula provider.")
+                    ] * len(vms)
+
+        # Since ONE 5.8 vmpool.info returns a reduced body of the VMs (without the whole TEMPLATE)
+        if self.infoextended is None:
+            self.infoextended = "one.vmpool.infoextended" in server.system.listMethods()
+        if self.infoextended:
+            pool_info = server.one.vmpool.infoextended
+        else:
+            pool_info = server.one.vmpool.info
+
+        ids = [int(vm.id) for vm in vms]
+        # The state filter -1 returns the VMs in any state except DONE
+        success, res_info = pool_info(session_id, -2, min(ids), max(ids), -1)[0:2]
+        if not success:
+            return [(success, res_info)] * len(vms)
+
+        res_vms = dict([(res_vm.ID, res_vm) for res_vm in VM_POOL(res_info).VM])
+        res = []
+        for vm in vms:
+            if int(vm.id) in res_vms:
+                res.append((True, self.update_vm_from_info(vm, res_vms[int(vm.id)])))
+            else:
+                # The VM may be in the DONE state, so get it individually
+                res.append(self.updateVMInfo(vm, auth_data))
+        return res
+
+    def update_vm_from_info(self, vm, res_vm):
+        """
+        Update the information of a VM with the data returned by the ONE API
+
+        Arguments:
+           - vm(:py:class:`IM.VirtualMachine`): VM information to update.
+           - res_vm(:py:class:`VM`): data of the VM returned by the ONE API.
+        Returns: the updated :py:class:`IM.VirtualMachine`
+        """
+        vm.info.systems[0].setValue('instance_name', res_vm.NAME)
+
+        # update the state of the VM
+        if res_vm.STATE < 3:
+            res_state = VirtualMachine.PENDING
+        elif res_vm.STATE == 3:
+            if res_vm.LCM_STATE < 3:
                 res_state = VirtualMachine.PENDING
-            elif res_vm.STATE == 3:
-                if res_vm.LCM_STATE < 3:
-                    res_state = VirtualMachine.PENDING
-                elif res_vm.LCM_STATE == 5 or res_vm.LCM_STATE == 6:
-                    res_state = VirtualMachine.STOPPED
-                elif res_vm.LCM_STATE == [14, 44, 61]:
-                    res_state = VirtualMachine.FAILED
-                elif res_vm.LCM_STATE == 16:
-                    res_state = VirtualMachine.UNKNOWN
-                elif res_vm.LCM_STATE == 12 or res_vm.LCM_STATE == 13 or res_vm.LCM_STATE == 18:
-                    res_state = VirtualMachine.OFF
-                elif res_vm.LCM_STATE >= 36 and res_vm.LCM_STATE <= 42:
-                    res_state = VirtualMachine.FAILED
-                elif res_vm.LCM_STATE >= 46 and res_vm.LCM_STATE <= 50:
-                    res_state = VirtualMachine.FAILED
-                else:
-                    res_state = VirtualMachine.RUNNING
-            elif res_vm.STATE == 4 or res_vm.STATE == 5:
+            elif res_vm.LCM_STATE == 5 or res_vm.LCM_STATE == 6:
                 res_state = VirtualMachine.STOPPED
-            elif res_vm.STATE == 7:
+            elif res_vm.LCM_STATE == [14, 44, 61]:
                 res_state = VirtualMachine.FAILED
-            elif res_vm.STATE == 6 or res_vm.STATE == 8 or res_vm.STATE == 9:
+            elif res_vm.LCM_STATE == 16:
+                res_state = VirtualMachine.UNKNOWN
+            elif res_vm.LCM_STATE == 12 or res_vm.LCM_STATE == 13 or res_vm.LCM_STATE == 18:
                 res_state = VirtualMachine.OFF
+            elif res_vm.LCM_STATE >= 36 and res_vm.LCM_STATE <= 42:
+                res_state = VirtualMachine.FAILED
+            elif res_vm.LCM_STATE >= 46 and res_vm.LCM_STATE <= 50:
+                res_state = VirtualMachine.FAILED
             else:
-                res_state = VirtualMachine.UNKNOWN
-            vm.state = res_state
+                res_state = VirtualMachine.RUNNING
+        elif res_vm.STATE == 4 or res_vm.STATE == 5:
+            res_state = VirtualMachine.STOPPED
+        elif res_vm.STATE == 7:
+            res_state = VirtualMachine.FAILED
+        elif res_vm.STATE == 6 or res_vm.STATE == 8 or res_vm.STATE == 9:
+            res_state = VirtualMachine.OFF
+        else:
+            res_state = VirtualMachine.UNKNOWN
+        vm.state = res_state
 
-            # Update network data
-            self.setIPsFromTemplate(vm, res_vm.TEMPLATE)
+        # Update network data
+        self.setIPsFromTemplate(vm, res_vm.TEMPLATE)
 
-            # Update disks data
-            self.setDisksFromTemplate(vm, res_vm.TEMPLATE)
+        # Update disks data
+        self.setDisksFromTemplate(vm, res_vm.TEMPLATE)
 
-            vm.info.systems[0].addFeature(Feature(
-                "cpu.count", "=", res_vm.TEMPLATE.CPU), conflict="other", missing="other")
-            vm.info.systems[0].addFeature(Feature(
-                "memory.size", "=", res_vm.TEMPLATE.MEMORY, 'M'), conflict="other", missing="other")
+        vm.info.systems[0].addFeature(Feature(
+            "cpu.count", "=", res_vm.TEMPLATE.CPU), conflict="other", missing="other")
+        vm.info.systems[0].addFeature(Feature(
+            "memory.size", "=", res_vm.TEMPLATE.MEMORY, 'M'), conflict="other", missing="other")
 
-            if res_vm.STIME > 0:
-                vm.info.systems[0].setValue('launch_time', res_vm.STIME)
+        if res_vm.STIME > 0:
+            vm.info.systems[0].setValue('launch_time', res_vm.STIME)
 
-            return (success, vm)
-        else:
-            return (success, res_info)
+        return vm
 
     def _get_security_group(self, sg_name, auth_data):
         server = ServerProxy(self.server_url, allow_none=True)
@@ -49,6 +49,8 @@ class OpenStackCloudConnector(LibCloudCloudConnector):
 
     type = "OpenStack"
     """str with the name of the provider."""
+    BATCH_UPDATE = True
+    """The info of the VMs is got with a single list_nodes call."""
     DEFAULT_USER = 'cloudadm'
     """ default user to SSH access the VM """
     MAX_ADD_IP_COUNT = 5
@@ -94,6 +96,12 @@ class OpenStackCloudConnector(LibCloudCloudConnector):
         else:
             self.auth = auth_data
 
+            # Reuse the driver (and its auth token) of other connectors with the same credentials
+            cache_key = self.get_driver_cache_key(auth)
+            driver = self.get_cached_driver(cache_key)
+            if driver:
+                return driver
+
             protocol = self.cloud.protocol
             if not protocol:
                 protocol = "http"
@@ -182,7 +190,8 @@ class OpenStackCloudConnector(LibCloudCloudConnector):
                     driver.network_connection.service_region = None
                     driver.volumev2_connection.service_region = None
 
-            self.driver = driver
+            if not self.cache_driver(cache_key, driver):
+                self.driver = driver
             return driver
 
     def get_instance_type(self, sizes, radl):
@@ -357,23 +366,53 @@ class OpenStackCloudConnector(LibCloudCloudConnector):
     def updateVMInfo(self, vm, auth_data):
         node = self.get_node_with_id(vm.id, auth_data)
         if node:
-            vm.state = self.VM_STATE_MAP.get(node.state, VirtualMachine.UNKNOWN)
-
-            try:
-                flavorId = node.extra['flavorId']
-                instance_type = node.driver.ex_get_size(flavorId)
-                self.update_system_info_from_instance(vm.info.systems[0], instance_type)
-            except Exception as ex:
-                self.log_warn("Error updating VM info from flavor ID: %s" % get_ex_error(ex))
-
-            self.addRouterInstance(vm, node.driver)
-            self.setIPsFromInstance(vm, node)
-            self.setVolumesInfo(vm, node)
+            return (True, self.update_vm_from_node(vm, node))
         else:
             self.log_warn("Error updating the instance %s. VM not found." % vm.id)
             return (False, "Error updating the instance %s. VM not found." % vm.id)
 
-        return (True, vm)
+    def updateVMInfoBatch(self, vms, auth_data):
+        driver = self.get_driver(auth_data)
+        nodes = dict([(node.id, node) for node in driver.list_nodes()])
+        # Get each flavor only once
+        sizes = {}
+        res = []
+        for vm in vms:
+            if vm.id in nodes:
+                res.append((True, self.update_vm_from_node(vm, nodes[vm.id], sizes)))
+            else:
+                self.log_warn("Error updating the instance %s. VM not found." % vm.id)
+                res.append((False, "Error updating the instance %s. VM not found." % vm.id))
+        return res
+
+    def update_vm_from_node(self, vm, node, sizes=None):
+        """
+        Update the information of a VM with the data of a libcloud node
+
+        Arguments:
+           - vm(:py:class:`IM.VirtualMachine`): VM information to update.
+           - node(:py:class:`libcloud.compute.base.Node`): node of the VM.
+           - sizes(dict): cache of the flavors already got, indexed by ID.
+        Returns: the updated :py:class:`IM.VirtualMachine`
+        """
+        vm.state = self.VM_STATE_MAP.get(node.state, VirtualMachine.UNKNOWN)
+
+        try:
+            flavorId = node.extra['flavorId']
+            if sizes is None:
+                instance_type = node.driver.ex_get_size(flavorId)
+            else:
+                if flavorId not in sizes:
+                    sizes[flavorId] = node.driver.ex_get_size(flavorId)
+                instance_type = sizes[flavorId]
+            self.update_system_info_from_instance(vm.info.systems[0], instance_type)
+        except Exception as ex:
+            self.log_warn("Error updating VM info from flavor ID: %s" % get_ex_error(ex))
+
+        self.addRouterInstance(vm, node.driver)
+        self.setIPsFromInstance(vm, node)
+        self.setVolumesInfo(vm, node)
+        return vm
 
     @staticmethod
     def map_radl_ost_networks(vm, ost_nets):
@@ -16,6 +16,9 @@
 
 """Class to manage DB operations"""
 import time
+import threading
+from contextlib import contextmanager
+from IM.config import Config
 
 try:
     from urlparse import urlparse
@@ -68,11 +71,16 @@ class DataBase:
     MYSQL = "MySQL"
     SQLITE = "SQLite"
     DB_TYPES = [MYSQL, SQLITE]
+    SQL_CACHE_SIZE = 256
+
+    _sql_cache = {}
+    """Map from (db_type, SQL sentence) to the SQL sentence adapted to the DB type."""
 
     def __init__(self, db_url):
         self.db_url = db_url
         self.connection = None
         self.db_type = None
+        self._transaction = False
 
     def connect(self):
         """ Function to connect to the DB
@@ -136,13 +144,40 @@ class DataBase:
 
     def _connect_sqlite(self, db_filename):
         if SQLITE_AVAILABLE:
-            self.connection = sqlite.connect(db_filename)
+            # The connection may be used by different threads (one at a time) if it is pooled
+            # The timeout sets the SQLite busy timeout: wait for the locks instead of failing
+            self.connection = sqlite.connect(db_filename, timeout=Config.DB_SQLITE_BUSY_TIMEOUT,
+                                             check_same_thread=False)
             self.db_type = DataBase.SQLITE
+            if Config.DB_SQLITE_WAL:
+                # WAL journaling enables readers and a writer to access the DB concurrently
+                try:
+                    cursor = self.connection.cursor()
+                    cursor.execute("PRAGMA journal_mode=WAL")
+                    cursor.fetchall()
+                except sqlite.OperationalError:
+                    # The DB is read-only, use the default journal mode
+                    pass
             return True
         else:
             return False
 
-    def _execute_retry(self, sql, args, fetch=False):
+    def _get_sql(self, sql):
+        """ Get the SQL sentence adapted to the DB type (the results are cached) """
+        key = (self.db_type, sql)
+        new_sql = DataBase._sql_cache.get(key)
+        if new_sql is None:
+            if self.db_type == DataBase.SQLITE:
+                new_sql = sql.replace("%s", "?").replace("now()", "date('now')")
+            elif self.db_type == DataBase.MYSQL:
+                new_sql = sql.replace("?", "%s")
+            else:
+                new_sql = sql
+            if len(DataBase._sql_cache) < DataBase.SQL_CACHE_SIZE:
+                DataBase._sql_cache[key] = new_sql
+        return new_sql
+
+    def _execute_retry(self, sql, args, fetch=False, rowcount=False):
         """ Function to execute a SQL function, retrying in case of locked DB
 
             Arguments:
@@ -150,9 +185,12 @@ class DataBase:
             - args: A List of arguments to substitute in the SQL sentence
             - fetch: If the function must fetch the results.
                     (Optional, default False)
+            - rowcount: If the function must return the number of affected rows.
+                    (Optional, default False)
 
             Returns: True if fetch is False and the operation is performed
-                     correctly or a list with the "Fetch" of the results
+                     correctly (or the number of affected rows if rowcount is True)
+                     or a list with the "Fetch" of the results
         """
 
         if self.connection is None:
@@ -163,23 +201,21 @@ class DataBase:
                 try:
                     cursor = self.connection.cursor()
                     if args is not None:
-                        if self.db_type == DataBase.SQLITE:
-                            new_sql = sql.replace("%s", "?").replace("now()", "date('now')")
-                        elif self.db_type == DataBase.MYSQL:
-                            new_sql = sql.replace("?", "%s")
-                        cursor.execute(new_sql, args)
+                        cursor.execute(self._get_sql(sql), args)
                     else:
                         cursor.execute(sql)
 
                     if fetch:
                         res = list(cursor.fetchall())
                     else:
-                        self.connection.commit()
-                        res = True
+                        if not self._transaction:
+                            self.connection.commit()
+                        res = cursor.rowcount if rowcount else True
                     return res
                 # If the operational error is db lock, retry
+                # (not inside a transaction, as the previous sentences would be lost)
                 except sqlite.OperationalError as ex:
-                    if str(ex).lower() == 'database is locked':
+                    if str(ex).lower() == 'database is locked' and not self._transaction:
                         retries_cont += 1
                         # release the connection
                         self.close()
@@ -191,19 +227,46 @@ class DataBase:
                 except sqlite.IntegrityError as ex:
                     raise IntegrityError()
 
-    def execute(self, sql, args=None):
+    @contextmanager
+    def transaction(self):
+        """ Executes the SQL sentences of the block in a single transaction, committed at the end
+            of the block or rolled back if the block raises an exception.
+            MongoDB does not support transactions, so the operations are applied one by one.
+        """
+        if self.db_type == DataBase.MONGO or self._transaction:
+            yield
+            return
+        if self.db_type == DataBase.SQLITE:
+            # Lock the DB for writing in the first sentence, so other writers cannot abort the transaction
+            self.connection.isolation_level = "IMMEDIATE"
+        self._transaction = True
+        try:
+            yield
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self._transaction = False
+            if self.db_type == DataBase.SQLITE:
+                self.connection.isolation_level = ""
+
+    def execute(self, sql, args=None, rowcount=False):
         """ Executes a SQL sentence without returning results
 
             Arguments:
             - sql: The SQL sentence
             - args: A List of arguments to substitute in the SQL sentence
                     (Optional, default None)
+            - rowcount: If the function must return the number of affected rows.
+                    (Optional, default False)
 
             Returns: True if the operation is performed correctly
+                     (or the number of affected rows if rowcount is True)
         """
         if self.db_type == DataBase.MONGO:
             raise Exception("Operation not supported in MongoDB")
-        return self._execute_retry(sql, args)
+        return self._execute_retry(sql, args, rowcount=rowcount)
 
     def select(self, sql, args=None):
         """ Executes a SQL sentence that returns results
@@ -233,6 +296,24 @@ class DataBase:
             except Exception:
                 return False
 
+    def is_alive(self):
+        """ Checks if the DB connection is still usable
+
+            Returns: True if the connection is alive or False otherwise
+        """
+        if self.connection is None:
+            return False
+        try:
+            if self.db_type == DataBase.MONGO:
+                self.connection.client.admin.command('ping')
+            else:
+                cursor = self.connection.cursor()
+                cursor.execute("select 1")
+                cursor.fetchall()
+            return True
+        except Exception:
+            return False
+
     def table_exists(self, table_name):
         """ Checks if a table exists in the DB
 
@@ -258,8 +339,66 @@ class DataBase:
         else:
             return True
 
-    def find(self, table_name, filt=None, projection=None, sort=None):
-        """ find elements """
+    def column_exists(self, table_name, column_name):
+        """ Checks if a column exists in a table of the DB
+
+            Arguments:
+            - table_name: The name of the table
+            - column_name: The name of the column
+
+            Returns: True if the column exists or False otherwise
+        """
+        if self.db_type == DataBase.SQLITE:
+            res = [elem for elem in self.select('PRAGMA table_info(%s)' % table_name) if elem[1] == column_name]
+        elif self.db_type == DataBase.MYSQL:
+            uri = urlparse(self.db_url)
+            db = uri[2][1:]
+            res = self.select('SELECT * FROM information_schema.columns WHERE table_name = %s and'
+                              ' column_name = %s and table_schema = %s', (table_name, column_name, db))
+        elif self.db_type == DataBase.MONGO:
+            # Mongo collections has no schema
+            return True
+        else:
+            return False
+
+        return len(res) > 0
+
+    def index_exists(self, table_name, index_name):
+        """ Checks if an index exists in a table of the DB
+
+            Arguments:
+            - table_name: The name of the table
+            - index_name: The name of the index
+
+            Returns: True if the index exists or False otherwise
+        """
+        if self.db_type == DataBase.SQLITE:
+            res = self.select('select name from sqlite_master where type="index" and tbl_name = %s and name = %s',
+                              (table_name, index_name))
+        elif self.db_type == DataBase.MYSQL:
+            uri = urlparse(self.db_url)
+            db = uri[2][1:]
+            res = self.select('SELECT * FROM information_schema.statistics WHERE table_name = %s and'
+                              ' index_name = %s and table_schema = %s', (table_name, index_name, db))
+        elif self.db_type == DataBase.MONGO:
+            return index_name in self.connection[table_name].index_information()
+        else:
+            return False
+
+        return len(res) > 0
+
+    def create_index(self, table_name, keys):
+        """ create an index (if it does not exist) """
+        if self.db_type != DataBase.MONGO:
+            raise Exception("Operation only supported in MongoDB")
+
+        if self.connection is None:
+            raise Exception("DataBase object not connected")
+        else:
+            return self.connection[table_name].create_index(keys)
+
+    def find(self, table_name, filt=None, projection=None, sort=None, limit=0):
+        """ find elements (limit 0 means no limit) """
         if self.db_type != DataBase.MONGO:
             raise Exception("Operation only supported in MongoDB")
 
@@ -268,17 +407,17 @@ class DataBase:
         else:
             if projection:
                 projection.update({'_id': False})
-            return list(self.connection[table_name].find(filt, projection, sort=sort))
+            return list(self.connection[table_name].find(filt, projection, sort=sort, limit=limit))
 
-    def replace(self, table_name, filt, replacement):
-        """ insert/replace elements """
+    def replace(self, table_name, filt, replacement, upsert=True):
+        """ insert/replace elements (only replace if upsert is False) """
         if self.db_type != DataBase.MONGO:
             raise Exception("Operation only supported in MongoDB")
 
         if self.connection is None:
             raise Exception("DataBase object not connected")
         else:
-            res = self.connection[table_name].replace_one(filt, replacement, True)
+            res = self.connection[table_name].replace_one(filt, replacement, upsert)
             return res.modified_count == 1 or res.upserted_id is not None
 
     def delete(self, table_name, filt):
@@ -292,6 +431,129 @@ class DataBase:
             return self.connection[table_name].delete_many(filt).deleted_count
 
 
+class DataBasePool:
+    """
+    Thread-safe pool of connected DataBase objects to the same DB URL.
+    """
+
+    pools = {}
+    """Map from DB URL to :py:class:`DataBasePool`."""
+
+    _pools_lock = threading.Lock()
+    """Threading Lock to protect the pools map."""
+
+    def __init__(self, db_url, max_size=10, timeout=30, check_interval=60):
+        self.db_url = db_url
+        """URL of the DB."""
+        self.max_size = max_size
+        """Max number of connections opened at the same time."""
+        self.timeout = timeout
+        """Max time (in secs) to wait for a free connection."""
+        self.check_interval = check_interval
+        """Time (in secs) a connection can be idle without checking its health."""
+        self._idle = []
+        """List of tuples (DataBase, last_use) of connections not in use."""
+        self._in_use = 0
+        """Number of connections currently in use."""
+        self._cond = threading.Condition(threading.Lock())
+        """Condition to protect the pool data and wait for free connections."""
+
+    @staticmethod
+    def get_pool(db_url, max_size=10, timeout=30, check_interval=60):
+        """ Get the pool associated to a DB URL, creating it if needed """
+        with DataBasePool._pools_lock:
+            if db_url not in DataBasePool.pools:
+                DataBasePool.pools[db_url] = DataBasePool(db_url, max_size, timeout, check_interval)
+            return DataBasePool.pools[db_url]
+
+    @staticmethod
+    def close_all():
+        """ Close the idle connections of all the pools """
+        with DataBasePool._pools_lock:
+            pools = list(DataBasePool.pools.values())
+        for pool in pools:
+            pool.close()
+
+    def _acquire_slot(self):
+        """ Wait until the number of connections in use is under the limit and get an idle one (if any) """
+        end = time.time() + self.timeout
+        with self._cond:
+            while self._in_use >= self.max_size:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    raise Exception("Timeout waiting for a free connection to the DB.")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            if self._idle:
+                return self._idle.pop()
+        return None, None
+
+    def _release_slot(self, idle=None):
+        """ Free one of the connections in use, optionally storing an idle one """
+        with self._cond:
+            self._in_use -= 1
+            if idle:
+                self._idle.append(idle)
+            self._cond.notify()
+
+    def get(self):
+        """ Get a connected DataBase object from the pool
+
+            Returns: a connected DataBase object or None in case of errors.
+        """
+        db, last_use = self._acquire_slot()
+        try:
+            if db and (time.time() - last_use < self.check_interval or db.is_alive()):
+                return db
+            if db:
+                # The connection is broken, discard it and open a new one
+                db.close()
+
+            db = DataBase(self.db_url)
+            if db.connect():
+                return db
+        except Exception:
+            pass
+
+        self._release_slot()
+        return None
+
+    def put(self, db, check=False):
+        """ Return a DataBase object to the pool
+
+            Arguments:
+            - db: DataBase object returned by get.
+            - check: flag to force a health check of the connection before reusing it.
+        """
+        self._release_slot((db, 0 if check else time.time()))
+
+    @contextmanager
+    def connection(self):
+        """ Context manager to get a connected DataBase object that is returned to the pool on exit.
+            It yields None if the DB is not available.
+        """
+        db = self.get()
+        if db is None:
+            yield None
+        else:
+            try:
+                yield db
+            except Exception:
+                # The connection may be broken, check it before reusing it
+                self.put(db, True)
+                raise
+            else:
+                self.put(db)
+
+    def close(self):
+        """ Close all the idle connections of the pool """
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+        for db, _ in idle:
+            db.close()
+
+
 try:
     class IntegrityError(sqlite.IntegrityError):
         """ Class to return IntegrityError independently of the DB used"""
@@ -0,0 +1,118 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import uuid
+import hashlib
+import threading
+
+
+class ChangeEvents:
+    """
+    Bus of the changes of state of the infrastructures.
+
+    Each change of an Inf gets a new version number from a global sequence, so the
+    clients can wait for the next change of an Inf comparing the versions.
+    The versions are local to this IM process.
+    """
+
+    EPOCH = uuid.uuid4().hex[:8]
+    """Random ID of this IM process, to distinguish its versions from the ones of other processes."""
+
+    _cond = threading.Condition(threading.Lock())
+    """Condition to protect the versions and wait for changes."""
+
+    _seq = 0
+    """Last version number assigned."""
+
+    _versions = {}
+    """Map from Inf ID to the version number of its last change."""
+
+    @staticmethod
+    def publish(inf_id, remove=False):
+        """
+        Notify a change in an Inf, waking up the threads waiting for it.
+
+        Args:
+
+        - inf_id(str): infrastructure id.
+        - remove(bool): Flag to stop tracking the Inf (i.e. it has been destroyed).
+        """
+        if inf_id is None:
+            return
+        with ChangeEvents._cond:
+            ChangeEvents._seq += 1
+            if remove:
+                ChangeEvents._versions.pop(inf_id, None)
+            else:
+                ChangeEvents._versions[inf_id] = ChangeEvents._seq
+            ChangeEvents._cond.notify_all()
+
+    @staticmethod
+    def get_version(inf_id):
+        """ Get the version number of the last change of an Inf (0 if unknown) """
+        with ChangeEvents._cond:
+            return ChangeEvents._versions.get(inf_id, 0)
+
+    @staticmethod
+    def get_etag(inf_id, db_version=0, variant=""):
+        """
+        Get a strong entity tag of the current content of an Inf without building it: the epoch of
+        this process, the version of the Inf stored in the DB (changed by other IM processes),
+        the version of its last change in this process and a digest of the variant of the content.
+        """
+        digest = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:8]
+        return '"%s-%s-%s-%s"' % (ChangeEvents.EPOCH, db_version, ChangeEvents.get_version(inf_id), digest)
+
+    @staticmethod
+    def wait(inf_id, version, timeout):
+        """
+        Wait until the version of an Inf is different from the specified one or the timeout expires.
+
+        Returns: the current version of the Inf.
+        """
+        end = time.time() + timeout
+        with ChangeEvents._cond:
+            while True:
+                current = ChangeEvents._versions.get(inf_id, 0)
+                remaining = end - time.time()
+                if current != version or remaining <= 0:
+                    return current
+                ChangeEvents._cond.wait(remaining)
+
+
+class NotifiedAttribute(object):
+    """
+    Descriptor of an attribute that publishes a change event of the Inf when its value changes.
+    """
+
+    def __init__(self, name, get_inf_id):
+        self.name = name
+        """Name of the attribute."""
+        self.get_inf_id = get_inf_id
+        """Function to get the ID of the Inf of the object."""
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.name)
+
+    def __set__(self, obj, value):
+        # The first assignment is not a change
+        old_value = obj.__dict__.get(self.name, value)
+        obj.__dict__[self.name] = value
+        if old_value != value:
+            ChangeEvents.publish(self.get_inf_id(obj))
@@ -0,0 +1,289 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+
+from IM.config import Config
+from IM.events import ChangeEvents
+# IM.InfrastructureList is not imported here to avoid circular imports
+# (it is always loaded before any log is moved to the DB)
+import IM
+
+
+class SpilledChunk(object):
+    """
+    Part of a log moved to the DB, that is only read when its content is accessed.
+    It supports the str operations used to get fragments of the logs.
+    """
+
+    def __init__(self, key, seq, size):
+        self.key = key
+        """Tuple (Inf ID, VM ID) of the log."""
+        self.seq = seq
+        """Number of the chunk in the log."""
+        self.size = size
+        """Length of the chunk."""
+        self._data = None
+
+    def get_data(self):
+        """ Read the content of the chunk from the DB """
+        if self._data is None:
+            data = IM.InfrastructureList.InfrastructureList.get_cont_msg_chunk(self.key[0], self.key[1], self.seq)
+            if data is None:
+                LogBuffer.logger.error("Chunk %d of the log of %s not found." % (self.seq, self.key))
+                data = ""
+            # Keep the offsets of the rest of the log
+            self._data = data[:self.size].ljust(self.size)
+        return self._data
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.get_data()[index]
+
+    def __str__(self):
+        return self.get_data()
+
+    def rfind(self, sub, *args):
+        return self.get_data().rfind(sub, *args)
+
+    def endswith(self, suffix):
+        return self.get_data().endswith(suffix)
+
+
+class LogBuffer:
+    """
+    Append-only text log stored as a list of chunks.
+    When the size of the chunks kept in memory exceeds MAX_CONT_MSG_SIZE, the oldest part
+    of the log is moved to the DB, so only the last part of the log is kept in memory and
+    stored in the serialized data of the Inf.
+    """
+
+    logger = logging.getLogger('InfrastructureManager')
+    """Logger object."""
+
+    def __init__(self, data=""):
+        self._chunks = [data] if data else []
+        self._size = len(data)
+        self._spilled = []
+        self._spilled_size = 0
+        self._spill_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def _get_memory(self):
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def _get_spill_limit(self):
+        return max(Config.MAX_CONT_MSG_SIZE, self._spill_size)
+
+    def _append(self, data, key):
+        if not data:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+        if not Config.MAX_CONT_MSG_SIZE or not key or self._size - self._spilled_size <= self._get_spill_limit():
+            return
+        # Move the oldest part of the log to the DB, keeping half of the max size in memory
+        memory = self._get_memory()
+        cut = len(memory) - Config.MAX_CONT_MSG_SIZE // 2
+        seq = len(self._spilled)
+        if IM.InfrastructureList.InfrastructureList.save_cont_msg_chunk(key[0], key[1], seq, memory[:cut]):
+            self._spilled.append(cut)
+            self._spilled_size += cut
+            self._chunks = [memory[cut:]]
+            self._spill_size = 0
+        else:
+            # Do not try it again until the log grows another max size
+            self._spill_size = len(memory) + Config.MAX_CONT_MSG_SIZE
+
+    def _reset(self, key):
+        if self._spilled and key:
+            IM.InfrastructureList.InfrastructureList.delete_cont_msg_chunks(key[0], key[1])
+        self._chunks = []
+        self._size = 0
+        self._spilled = []
+        self._spilled_size = 0
+        self._spill_size = 0
+
+    def append(self, data, key=None):
+        """
+        Add data at the end of the log.
+
+        Args:
+
+        - data(str): text to add.
+        - key(tuple): tuple (Inf ID, VM ID) used to store the old chunks in the DB (None to keep them in memory).
+        """
+        with self._lock:
+            self._append(data, key)
+
+    def replace_from(self, pos, data, key=None):
+        """
+        Replace the content of the log from position pos with data.
+        If the current content is a prefix of data (the usual case when a log is read again)
+        only the new part is appended.
+        """
+        with self._lock:
+            pos = min(pos, self._size)
+            if pos >= self._spilled_size:
+                memory = self._get_memory()
+                current = memory[pos - self._spilled_size:]
+                if data.startswith(current):
+                    self._append(data[len(current):], key)
+                else:
+                    self._chunks = [memory[:pos - self._spilled_size]]
+                    self._size = pos
+                    self._append(data, key)
+            elif len(data) >= self._size - pos and data[self._spilled_size - pos:].startswith(self._get_memory()):
+                self._append(data[self._size - pos:], key)
+            else:
+                # The modified part has been moved to the DB, write the log again
+                value = "".join([str(part) for part in self._get_parts(key)])[:pos] if pos else ""
+                self._reset(key)
+                self._append(value + data, key)
+
+    def set(self, data, key=None):
+        """ Replace the whole content of the log """
+        self.replace_from(0, data, key)
+
+    def _get_parts(self, key):
+        parts = []
+        for seq, size in enumerate(self._spilled):
+            parts.append(SpilledChunk(key, seq, size))
+        parts.extend(self._chunks)
+        return parts
+
+    def get_parts(self, key=None, lazy=False):
+        """
+        Get the list of parts of the log.
+
+        Args:
+
+        - key(tuple): tuple (Inf ID, VM ID) used to store the old chunks in the DB.
+        - lazy(bool): return the parts moved to the DB as :py:class:`SpilledChunk` objects
+          instead of reading them.
+        """
+        with self._lock:
+            parts = self._get_parts(key)
+        if lazy:
+            return parts
+        return [str(part) for part in parts]
+
+    def get_value(self, key=None):
+        """ Get the whole content of the log """
+        return "".join(self.get_parts(key))
+
+    def serialize(self):
+        """
+        Get the data of the log to store it in the data of the Inf: a str if all the log is
+        in memory or a dict with the part in memory and the sizes of the chunks in the DB.
+        """
+        with self._lock:
+            memory = self._get_memory()
+            if not self._spilled:
+                return memory
+            return {"data": memory, "spilled": list(self._spilled)}
+
+    @staticmethod
+    def deserialize(data):
+        """ Create a LogBuffer from the data returned by serialize (or a str) """
+        if isinstance(data, LogBuffer):
+            return data
+        if isinstance(data, dict):
+            newlog = LogBuffer(data.get("data", ""))
+            newlog._spilled = list(data.get("spilled", []))
+            newlog._spilled_size = sum(newlog._spilled)
+            newlog._size += newlog._spilled_size
+            return newlog
+        return LogBuffer(data or "")
+
+
+class LogAttribute(object):
+    """
+    Descriptor of a str attribute stored as a :py:class:`LogBuffer`.
+    Its value is read and assigned as a str, and the appends and reads by offset
+    can be done with the methods of the descriptor without building the whole str.
+    """
+
+    def __init__(self, name, get_key):
+        self.name = name
+        """Name of the attribute."""
+        self.get_key = get_key
+        """Function to get the tuple (Inf ID, VM ID) of the log of the object (or None)."""
+
+    def get_buffer(self, obj):
+        """ Get the LogBuffer of the object """
+        value = obj.__dict__.get(self.name)
+        if not isinstance(value, LogBuffer):
+            value = LogBuffer.deserialize(value)
+            obj.__dict__[self.name] = value
+        return value
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self.get_buffer(obj).get_value(self.get_key(obj))
+
+    def __set__(self, obj, value):
+        # The first assignment is not a change
+        if self.name not in obj.__dict__:
+            obj.__dict__[self.name] = LogBuffer(value)
+        else:
+            key = self.get_key(obj)
+            self.get_buffer(obj).set(value, key)
+            self._publish(key)
+
+    def append(self, obj, data):
+        """ Add data at the end of the log of the object """
+        key = self.get_key(obj)
+        self.get_buffer(obj).append(data, key)
+        self._publish(key)
+
+    def replace_from(self, obj, pos, data):
+        """ Replace the content of the log of the object from position pos with data """
+        key = self.get_key(obj)
+        self.get_buffer(obj).replace_from(pos, data, key)
+        self._publish(key)
+
+    @staticmethod
+    def _publish(key):
+        """ Publish a change event of the Inf of the log """
+        if key:
+            ChangeEvents.publish(key[0])
+
+    def size(self, obj):
+        """ Get the length of the log of the object """
+        return len(self.get_buffer(obj))
+
+    def get_parts(self, obj, lazy=False):
+        """ Get the list of parts of the log of the object (see :py:meth:`LogBuffer.get_parts`) """
+        return self.get_buffer(obj).get_parts(self.get_key(obj), lazy)
+
+    def get_data(self, obj, compress=True):
+        """
+        Get the data of the log of the object to serialize it: only the part in memory
+        in the compressed format (stored in the DB) or the whole log otherwise.
+        """
+        if compress:
+            return self.get_buffer(obj).serialize()
+        return self.__get__(obj)
@@ -0,0 +1,201 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import random
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+from IM.config import Config
+# IM.VirtualMachine is not imported here to avoid circular imports
+import IM
+
+
+class VMStatusPoller:
+    """
+    Background service that refreshes the state of the VMs of the Infs accessed recently, so the
+    API calls can use the cached state instead of waiting for the cloud providers.
+
+    The IM does not store the credentials of the cloud providers, so the VMs of an Inf are polled
+    using the credentials of the last request that accessed it, during VM_POLLER_IDLE_TIME secs.
+    """
+
+    logger = logging.getLogger('InfrastructureManager')
+    """Logger object."""
+
+    JITTER = 0.2
+    """Max random variation of the polling intervals (as a fraction of the interval)."""
+
+    TICK = 1
+    """Time (in secs) between the checks of the VMs that must be updated."""
+
+    _cond = threading.Condition(threading.Lock())
+    """Condition to protect the data of the poller and wake up the scheduler thread."""
+
+    _watched = {}
+    """Map from Inf ID to a list [inf, auth, last access time] of the Infs being polled."""
+
+    _next_update = {}
+    """Map from tuple (Inf ID, VM ID) to the time of the next update of the VM."""
+
+    _in_progress = set()
+    """Set of tuples (Inf ID, VM ID) of the VMs being updated."""
+
+    _cloud_updates = {}
+    """Map from cloud endpoint to the number of updates in progress."""
+
+    _pool = None
+    """Pool of threads that perform the updates."""
+
+    _thread = None
+    """Scheduler thread."""
+
+    _stopped = False
+    """Flag to stop the scheduler thread."""
+
+    @staticmethod
+    def start():
+        """ Launch the scheduler thread of the poller """
+        with VMStatusPoller._cond:
+            if VMStatusPoller.is_active():
+                return VMStatusPoller._thread
+            VMStatusPoller._stopped = False
+            VMStatusPoller._pool = ThreadPool(processes=Config.VM_POLLER_THREADS)
+            VMStatusPoller._thread = threading.Thread(name="VMStatusPoller", target=VMStatusPoller._loop)
+            VMStatusPoller._thread.daemon = True
+            VMStatusPoller._thread.start()
+        return VMStatusPoller._thread
+
+    @staticmethod
+    def stop():
+        """ Stop the poller and forget the Infs being polled """
+        with VMStatusPoller._cond:
+            VMStatusPoller._stopped = True
+            VMStatusPoller._watched = {}
+            VMStatusPoller._next_update = {}
+            VMStatusPoller._cond.notify_all()
+            thread = VMStatusPoller._thread
+            VMStatusPoller._thread = None
+        if thread:
+            thread.join()
+        if VMStatusPoller._pool:
+            VMStatusPoller._pool.close()
+            VMStatusPoller._pool = None
+
+    @staticmethod
+    def is_active():
+        """ Check if the poller is running """
+        return VMStatusPoller._thread is not None and not VMStatusPoller._stopped
+
+    @staticmethod
+    def watch(inf, auth):
+        """
+        Poll the VMs of an Inf in background using the specified credentials, that are replaced
+        in each call. It must be called in each access to the Inf.
+
+        Returns: True if the VMs of the Inf were already being polled, so their cached state can be used.
+        """
+        if inf is None or not inf.id or not VMStatusPoller.is_active():
+            return False
+        with VMStatusPoller._cond:
+            polled = inf.id in VMStatusPoller._watched and VMStatusPoller._watched[inf.id][0] is inf
+            VMStatusPoller._watched[inf.id] = [inf, auth, time.time()]
+        return polled
+
+    @staticmethod
+    def _get_interval(vm):
+        interval = vm.get_status_poll_interval()
+        return interval * random.uniform(1 - VMStatusPoller.JITTER, 1 + VMStatusPoller.JITTER)
+
+    @staticmethod
+    def _get_cloud_key(vm):
+        return "%s://%s:%s" % (vm.cloud.type, vm.cloud.server, vm.cloud.port)
+
+    @staticmethod
+    def _loop():
+        while True:
+            with VMStatusPoller._cond:
+                if VMStatusPoller._stopped:
+                    break
+            try:
+                VMStatusPoller._schedule()
+            except Exception:
+                VMStatusPoller.logger.exception("Error scheduling the updates of the VMs.")
+            with VMStatusPoller._cond:
+                if not VMStatusPoller._stopped:
+                    VMStatusPoller._cond.wait(VMStatusPoller.TICK)
+
+    @staticmethod
+    def _forget(inf_id):
+        del VMStatusPoller._watched[inf_id]
+        for key in [key for key in VMStatusPoller._next_update if key[0] == inf_id]:
+            del VMStatusPoller._next_update[key]
+
+    @staticmethod
+    def _schedule():
+        """ Launch the updates of the VMs whose time has come, within the limits of each cloud endpoint """
+        now = time.time()
+        updates = []
+        with VMStatusPoller._cond:
+            for inf_id, (inf, auth, last_access) in list(VMStatusPoller._watched.items()):
+                if inf.deleted or now - last_access > Config.VM_POLLER_IDLE_TIME:
+                    VMStatusPoller._forget(inf_id)
+                    continue
+                due = []
+                for vm in inf.get_vm_list():
+                    key = (inf_id, vm.im_id)
+                    if key in VMStatusPoller._in_progress:
+                        continue
+                    if key not in VMStatusPoller._next_update:
+                        VMStatusPoller._next_update[key] = vm.last_update + VMStatusPoller._get_interval(vm)
+                    if now >= VMStatusPoller._next_update[key]:
+                        due.append(vm)
+                # Each group of VMs is updated with a single request to the cloud provider
+                for vms in IM.VirtualMachine.VirtualMachine.group_by_cloud(due):
+                    cloud = VMStatusPoller._get_cloud_key(vms[0])
+                    if VMStatusPoller._cloud_updates.get(cloud, 0) >= Config.VM_POLLER_MAX_CLOUD_UPDATES:
+                        continue
+                    VMStatusPoller._cloud_updates[cloud] = VMStatusPoller._cloud_updates.get(cloud, 0) + 1
+                    for vm in vms:
+                        VMStatusPoller._in_progress.add((inf_id, vm.im_id))
+                    updates.append((inf_id, cloud, vms, auth))
+            pool = VMStatusPoller._pool
+        for update in updates:
+            pool.apply_async(VMStatusPoller._update_vms, update)
+
+    @staticmethod
+    def _update_vms(inf_id, cloud, vms, auth):
+        try:
+            IM.VirtualMachine.VirtualMachine.update_status_batch(vms, auth, force=True)
+        except Exception:
+            VMStatusPoller.logger.exception("Error updating the state of the VMs of Inf ID %s." % inf_id)
+        finally:
+            with VMStatusPoller._cond:
+                VMStatusPoller._cloud_updates[cloud] -= 1
+                if not VMStatusPoller._cloud_updates[cloud]:
+                    del VMStatusPoller._cloud_updates[cloud]
+                for vm in vms:
+                    key = (inf_id, vm.im_id)
+                    VMStatusPoller._in_progress.discard(key)
+                    if inf_id in VMStatusPoller._watched:
+                        VMStatusPoller._next_update[key] = time.time() + VMStatusPoller._get_interval(vm)
+
+    @staticmethod
+    def get_stats():
+        """ Get the number of Infs polled and the number of updates in progress per cloud endpoint """
+        with VMStatusPoller._cond:
+            return {"infrastructures": len(VMStatusPoller._watched), "updates": dict(VMStatusPoller._cloud_updates)}
@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from IM.db import DataBase
+from IM.db import DataBase, DataBasePool
 
 from IM.config import Config
 from radl.radl import FeaturesApp
@@ -46,11 +46,9 @@ class Recipe:
             return False
         else:
             try:
-                db = DataBase(Config.RECIPES_DB_FILE)
-                db.connect()
-
-                res = db.execute('''insert into recipes values ("%s", "%s", "%s", "%s", %d, "%s", "%s", "%s")''' % (
-                    name, version, module, recipe, isapp, galaxy_module, desc, requirements))
+                with DataBasePool.get_pool(Config.RECIPES_DB_FILE).connection() as db:
+                    res = db.execute('''insert into recipes values ("%s", "%s", "%s", "%s", %d, "%s", "%s", "%s")''' % (
+                        name, version, module, recipe, isapp, galaxy_module, desc, requirements))
                 return res
             except Exception:
                 return False
@@ -62,11 +60,10 @@ class Recipe:
             return []
         else:
             try:
-                db = DataBase(Config.RECIPES_DB_FILE)
-                db.connect()
+                with DataBasePool.get_pool(Config.RECIPES_DB_FILE).connection() as db:
+                    result = db.select('select * from recipes')
 
                 res = []
-                result = db.select('select * from recipes')
                 for d in result:
                     name = d[0]
                     version = d[1]
@@ -95,11 +92,10 @@ class Recipe:
             return []
         else:
             try:
-                db = DataBase(Config.RECIPES_DB_FILE)
-                db.connect()
+                with DataBasePool.get_pool(Config.RECIPES_DB_FILE).connection() as db:
+                    result = db.select('select * from recipes where isapp = 1')
 
                 res = []
-                result = db.select('select * from recipes where isapp = 1')
                 for d in result:
                     name = d[0]
                     version = d[1]
@@ -17,11 +17,12 @@
 import sys
 import threading
 import time
+import itertools
 
 try:
-    from Queue import Queue, Empty
+    from Queue import PriorityQueue, Empty
 except ImportError:
-    from queue import Queue, Empty
+    from queue import PriorityQueue, Empty
 try:
     from SimpleXMLRPCServer import SimpleXMLRPCServer
 except ImportError:
@@ -36,13 +37,46 @@ from IM.config import Config
 from IM.xmlrpcssl import SSLSimpleXMLRPCServer
 
 
-class RequestQueue(Queue):
+class RequestQueue(PriorityQueue):
     """
     Modela una cola del sistema que procesa las peticiones encoladas de acuerdo a unas prioridades.
     Se elige la prioridad con indice menor, siguiendo la prioridad convencional de las PriorityQueue
-    estandar.
+    estandar. Las peticiones con la misma prioridad se procesan en orden de llegada.
     """
 
+    def _init(self, maxsize):
+        PriorityQueue._init(self, maxsize)
+        # Contador para mantener el orden de llegada de las peticiones con la misma prioridad
+        self._counter = itertools.count()
+        self.processed = 0
+        """Numero de peticiones que se han sacado de la cola."""
+        self.total_wait = 0.0
+        """Tiempo total (en segundos) que han esperado en la cola las peticiones."""
+        self.max_wait = 0.0
+        """Tiempo maximo (en segundos) que ha esperado en la cola una peticion."""
+
+    def _put(self, item):
+        priority, request = item
+        PriorityQueue._put(self, (priority, next(self._counter), time.time(), request))
+
+    def _get(self):
+        # Se llama con el mutex de la cola adquirido, asi que se pueden actualizar las metricas
+        priority, _, queued, request = PriorityQueue._get(self)
+        wait = time.time() - queued
+        self.processed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return priority, request
+
+    def get_stats(self):
+        """
+        Obtiene las metricas de la cola: numero de peticiones pendientes y tiempos de espera
+        """
+        with self.mutex:
+            return {"queued": self._qsize(), "processed": self.processed,
+                    "avg_wait": self.total_wait / self.processed if self.processed else 0.0,
+                    "max_wait": self.max_wait}
+
     def process_requests(self, max_requests, wait_time_for_element=0):
         """
         Procesa solicitudes de la cola, utilizando el metodo "process" de la clase
@@ -133,6 +167,103 @@ def get_system_queue():
     return SYSTEM_REQUESTS_QUEUE
 
 
+class WorkerPool:
+    """
+    Conjunto de threads de tamaño fijo que procesan, en orden de prioridad, las peticiones
+    asincronas de un carril (por ejemplo las de solo lectura o las que modifican el sistema).
+    Si el numero de threads es 0 se lanza un thread por peticion.
+    """
+
+    def __init__(self, name, num_workers):
+        self.name = name
+        """Nombre del carril."""
+        self.num_workers = num_workers
+        """Numero de threads que procesan las peticiones."""
+        self.queue = RequestQueue()
+        """Cola de peticiones pendientes de ser procesadas."""
+        self._threads = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def put(self, priority, request):
+        """
+        Encola una peticion para que la procese alguno de los threads del pool
+        """
+        if self.num_workers <= 0:
+            thread = threading.Thread(target=WorkerPool._process, args=[request])
+            thread.daemon = True
+            thread.start()
+            return
+        with self._lock:
+            # Los threads se lanzan segun se van necesitando
+            if len(self._threads) < self.num_workers and self.queue.qsize() >= len(self._threads) - self._busy:
+                thread = threading.Thread(name="%s-%d" % (self.name, len(self._threads)), target=self._work)
+                thread.daemon = True
+                self._threads.append(thread)
+                thread.start()
+        self.queue.put((priority, request))
+
+    def _work(self):
+        while True:
+            _, request = self.queue.get()
+            with self._lock:
+                self._busy += 1
+            try:
+                WorkerPool._process(request)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    @staticmethod
+    def _process(request):
+        try:
+            Request.process(request)
+        except Exception:
+            # Evitamos que se queden esperando por una peticion que ha fallado
+            request.set_status(Request.STATUS_ERROR)
+            request.wake_up()
+
+    def get_stats(self):
+        """
+        Obtiene las metricas del carril: peticiones en cola, tiempos de espera y threads ocupados
+        """
+        stats = self.queue.get_stats()
+        with self._lock:
+            stats.update({"workers": len(self._threads), "busy": self._busy})
+        return stats
+
+
+WORKER_POOLS = {}
+"""Pools de threads de cada carril."""
+WORKER_POOLS_LOCK = threading.Lock()
+
+
+def get_worker_pool(lane):
+    """
+    Obtiene el pool de threads de un carril, creandolo si es necesario con el numero de threads
+    indicado en la configuracion.
+    """
+    with WORKER_POOLS_LOCK:
+        if lane not in WORKER_POOLS:
+            if lane == Request.LANE_READ:
+                num_workers = Config.READ_REQUEST_WORKERS
+            else:
+                num_workers = Config.WRITE_REQUEST_WORKERS
+            WORKER_POOLS[lane] = WorkerPool(lane, num_workers)
+        return WORKER_POOLS[lane]
+
+
+def get_lanes_stats():
+    """
+    Obtiene las metricas de la cola general del sistema y de los carriles de peticiones asincronas.
+    """
+    with WORKER_POOLS_LOCK:
+        pools = dict(WORKER_POOLS)
+    res = dict((lane, pool.get_stats()) for lane, pool in pools.items())
+    res["system"] = get_system_queue().get_stats()
+    return res
+
+
 class Request(object):
     """
     Clase generica para modelar las peticiones que se van a hacer al sistema. Al crear la peticion, esta se
@@ -152,6 +283,12 @@ class Request(object):
     PRIORITY_NORMAL = 1  # Prioridad normal
     PRIORITY_LOW = 2  # Prioridad baja
 
+    LANE_READ = "read"  # Carril de las peticiones de solo lectura
+    LANE_WRITE = "write"  # Carril de las peticiones que modifican el sistema
+
+    LANE = LANE_WRITE
+    """Carril en el que se procesan las peticiones asincronas de esta clase."""
+
     def __init__(self, arguments=(), priority=PRIORITY_NORMAL):
         """
         La prioridad debe utilizarse principalmente para temas de interaccion con el usuario. Por ejemplo
@@ -162,6 +299,7 @@ class Request(object):
         self.__value = None
         self.__status = Request.STATUS_PENDING
         self.__arguments = arguments
+        self.__priority = priority
 
         # Este semaforo es para acceder a los atributos y que sea "threadsafe"
         self.__semaphore = threading.Lock()
@@ -169,6 +307,13 @@ class Request(object):
         # Se encola en la cola general del sistema
         get_system_queue().put((priority, self))
 
+    @property
+    def priority(self):
+        """
+        Devuelve la prioridad de la peticion
+        """
+        return self.__priority
+
     @property
     def arguments(self):
         """
@@ -250,19 +395,17 @@ class Request(object):
 class AsyncRequest(Request):
     """
     Esta clase, que desciende de Request, es un tipo especial de peticiones que hace que se ejecuten
-    de forma asincrona, en un thread independiente
+    de forma asincrona, en el pool de threads del carril indicado en LANE
     """
 
     def __init__(self, arguments=(), priority=Request.PRIORITY_NORMAL):
         Request.__init__(self, arguments, priority)
-        self.__thread = None
 
     def process(self):
         """
-        En este caso lo que se hace es lanzar el thread
+        En este caso lo que se hace es encolar la peticion en el pool de threads de su carril
         """
-        self.__thread = threading.Thread(target=Request.process, args=[self])
-        self.__thread.start()
+        get_worker_pool(self.LANE).put(self.priority, self)
 
 
 class AsyncXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
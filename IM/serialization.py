@@ -0,0 +1,175 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import zlib
+import threading
+
+from radl.radl import RADL
+from radl.radl_parse import parse_radl
+
+
+class DataSerializer:
+    """
+    Versioned serialization of the IM objects stored in the DB.
+    Version 1 is plain JSON text. Version 2 is zlib compressed JSON prefixed with HEADER.
+    """
+
+    HEADER = b"IMv2:"
+    """Prefix of the data serialized with the version 2 format."""
+
+    @staticmethod
+    def is_compressed(data):
+        """ Checks if the data has been serialized with the version 2 format """
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        return isinstance(data, bytes) and data.startswith(DataSerializer.HEADER)
+
+    @staticmethod
+    def dumps(dic):
+        """ Serialize a dict with the version 2 format """
+        data = json.dumps(dic, separators=(',', ':'), sort_keys=True)
+        return DataSerializer.HEADER + zlib.compress(data.encode('utf-8'))
+
+    @staticmethod
+    def loads(data):
+        """ Deserialize a dict serialized with any of the supported formats """
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        if DataSerializer.is_compressed(data):
+            data = zlib.decompress(data[len(DataSerializer.HEADER):])
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class RadlFragments:
+    """
+    Table of RADL fragments (networks, systems, configures, ...) shared by the RADL documents
+    serialized in the same data, so that each fragment is stored only once.
+    """
+
+    def __init__(self, fragments=None):
+        self.fragments = fragments or []
+        """List of str with the RADL fragments."""
+        self._index = dict((elem, num) for num, elem in enumerate(self.fragments))
+
+    @staticmethod
+    def split(radl):
+        """ Split a RADL in the same fragments used by RADL.__str__ (a list of fragments is returned as is) """
+        if isinstance(radl, list):
+            return radl
+        if not isinstance(radl, RADL):
+            return [str(radl)]
+        res = []
+        if radl.description:
+            res.append(str(radl.description))
+        res.extend([str(f) for fs in [radl.ansible_hosts, radl.networks, radl.systems, radl.configures,
+                                      [radl.contextualize], radl.deploys] for f in fs])
+        return res
+
+    def add(self, radl):
+        """
+        Add the fragments of a RADL to the table.
+
+        Returns: a list of int with the positions of the fragments in the table.
+        """
+        refs = []
+        for fragment in self.split(radl):
+            if fragment not in self._index:
+                self._index[fragment] = len(self.fragments)
+                self.fragments.append(fragment)
+            refs.append(self._index[fragment])
+        return refs
+
+    def get(self, refs):
+        """ Get the list of fragments from a list of references or from the RADL text (version 1 format) """
+        if isinstance(refs, list):
+            return [self.fragments[num] for num in refs]
+        return [refs]
+
+    @staticmethod
+    def to_str(radl):
+        """ Get the RADL text from a RADL or a list of fragments """
+        if isinstance(radl, list):
+            return "\n".join(radl)
+        return str(radl)
+
+    @staticmethod
+    def parse(fragments):
+        """ Parse a RADL from a list of fragments """
+        return parse_radl(RadlFragments.to_str(fragments))
+
+
+class LazyValue:
+    """
+    Serialized data of an attribute that has not been deserialized yet.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        """Serialized data of the attribute."""
+        self.value = None
+        """Deserialized value, once it is loaded."""
+        self.loaded = False
+        """Flag to specify if the value has been loaded."""
+        self.lock = threading.Lock()
+        """Threading Lock to load the value only once."""
+
+
+class LazyAttribute(object):
+    """
+    Descriptor of an attribute that may contain a :py:class:`LazyValue`, that
+    is deserialized using the loader function the first time it is accessed.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        """Name of the attribute."""
+        self.loader = loader
+        """Function to get the value from the serialized data."""
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.name)
+        if isinstance(value, LazyValue):
+            with value.lock:
+                if not value.loaded:
+                    value.value = self.loader(value.data)
+                    value.loaded = True
+            obj.__dict__[self.name] = value.value
+            return value.value
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+    @staticmethod
+    def get_data(value, serializer=str):
+        """
+        Get the serialized data of the value of an attribute obtained from the __dict__ of the object.
+        If it has not been loaded the original data is returned, so it does not have to be deserialized.
+        If serializer is None the loaded value is returned as is.
+        """
+        if isinstance(value, LazyValue):
+            with value.lock:
+                if not value.loaded:
+                    return value.data
+            value = value.value
+        if serializer is None:
+            return value
+        return serializer(value)
@@ -30,6 +30,7 @@ from IM.request import Request, AsyncXMLRPCServer, get_system_queue
 from IM.config import Config
 from IM.InfrastructureManager import InfrastructureManager
 from IM.InfrastructureList import InfrastructureList
+from IM.poller import VMStatusPoller
 from IM.ServiceRequests import IMBaseRequest
 from IM import __version__ as version
 
@@ -59,6 +60,32 @@ def WaitRequest(request):
     success = (request.status() == Request.STATUS_PROCESSED)
     return (success, request.get())
 
+
+def ConditionalRequest(function, arguments, etag, inf_id, auth_data, update_vms=None):
+    """
+    Create the request of a function that supports conditional reads and wait for it.
+    If an etag is specified the result is a struct with the data and its etag, and the entity
+    tag of the current content of the Inf is compared with it before creating the request,
+    so the data is only got and sent if it has been modified.
+    """
+    if etag is None:
+        return WaitRequest(IMBaseRequest.create_request(function, arguments))
+
+    variant = "%s%s" % (function, [arg for arg in arguments if arg is not auth_data])
+    request = IMBaseRequest.create_request(IMBaseRequest.GET_INFRASTRUCTURE_ETAG,
+                                           (inf_id, auth_data, update_vms, variant))
+    success, new_etag = WaitRequest(request)
+    if not success:
+        # The request of the function will return the error
+        new_etag = ""
+    elif new_etag == etag:
+        return (True, {"etag": new_etag, "modified": False, "data": ""})
+
+    success, res = WaitRequest(IMBaseRequest.create_request(function, arguments))
+    if success:
+        res = {"etag": new_etag, "modified": True, "data": res}
+    return (success, res)
+
 # API functions.
 # They create the specified request and wait for it.
 
@@ -75,10 +102,14 @@ def RemoveResource(inf_id, vm_list, auth_data, context=True):
     return WaitRequest(request)
 
 
-def GetVMInfo(inf_id, vm_id, auth_data):
-    request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_VM_INFO, (inf_id, vm_id, auth_data))
-    return WaitRequest(request)
+def GetVMInfo(inf_id, vm_id, auth_data, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_VM_INFO, (inf_id, vm_id, auth_data),
+                              etag, inf_id, auth_data, [str(vm_id)])
+
+
+def GetVMsInfo(inf_id, vm_list, auth_data, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_VMS_INFO, (inf_id, vm_list, auth_data),
+                              etag, inf_id, auth_data, vm_list or True)
 
 
 def GetVMProperty(inf_id, vm_id, property_name, auth_data):
@@ -125,9 +156,9 @@ def CreateInfrastructure(radl_data, auth_data, async_call=False):
     return WaitRequest(request)
 
 
-def GetInfrastructureList(auth_data, flt=None):
+def GetInfrastructureList(auth_data, flt=None, limit=None, after=None, include=None):
     request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_INFRASTRUCTURE_LIST, (auth_data, flt))
+        IMBaseRequest.GET_INFRASTRUCTURE_LIST, (auth_data, flt, limit, after, include))
     return WaitRequest(request)
 
 
@@ -149,22 +180,19 @@ def ExportInfrastructure(inf_id, delete, auth_data):
     return WaitRequest(request)
 
 
-def GetInfrastructureRADL(inf_id, auth_data):
-    request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_INFRASTRUCTURE_RADL, (inf_id, auth_data))
-    return WaitRequest(request)
+def GetInfrastructureRADL(inf_id, auth_data, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_INFRASTRUCTURE_RADL, (inf_id, auth_data),
+                              etag, inf_id, auth_data)
 
 
-def GetVMContMsg(inf_id, vm_id, auth_data):
-    request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_VM_CONT_MSG, (inf_id, vm_id, auth_data))
-    return WaitRequest(request)
+def GetVMContMsg(inf_id, vm_id, auth_data, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_VM_CONT_MSG, (inf_id, vm_id, auth_data),
+                              etag, inf_id, auth_data)
 
 
-def GetInfrastructureContMsg(inf_id, auth_data, headeronly=False):
-    request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_INFRASTRUCTURE_CONT_MSG, (inf_id, auth_data, headeronly))
-    return WaitRequest(request)
+def GetInfrastructureContMsg(inf_id, auth_data, headeronly=False, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_INFRASTRUCTURE_CONT_MSG, (inf_id, auth_data, headeronly),
+                              etag, inf_id, auth_data)
 
 
 def StopVM(inf_id, vm_id, auth_data):
@@ -185,10 +213,9 @@ def RebootVM(inf_id, vm_id, auth_data):
     return WaitRequest(request)
 
 
-def GetInfrastructureState(inf_id, auth_data):
-    request = IMBaseRequest.create_request(
-        IMBaseRequest.GET_INFRASTRUCTURE_STATE, (inf_id, auth_data))
-    return WaitRequest(request)
+def GetInfrastructureState(inf_id, auth_data, etag=None):
+    return ConditionalRequest(IMBaseRequest.GET_INFRASTRUCTURE_STATE, (inf_id, auth_data),
+                              etag, inf_id, auth_data, True)
 
 
 def GetVersion():
@@ -210,6 +237,18 @@ def launch_daemon():
         print("Error connecting with the DB!!.")
         sys.exit(2)
 
+    if Config.RESUME_INFS_THREADS > 0:
+        InfrastructureList.resume_infrastructures(Config.RESUME_INFS_THREADS)
+
+    if Config.ARCHIVE_DELETED_INFS_AFTER > 0:
+        InfrastructureList.start_archive_job()
+
+    if Config.VM_POLLER_INTERVAL > 0:
+        VMStatusPoller.start()
+
+    if Config.STATS_LOG_INTERVAL > 0:
+        InfrastructureManager.start_stats_log_job()
+
     if Config.XMLRCP_SSL:
         # if specified launch the secure version
         import ssl
@@ -228,6 +267,7 @@ def launch_daemon():
     server.register_function(StopInfrastructure)
     server.register_function(GetInfrastructureInfo)
     server.register_function(GetVMInfo)
+    server.register_function(GetVMsInfo)
     server.register_function(GetVMProperty)
     server.register_function(AlterVM)
     server.register_function(RemoveResource)
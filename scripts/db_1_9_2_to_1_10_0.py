@@ -0,0 +1,81 @@
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+
+sys.path.append("..")
+sys.path.append(".")
+
+from IM.config import Config
+from IM.db import DataBase
+from IM.serialization import DataSerializer
+from IM.InfrastructureInfo import InfrastructureInfo
+from IM.InfrastructureList import InfrastructureList
+
+
+class DB192to1100():
+    """
+    Split the data blobs of the infrastructures stored in the inf_list table
+    into a header row plus one row per VM in the vm_list table (using the
+    compressed format) and set the owner column used to index the infrastructures.
+    """
+
+    @staticmethod
+    def migrate_data(db_url):
+        InfrastructureList.init_table(db_url)
+        with InfrastructureList.get_db_pool(db_url).connection() as db:
+            if not db:
+                sys.stderr.write("ERROR connecting with the database!.\n")
+                sys.exit(-1)
+
+            if db.db_type == DataBase.MONGO:
+                res = [(elem['id'], elem['data'], elem.get('owner'))
+                       for elem in db.find("inf_list", None, {"id": True, "data": True, "owner": True})]
+            else:
+                res = db.select("select id, data, owner from inf_list")
+
+            num = 0
+            for inf_id, data, owner in res:
+                try:
+                    if not DataSerializer.is_compressed(data) and isinstance(data, bytes):
+                        data = data.decode('utf-8')
+                    # Only the old blobs (plain JSON) include the list of VMs
+                    if not DataSerializer.is_compressed(data) and '"vm_list": ' in data:
+                        inf = InfrastructureInfo.deserialize(data)
+                        InfrastructureList._save_inf_to_db(db, inf)
+                        num += 1
+                    elif owner is None:
+                        inf = InfrastructureInfo.deserialize_auth(data)
+                        owner = InfrastructureList._get_owner(inf.auth)
+                        if owner:
+                            if db.db_type == DataBase.MONGO:
+                                db.connection["inf_list"].update_one({"id": inf_id}, {"$set": {"owner": owner}})
+                            else:
+                                db.execute("update inf_list set owner = %s where id = %s", (owner, inf_id))
+                            num += 1
+                except Exception as ex:
+                    sys.stderr.write("ERROR migrating Inf ID %s, ignoring it: %s.\n" % (inf_id, ex))
+            sys.stdout.write("%d infrastructures migrated.\n" % num)
+
+
+if __name__ == "__main__":
+    if not Config.DATA_DB:
+        sys.stderr.write("No DATA_DB defined in the im.cfg file!!")
+        sys.exit(-1)
+
+    sys.stdout.write("Migrating data of DB: %s.\n" % Config.DATA_DB)
+    DB192to1100.migrate_data(Config.DATA_DB)
+    sys.exit(0)
@@ -30,6 +30,9 @@ class DeleteInfs():
     def delete_data_from_db(db_url, date):
         db = DataBase(db_url)
         if db.connect():
+            if db.table_exists("vm_list"):
+                db.execute("DELETE FROM vm_list WHERE inf_id IN (SELECT id FROM inf_list WHERE deleted = 1 and"
+                           " date < '%s');" % date)
             db.execute("DELETE FROM inf_list WHERE deleted = 1 and date < '%s';" % date)
             db.close()
         else:
@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import time
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../.."))
+
+from IM.InfrastructureInfo import InfrastructureInfo
+from IM.VirtualMachine import VirtualMachine
+from IM.CloudInfo import CloudInfo
+from IM.auth import Authentication
+from radl.radl_parse import parse_radl
+
+TESTS_PATH = os.path.dirname(os.path.realpath(__file__))
+RADL_FILE = TESTS_PATH + '/load-test.radl'
+NUM_VMS = 500
+NUM_LOADS = 5
+
+
+class LoadTestDeserialize(unittest.TestCase):
+    """
+    Measure the time needed to load an Inf with NUM_VMS VMs from its DB rows.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        radl = parse_radl(open(RADL_FILE, 'r').read())
+        inf = InfrastructureInfo()
+        inf.auth = Authentication([{'type': 'InfrastructureManager', 'username': 'user', 'password': 'pass'}])
+        inf.radl = radl
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        for num in range(NUM_VMS):
+            vm = VirtualMachine(inf, str(num), cloud, radl.clone(), radl.clone(), None, num)
+            vm.info.systems[0].setValue("net_interface.0.ip", "10.0.%d.%d" % (num // 256, num % 256))
+            vm.state = VirtualMachine.RUNNING
+            inf.vm_list.append(vm)
+        cls.header, vms = inf.serialize_rows()
+        cls.vm_rows = [data for _, data in vms]
+
+    def load(self, access_radls):
+        start = time.time()
+        for _ in range(NUM_LOADS):
+            inf = InfrastructureInfo.deserialize(self.header, self.vm_rows)
+            # What GetInfrastructureState needs
+            states = [vm.state for vm in inf.get_vm_list()]
+            if access_radls:
+                # Force the parsing of all the RADLs, as an eager load does
+                inf.radl.systems
+                for vm in inf.vm_list:
+                    vm.info.systems
+                    vm.requested_radl.systems
+        self.assertEqual(len(states), NUM_VMS)
+        return (time.time() - start) / NUM_LOADS
+
+    def test_load_time(self):
+        eager = self.load(True)
+        lazy = self.load(False)
+        print("Load of an Inf with %d VMs: eager %.3f s, lazy %.3f s (%.1fx faster)." %
+              (NUM_VMS, eager, lazy, eager / lazy))
+        self.assertLess(lazy, eager)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,7 @@
 import os
 import json
 import unittest
+import bottle
 import sys
 from io import BytesIO
 from mock import patch, MagicMock
@@ -37,6 +38,7 @@ from IM.InfrastructureManager import (DeletedInfrastructureException,
                                       UnauthorizedUserException,
                                       InvaliddUserException)
 from IM.InfrastructureInfo import IncorrectVMException, DeletedVMException, IncorrectStateException
+from IM.admission import BusyException
 from IM.REST import (RESTDestroyInfrastructure,
                      RESTGetInfrastructureInfo,
                      RESTGetInfrastructureProperty,
@@ -99,6 +101,18 @@ class TestREST(unittest.TestCase):
         self.assertEqual(res, {"message": "Error Getting Inf. List: Access to this infrastructure not granted.",
                                "code": 400})
 
+        GetInfrastructureList.side_effect = None
+        GetInfrastructureList.return_value = [{"id": "1", "state": "running", "vm_count": 2}]
+        bottle_request.params = {"limit": "1", "after": "2", "include": "state,vm_count"}
+        res = RESTGetInfrastructureList()
+        self.assertEqual(json.loads(res), {"uri-list": [{"uri": "http://imserver.com/infrastructures/1",
+                                                         "state": "running", "vm_count": 2}]})
+        self.assertEqual(GetInfrastructureList.call_args[0][1:], (None, 1, "2", "state,vm_count"))
+
+        bottle_request.params = {"limit": "-1"}
+        res = RESTGetInfrastructureList()
+        self.assertEqual(json.loads(res), {"message": "Incorrect value in limit parameter", "code": 400})
+
     @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureList")
     @patch("bottle.request")
     def test_GetInfrastructureListSingleSite(self, bottle_request, GetInfrastructureList):
@@ -139,10 +153,12 @@ class TestREST(unittest.TestCase):
         res_json = json.loads(res)
         self.assertEqual(res_json['code'], 401)
 
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureETag")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureInfo")
     @patch("bottle.request")
-    def test_GetInfrastructureInfo(self, bottle_request, GetInfrastructureInfo):
+    def test_GetInfrastructureInfo(self, bottle_request, GetInfrastructureInfo, GetInfrastructureETag):
         """Test REST GetInfrastructureInfo."""
+        GetInfrastructureETag.return_value = '"tag1"'
         bottle_request.environ = {'HTTP_HOST': 'imserver.com'}
         bottle_request.return_value = MagicMock()
         bottle_request.headers = {"AUTHORIZATION": ("type = InfrastructureManager; username = user; password = pass\n"
@@ -165,14 +181,18 @@ class TestREST(unittest.TestCase):
         res = RESTGetInfrastructureInfo("1")
         self.assertEqual(res, "Error Getting Inf. info: Access to this infrastructure not granted.")
 
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureETag")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureContMsg")
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetVMsInfo")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureRADL")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureState")
     @patch("IM.InfrastructureManager.InfrastructureManager.get_infrastructure")
     @patch("bottle.request")
     def test_GetInfrastructureProperty(self, bottle_request, get_infrastructure, GetInfrastructureState,
-                                       GetInfrastructureRADL, GetInfrastructureContMsg):
+                                       GetInfrastructureRADL, GetVMsInfo, GetInfrastructureContMsg,
+                                       GetInfrastructureETag):
         """Test REST GetInfrastructureProperty."""
+        GetInfrastructureETag.return_value = '"tag1"'
         bottle_request.return_value = MagicMock()
         bottle_request.headers = {"AUTHORIZATION": ("type = InfrastructureManager; username = user; password = pass\n"
                                                     "id = one; type = OpenNebula; host = onedock.i3m.upv.es:2633; "
@@ -192,8 +212,49 @@ class TestREST(unittest.TestCase):
         res = RESTGetInfrastructureProperty("1", "state")
         self.assertEqual(json.loads(res)["state"]["state"], "running")
 
+        GetVMsInfo.return_value = {"0": parse_radl("system s0 ( memory.size = 512m )")}
+        bottle_request.params = {'vm_list': '0'}
+        res = RESTGetInfrastructureProperty("1", "vms")
+        self.assertEqual(json.loads(res)["vms"]["0"][0]["memory.size"], 512000000)
+        self.assertEqual(GetVMsInfo.call_args_list[0][0][1], "0")
+
+        bottle_request.params = {'wait': '3', 'timeout': '5'}
+        res = RESTGetInfrastructureProperty("1", "state")
+        self.assertEqual(json.loads(res)["state"]["state"], "running")
+        self.assertEqual(GetInfrastructureState.call_args_list[1][0][2:], (3, 5))
+
+        bottle_request.params = {'wait': 'a'}
+        res = RESTGetInfrastructureProperty("1", "state")
+        self.assertEqual(res, "Incorrect value in wait or timeout parameters")
+        bottle_request.params = {}
+
         res = RESTGetInfrastructureProperty("1", "contmsg")
         self.assertEqual(res, "contmsg")
+        self.assertEqual(bottle.response.get_header('ETag'), '"tag1"')
+        # The VMs are only updated to get the tag of the conditional requests
+        self.assertEqual(GetInfrastructureETag.call_args_list[-1][0][2], None)
+
+        # The infrastructure has not changed: the contmsg is not got
+        headers = bottle_request.headers
+        bottle_request.headers = dict(headers)
+        bottle_request.headers["If-None-Match"] = '"tag1"'
+        num_calls = GetInfrastructureContMsg.call_count
+        res = RESTGetInfrastructureProperty("1", "contmsg")
+        self.assertEqual(res, "")
+        self.assertEqual(bottle.response.status_code, 304)
+        self.assertEqual(GetInfrastructureContMsg.call_count, num_calls)
+
+        res = RESTGetInfrastructureProperty("1", "state")
+        self.assertEqual(res, "")
+        self.assertEqual(GetInfrastructureETag.call_args_list[-1][0][2], True)
+
+        GetInfrastructureETag.return_value = '"tag2"'
+        res = RESTGetInfrastructureProperty("1", "contmsg")
+        self.assertEqual(res, "contmsg")
+        self.assertEqual(bottle.response.get_header('ETag'), '"tag2"')
+        GetInfrastructureETag.return_value = '"tag1"'
+        bottle_request.headers = headers
+        bottle.response.status = 200
 
         bottle_request.params = {'headeronly': 'yes'}
         res = RESTGetInfrastructureProperty("1", "contmsg")
@@ -266,6 +327,10 @@ class TestREST(unittest.TestCase):
         res = RESTDestroyInfrastructure("1")
         self.assertEqual(res, "Error Destroying Inf: Invalid State to perform this operation.")
 
+        DestroyInfrastructure.side_effect = BusyException()
+        res = RESTDestroyInfrastructure("1")
+        self.assertEqual(res, "Error Destroying Inf: Too many operations in progress. Try again later.")
+
     @patch("IM.InfrastructureManager.InfrastructureManager.CreateInfrastructure")
     @patch("IM.InfrastructureManager.InfrastructureManager.get_infrastructure")
     @patch("bottle.request")
@@ -337,10 +402,12 @@ class TestREST(unittest.TestCase):
         res_json = json.loads(res)
         self.assertEqual(res_json['code'], 415)
 
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureETag")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetVMInfo")
     @patch("bottle.request")
-    def test_GetVMInfo(self, bottle_request, GetVMInfo):
+    def test_GetVMInfo(self, bottle_request, GetVMInfo, GetInfrastructureETag):
         """Test REST GetVMInfo."""
+        GetInfrastructureETag.return_value = '"tag1"'
         bottle_request.return_value = MagicMock()
         bottle_request.headers = {"AUTHORIZATION": ("type = InfrastructureManager; username = user; password = pass\n"
                                                     "id = one; type = OpenNebula; host = onedock.i3m.upv.es:2633; "
@@ -356,6 +423,16 @@ class TestREST(unittest.TestCase):
         res = RESTGetVMInfo("1", "1")
         self.assertEqual(res, 'system test (\ncpu.count = 1\n)\n\n')
 
+        bottle_request.headers["If-None-Match"] = 'W/"tag1"'
+        res = RESTGetVMInfo("1", "1")
+        self.assertEqual(res, "")
+        self.assertEqual(bottle.response.status_code, 304)
+        self.assertEqual(GetVMInfo.call_count, 2)
+        # The VM is updated before getting the tag
+        self.assertEqual(GetInfrastructureETag.call_args_list[-1][0][2], ["1"])
+        del bottle_request.headers["If-None-Match"]
+        bottle.response.status = 200
+
         GetVMInfo.side_effect = DeletedInfrastructureException()
         res = RESTGetVMInfo("1", "1")
         self.assertEqual(res, "Error Getting VM. info: Deleted infrastructure.")
@@ -376,11 +453,13 @@ class TestREST(unittest.TestCase):
         res = RESTGetVMInfo("1", "1")
         self.assertEqual(res, "Error Getting VM. info: Invalid VM ID")
 
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureETag")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetVMProperty")
     @patch("IM.InfrastructureManager.InfrastructureManager.GetVMContMsg")
     @patch("bottle.request")
-    def test_GetVMProperty(self, bottle_request, GetVMContMsg, GetVMProperty):
+    def test_GetVMProperty(self, bottle_request, GetVMContMsg, GetVMProperty, GetInfrastructureETag):
         """Test REST GetVMProperty."""
+        GetInfrastructureETag.return_value = '"tag1"'
         bottle_request.return_value = MagicMock()
         bottle_request.headers = {"AUTHORIZATION": ("type = InfrastructureManager; username = user; password = pass\n"
                                                     "id = one; type = OpenNebula; host = onedock.i3m.upv.es:2633; "
@@ -415,6 +494,42 @@ class TestREST(unittest.TestCase):
         res = RESTGetVMProperty("1", "1", "prop")
         self.assertEqual(res, "Error Getting VM. property: Invalid VM ID")
 
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetVMContMsgFragment")
+    @patch("IM.InfrastructureManager.InfrastructureManager.GetInfrastructureContMsgFragment")
+    @patch("bottle.request")
+    def test_GetContMsgFragment(self, bottle_request, GetInfrastructureContMsgFragment, GetVMContMsgFragment):
+        """Test REST GetInfrastructureProperty and GetVMProperty of a fragment of the contmsg."""
+        bottle_request.return_value = MagicMock()
+        bottle_request.headers = {"AUTHORIZATION": ("type = InfrastructureManager; username = user; password = pass\n"
+                                                    "id = one; type = OpenNebula; host = onedock.i3m.upv.es:2633; "
+                                                    "username = user; password = pass")}
+        GetInfrastructureContMsgFragment.return_value = (["msg1\n", "msg2\n"], "20,0:5")
+        GetVMContMsgFragment.return_value = (["vmmsg\n"], 6)
+
+        bottle_request.params = {'offset': '10,0:2'}
+        res = RESTGetInfrastructureProperty("1", "contmsg")
+        self.assertEqual("".join(res), "msg1\nmsg2\n")
+        self.assertEqual(bottle.response.get_header('X-Next-Offset'), "20,0:5")
+        self.assertEqual(GetInfrastructureContMsgFragment.call_args_list[0][0][2:], (False, '10,0:2', None))
+
+        bottle_request.params = {'tail': '1'}
+        res = RESTGetVMProperty("1", "1", "contmsg")
+        self.assertEqual("".join(res), "vmmsg\n")
+        self.assertEqual(bottle.response.get_header('X-Next-Offset'), "6")
+        self.assertEqual(GetVMContMsgFragment.call_args_list[0][0][3:], (None, 1))
+
+        bottle_request.headers["Accept"] = "application/json"
+        res = RESTGetVMProperty("1", "1", "contmsg")
+        self.assertEqual(json.loads(res), {"contmsg": "vmmsg\n", "next_offset": 6})
+
+        bottle_request.params = {'tail': '-1'}
+        res = RESTGetInfrastructureProperty("1", "contmsg")
+        self.assertEqual(json.loads(res)["message"], "Incorrect value in offset or tail parameters")
+
+        bottle_request.params = {'offset': '10,0'}
+        res = RESTGetInfrastructureProperty("1", "contmsg")
+        self.assertEqual(json.loads(res)["message"], "Incorrect value in offset or tail parameters")
+
     @patch("IM.InfrastructureManager.InfrastructureManager.AddResource")
     @patch("IM.InfrastructureManager.InfrastructureManager.get_infrastructure")
     @patch("bottle.request")
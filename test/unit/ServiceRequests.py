@@ -46,6 +46,16 @@ class TestServiceRequests(unittest.TestCase):
                                                               ("", "", True))
         req._call_function()
 
+    @patch('IM.InfrastructureManager.InfrastructureManager')
+    def test_create_busy(self, inflist):
+        import IM.ServiceRequests
+        from IM.admission import BusyException
+        inflist.CreateInfrastructure.side_effect = BusyException()
+        req = IM.ServiceRequests.IMBaseRequest.create_request(IM.ServiceRequests.IMBaseRequest.CREATE_INFRASTRUCTURE,
+                                                              ("", "", True))
+        self.assertFalse(req._execute())
+        self.assertEqual(req.get(), "Busy: Too many operations in progress. Try again later.")
+
     @patch('IM.InfrastructureManager.InfrastructureManager')
     def test_destroy(self, inflist):
         import IM.ServiceRequests
@@ -79,7 +89,7 @@ class TestServiceRequests(unittest.TestCase):
     def test_list(self, inflist):
         import IM.ServiceRequests
         req = IM.ServiceRequests.IMBaseRequest.create_request(IM.ServiceRequests.IMBaseRequest.GET_INFRASTRUCTURE_LIST,
-                                                              ("", ".*"))
+                                                              ("", ".*", 10, "1", "state"))
         req._call_function()
 
     @patch('IM.InfrastructureManager.InfrastructureManager')
@@ -96,6 +106,13 @@ class TestServiceRequests(unittest.TestCase):
                                                               ("", ""))
         req._call_function()
 
+    @patch('IM.InfrastructureManager.InfrastructureManager')
+    def test_getetag(self, inflist):
+        import IM.ServiceRequests
+        req = IM.ServiceRequests.IMBaseRequest.create_request(IM.ServiceRequests.IMBaseRequest.GET_INFRASTRUCTURE_ETAG,
+                                                              ("", "", None, ""))
+        req._call_function()
+
     @patch('IM.InfrastructureManager.InfrastructureManager')
     def test_vm_contmsg(self, inflist):
         import IM.ServiceRequests
@@ -110,6 +127,14 @@ class TestServiceRequests(unittest.TestCase):
                                                               ("", "", ""))
         req._call_function()
 
+    @patch('IM.InfrastructureManager.InfrastructureManager')
+    def test_vms_info(self, inflist):
+        import IM.ServiceRequests
+        inflist.GetVMsInfo.return_value = {"0": "radl0", "1": "radl1"}
+        req = IM.ServiceRequests.IMBaseRequest.create_request(IM.ServiceRequests.IMBaseRequest.GET_VMS_INFO,
+                                                              ("", "", ""))
+        self.assertEqual(req._call_function(), {"0": "radl0", "1": "radl1"})
+
     @patch('IM.InfrastructureManager.InfrastructureManager')
     def test_vm_prop(self, inflist):
         import IM.ServiceRequests
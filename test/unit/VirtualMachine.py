@@ -18,7 +18,9 @@
 
 import unittest
 import os
+import time
 import tempfile
+import threading
 
 from IM.VirtualMachine import VirtualMachine
 from radl import radl_parse
@@ -159,6 +161,74 @@ class TestVirtualMachine(unittest.TestCase):
         self.assertEqual(vm.info.systems[0].getValue('net_interface.0.ip'), "10.0.0.1")
         self.assertEqual(vm.info.systems[0].getValue('net_interface.2.ip'), "192.168.0.1")
 
+    def test_update_status_batch(self):
+        radl = radl_parse.parse_radl("system test ( cpu.count = 1 )")
+        batch_conn = MagicMock()
+        batch_conn.BATCH_UPDATE = True
+        batch_conn.updateVMInfoBatch.side_effect = lambda vms, auth: [(True, vm) for vm in vms]
+        conn = MagicMock()
+        conn.BATCH_UPDATE = False
+        conn.updateVMInfo.side_effect = lambda vm, auth: (True, vm)
+        inf = MagicMock()
+        cloud1 = MagicMock()
+        cloud1.id = "one"
+        cloud2 = MagicMock()
+        cloud2.id = "dummy"
+        vms = []
+        for i in range(3):
+            vms.append(VirtualMachine(inf, str(i), cloud1, radl.clone(), radl.clone(), batch_conn, i))
+        for i in range(3, 5):
+            vms.append(VirtualMachine(inf, str(i), cloud2, radl.clone(), radl.clone(), conn, i))
+        for vm in vms:
+            vm.state = VirtualMachine.RUNNING
+
+        groups = VirtualMachine.group_by_cloud(vms)
+        self.assertEqual(sorted([[vm.im_id for vm in group] for group in groups]), [[0, 1, 2], [3], [4]])
+
+        # The VMs with the info updated recently are not requested
+        vms[0].last_update -= 100
+        vms[2].last_update -= 100
+        self.assertEqual(VirtualMachine.update_status_batch(vms[0:3], "auth"), [True, False, True])
+        self.assertEqual(batch_conn.updateVMInfoBatch.call_count, 1)
+        self.assertEqual(batch_conn.updateVMInfoBatch.call_args[0][0], [vms[0], vms[2]])
+        self.assertEqual(batch_conn.updateVMInfo.call_count, 0)
+
+        # A single VM uses updateVMInfo
+        self.assertTrue(vms[3].update_status("auth", force=True))
+        self.assertEqual(conn.updateVMInfo.call_count, 1)
+        self.assertEqual(conn.updateVMInfoBatch.call_count, 0)
+
+    def test_update_status_single_flight(self):
+        radl = radl_parse.parse_radl("system test ( cpu.count = 1 )")
+        conn = MagicMock()
+
+        def updateVMInfo(vm, auth):
+            time.sleep(0.3)
+            return (False, "Error")
+
+        conn.updateVMInfo.side_effect = updateVMInfo
+        vm = VirtualMachine(MagicMock(), "1", MagicMock(), radl, radl, conn, 0)
+        vm.last_update -= 100
+
+        # The concurrent requests share the same call to the cloud provider
+        res = []
+        threads = [threading.Thread(target=lambda: res.append(vm.update_status("auth"))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(res, [False] * 5)
+        self.assertEqual(conn.updateVMInfo.call_count, 1)
+
+        # The failed result is cached for a short time
+        self.assertFalse(vm.update_status("auth"))
+        self.assertEqual(conn.updateVMInfo.call_count, 1)
+        self.assertFalse(vm.update_status("auth", force=True))
+        self.assertEqual(conn.updateVMInfo.call_count, 2)
+        with patch("IM.VirtualMachine.Config.VM_INFO_UPDATE_ERROR_CACHE", 0):
+            vm.update_status("auth")
+        self.assertEqual(conn.updateVMInfo.call_count, 3)
+
 
 if __name__ == '__main__':
     unittest.main()
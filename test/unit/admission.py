@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import threading
+import time
+
+from IM.admission import AdmissionControl, BusyException
+from IM.auth import Authentication
+from IM.CloudInfo import CloudInfo
+from IM.config import Config
+from mock import patch
+
+
+class TestAdmissionControl(unittest.TestCase):
+    """
+    Class to test the AdmissionControl class
+    """
+
+    auth = Authentication([{'type': 'InfrastructureManager', 'username': 'user', 'password': 'pass'},
+                           {'id': 'one', 'type': 'OpenNebula', 'host': 'server.com:2633',
+                            'username': 'user', 'password': 'pass'},
+                           {'id': 'dummy', 'type': 'Dummy'}])
+
+    def test_get_keys(self):
+        keys = AdmissionControl.get_keys(self.auth)
+        self.assertEqual(keys, ["user:user"])
+        clouds = CloudInfo.get_cloud_list(self.auth)
+        keys = AdmissionControl.get_keys(self.auth, clouds)
+        self.assertEqual(sorted(keys), ["cloud:Dummy", "cloud:OpenNebula://server.com:2633", "user:user"])
+        keys = AdmissionControl.get_keys(self.auth, [cloud for cloud in clouds if cloud.id == "one"] * 2)
+        self.assertEqual(sorted(keys), ["cloud:OpenNebula://server.com:2633", "user:user"])
+
+    @patch.object(Config, "MAX_USER_OPERATIONS", 0)
+    @patch.object(Config, "MAX_CLOUD_OPERATIONS", 0)
+    def test_unlimited(self):
+        with AdmissionControl.admit(self.auth):
+            with AdmissionControl.admit(self.auth):
+                self.assertEqual(AdmissionControl.get_stats()["running"], {})
+
+    @patch.object(Config, "MAX_USER_OPERATIONS", 1)
+    @patch.object(Config, "MAX_CLOUD_OPERATIONS", 0)
+    @patch.object(Config, "ADMISSION_TIMEOUT", 5)
+    def test_limit(self):
+        res = []
+        ticket = AdmissionControl.admit(self.auth)
+        self.assertEqual(AdmissionControl.get_stats()["running"], {"user:user": 1})
+
+        def op():
+            with AdmissionControl.admit(self.auth):
+                res.append(time.time())
+
+        t = threading.Thread(target=op)
+        t.start()
+        time.sleep(0.5)
+        # The other operation is waiting for the slot
+        self.assertEqual(res, [])
+        self.assertEqual(AdmissionControl.get_stats()["waiting"], {"user:user": 1})
+        # Nested operations in the same thread do not wait
+        with AdmissionControl.admit(self.auth):
+            pass
+        ticket.release()
+        ticket.release()
+        t.join()
+        self.assertEqual(len(res), 1)
+        self.assertEqual(AdmissionControl.get_stats()["running"], {})
+        self.assertEqual(AdmissionControl.get_stats()["waiting"], {})
+
+    @patch.object(Config, "MAX_USER_OPERATIONS", 1)
+    @patch.object(Config, "MAX_CLOUD_OPERATIONS", 1)
+    @patch.object(Config, "ADMISSION_QUEUE_SIZE", 0)
+    def test_reject(self):
+        rejected = AdmissionControl.get_stats()["rejected"]
+        res = []
+
+        def op():
+            try:
+                AdmissionControl.admit(self.auth)
+            except BusyException as ex:
+                res.append(ex.message)
+
+        with AdmissionControl.admit(self.auth):
+            t = threading.Thread(target=op)
+            t.start()
+            t.join()
+        self.assertEqual(res, ["Too many operations in progress. Try again later."])
+        self.assertEqual(AdmissionControl.get_stats()["rejected"], rejected + 1)
+
+        with patch.object(Config, "ADMISSION_QUEUE_SIZE", 10):
+            with patch.object(Config, "ADMISSION_TIMEOUT", 0.2):
+                with AdmissionControl.admit(self.auth):
+                    t = threading.Thread(target=op)
+                    t.start()
+                    t.join()
+        self.assertEqual(len(res), 2)
+        self.assertEqual(AdmissionControl.get_stats()["running"], {})
+
+    @patch.object(Config, "MAX_USER_OPERATIONS", 0)
+    @patch.object(Config, "MAX_CLOUD_OPERATIONS", 1)
+    @patch.object(Config, "ADMISSION_QUEUE_SIZE", 0)
+    def test_clouds(self):
+        one, dummy = sorted(CloudInfo.get_cloud_list(self.auth), key=lambda cloud: cloud.id, reverse=True)
+        res = []
+
+        def op(clouds):
+            try:
+                with AdmissionControl.admit(self.auth, clouds):
+                    res.append(True)
+            except BusyException:
+                res.append(False)
+
+        with AdmissionControl.admit(self.auth, [one]):
+            for clouds in [[dummy], [one], [one, dummy], []]:
+                t = threading.Thread(target=op, args=(clouds,))
+                t.start()
+                t.join()
+        # Only the operations that use the busy cloud are rejected
+        self.assertEqual(res, [True, False, False, True])
+
+    @patch.object(Config, "MAX_USER_OPERATIONS", 1)
+    @patch.object(Config, "MAX_CLOUD_OPERATIONS", 0)
+    def test_start_thread(self):
+        event = threading.Event()
+        ticket = AdmissionControl.admit(self.auth)
+        t = AdmissionControl.start_thread(ticket, "test", event.wait, (5,))
+        ticket.release()
+        # The slot is owned by the new thread until it finishes
+        self.assertEqual(AdmissionControl.get_stats()["running"], {"user:user": 1})
+        event.set()
+        t.join()
+        self.assertEqual(AdmissionControl.get_stats()["running"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
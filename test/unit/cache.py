@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import subprocess
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../.."))
+
+from IM.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """
+    Class to test the LRUCache class
+    """
+
+    def test_max_size(self):
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        # b is the least recently used
+        self.assertEqual(sorted(cache.keys()), ["a", "c"])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache["c"], 3)
+        self.assertEqual(cache.get_stats(), {"size": 2, "weight": 2, "hits": 1, "misses": 1, "evictions": 1})
+        del cache["a"]
+        self.assertNotIn("a", cache)
+        self.assertEqual(dict(cache), {"c": 3})
+
+    def test_weight_and_pinned(self):
+        cache = LRUCache(max_weight=10, weight=lambda value: value, pinned=lambda value: value == 4)
+        cache["a"] = 4
+        cache["b"] = 5
+        cache["c"] = 3
+        # a is pinned so b is evicted
+        self.assertEqual(sorted(cache.keys()), ["a", "c"])
+        cache["d"] = 8
+        # the last inserted element is never evicted
+        self.assertEqual(sorted(cache.keys()), ["a", "d"])
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(cache.get_weight(), 12)
+
+    def test_inf_cache_limit(self):
+        # Check the limits of the caches of Infs in a new process, without calling _reinit or load_data
+        code = ("from IM.config import Config\n"
+                "Config.INF_CACHE_SIZE = 10\n"
+                "Config.INF_AUTH_CACHE_SIZE = 20\n"
+                "from IM.InfrastructureInfo import InfrastructureInfo\n"
+                "from IM.InfrastructureList import InfrastructureList\n"
+                "for i in range(50):\n"
+                "    inf = InfrastructureInfo()\n"
+                "    inf.id = str(i)\n"
+                "    InfrastructureList.infrastructure_list[inf.id] = inf\n"
+                "    InfrastructureList.infrastructure_auth[inf.id] = inf\n"
+                "print(len(InfrastructureList.infrastructure_list.keys()))\n"
+                "print(len(InfrastructureList.infrastructure_auth.keys()))\n")
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../..")
+        output = subprocess.check_output([sys.executable, "-c", code], env=env)
+        self.assertEqual(output.decode().split(), ["10", "20"])
+
+
+if __name__ == '__main__':
+    unittest.main()
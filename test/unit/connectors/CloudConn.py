@@ -19,6 +19,8 @@
 import os
 import unittest
 import logging
+
+from IM.connectors.CloudConnector import CloudConnector
 try:
     from StringIO import StringIO
 except ImportError:
@@ -31,6 +33,7 @@ class TestCloudConnectorBase(unittest.TestCase):
     """
 
     def setUp(self):
+        CloudConnector.clear_driver_cache()
         self.call_count = {}
         self.log = StringIO()
         self.handler = logging.StreamHandler(self.log)
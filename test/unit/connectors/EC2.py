@@ -406,6 +406,51 @@ class TestEC2Connector(TestCloudConnectorBase):
         self.assertEquals(change.add_value.call_args_list, [call('158.42.1.1')])
         self.assertEquals(conn.create_route.call_args_list, [call('routet-id', '10.0.10.0/24', instance_id='int-id')])
 
+    @patch('IM.connectors.EC2.EC2CloudConnector.get_connection')
+    def test_31_updateVMInfoBatch(self, get_connection):
+        radl_data = """
+            network net (outbound = 'yes')
+            system test (
+            cpu.count=1 and
+            memory.size=512m and
+            net_interface.0.connection = 'net' and
+            disk.0.os.name = 'linux' and
+            disk.0.image.url = 'aws://us-east-1/ami-id'
+            )"""
+        radl = radl_parse.parse_radl(radl_data)
+        radl.check()
+
+        auth = Authentication([{'id': 'ec2', 'type': 'EC2', 'username': 'user', 'password': 'pass'}])
+        ec2_cloud = self.get_ec2_cloud()
+        ec2_cloud.update_vm_from_instance = MagicMock(side_effect=lambda vm, instance, conn, auth: (True, vm))
+        ec2_cloud.updateVMInfo = MagicMock(side_effect=lambda vm, auth: (True, vm))
+
+        inf = MagicMock()
+        vm1 = VirtualMachine(inf, "us-east-1;id-1", ec2_cloud.cloud, radl, radl, ec2_cloud, 1)
+        vm2 = VirtualMachine(inf, "us-east-1;id-2", ec2_cloud.cloud, radl, radl, ec2_cloud, 2)
+        vm3 = VirtualMachine(inf, "us-east-1;sid-3", ec2_cloud.cloud, radl, radl, ec2_cloud, 3)
+        vm4 = VirtualMachine(inf, "eu-west-1;id-4", ec2_cloud.cloud, radl, radl, ec2_cloud, 4)
+
+        conn = MagicMock()
+        conn_eu = MagicMock()
+        get_connection.side_effect = lambda region, auth: conn_eu if region == "eu-west-1" else conn
+        reservation = MagicMock()
+        instance = MagicMock()
+        instance.id = "id-1"
+        reservation.instances = [instance]
+        conn.get_all_instances.return_value = [reservation]
+        conn_eu.get_all_instances.side_effect = Exception("InvalidInstanceID.NotFound")
+
+        res = ec2_cloud.updateVMInfoBatch([vm1, vm2, vm3, vm4], auth)
+
+        self.assertEqual(res, [(True, vm1), (True, vm2), (True, vm3), (True, vm4)])
+        # A single request per region with all its instances (the spot requests are checked one by one)
+        self.assertEqual(conn.get_all_instances.call_args_list, [call(instance_ids=["id-1", "id-2"])])
+        self.assertEqual(conn_eu.get_all_instances.call_args_list, [call(instance_ids=["id-4"])])
+        self.assertEqual(ec2_cloud.update_vm_from_instance.call_args_list, [call(vm1, instance, conn, auth)])
+        # The VMs not returned by the request (or whose region failed) are updated one by one
+        self.assertEqual(ec2_cloud.updateVMInfo.call_args_list, [call(vm2, auth), call(vm3, auth), call(vm4, auth)])
+
     @patch('IM.connectors.EC2.EC2CloudConnector.get_connection')
     def test_30_updateVMInfo_spot(self, get_connection):
         radl_data = """
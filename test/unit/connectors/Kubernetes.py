@@ -173,6 +173,61 @@ class TestKubernetesConnector(TestCloudConnectorBase):
         self.assertTrue(success, msg="ERROR: updating VM info.")
         self.assertNotIn("ERROR", self.log.getvalue(), msg="ERROR found in log: %s" % self.log.getvalue())
 
+    @patch('requests.request')
+    def test_31_updateVMInfoBatch(self, requests):
+        radl_data = """
+            network net (outbound = 'yes')
+            system test (
+            cpu.count=1 and
+            memory.size=512m and
+            net_interface.0.connection = 'net' and
+            disk.0.os.name = 'linux' and
+            disk.0.image.url = 'docker://someimage'
+            )"""
+        radl = radl_parse.parse_radl(radl_data)
+        radl.check()
+
+        auth = Authentication([{'id': 'fogbow', 'type': 'Kubernetes', 'host': 'http://server.com:8080'}])
+        kube_cloud = self.get_kube_cloud()
+
+        inf = MagicMock()
+        inf.id = "namespace"
+        vm1 = VirtualMachine(inf, "1", kube_cloud.cloud, radl, radl, kube_cloud, 1)
+        vm2 = VirtualMachine(inf, "2", kube_cloud.cloud, radl.clone(), radl.clone(), kube_cloud, 2)
+
+        pods_status = [200]
+
+        def get_response(method, url, verify, headers, data):
+            if method == "GET" and urlparse(url)[2] == "/api/v1/namespaces/namespace/pods":
+                resp = MagicMock()
+                resp.status_code = pods_status[0]
+                resp.text = ('{"items": [{"metadata": {"namespace":"namespace", "name": "2"}, "status": '
+                             '{"phase":"Pending", "hostIP": "158.42.1.2", "podIP": "10.0.0.2"}}]}')
+                return resp
+            return self.get_response(method, url, verify, headers, data)
+
+        requests.side_effect = get_response
+
+        res = kube_cloud.updateVMInfoBatch([vm1, vm2], auth)
+
+        self.assertTrue(res[0][0])
+        self.assertTrue(res[1][0])
+        self.assertEqual(vm1.state, VirtualMachine.RUNNING)
+        self.assertEqual(vm2.state, VirtualMachine.PENDING)
+        urls = [urlparse(args[0][1])[2] for args in requests.call_args_list if args[0][0] == "GET"]
+        # The POD of VM 2 is got from the list of PODs and VM 1 (not in the list) is updated alone
+        self.assertEqual(urls.count("/api/v1/namespaces/namespace/pods"), 1)
+        self.assertNotIn("/api/v1/namespaces/namespace/pods/2", urls)
+        self.assertIn("/api/v1/namespaces/namespace/pods/1", urls)
+
+        # If the PODs cannot be listed, the VMs are updated one by one
+        pods_status[0] = 500
+        requests.reset_mock()
+        res = kube_cloud.updateVMInfoBatch([vm1], auth)
+        self.assertTrue(res[0][0])
+        urls = [urlparse(args[0][1])[2] for args in requests.call_args_list if args[0][0] == "GET"]
+        self.assertIn("/api/v1/namespaces/namespace/pods/1", urls)
+
     @patch('requests.request')
     def test_55_alter(self, requests):
         radl_data = """
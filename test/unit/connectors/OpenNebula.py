@@ -196,6 +196,59 @@ class TestONEConnector(TestCloudConnectorBase):
         self.assertTrue(success, msg="ERROR: updating VM info.")
         self.assertNotIn("ERROR", self.log.getvalue(), msg="ERROR found in log: %s" % self.log.getvalue())
 
+    @patch('IM.connectors.OpenNebula.ServerProxy')
+    def test_31_updateVMInfoBatch(self, server_proxy):
+        radl_data = """
+            network net (outbound = 'yes' and provider_id = 'publica')
+            network net1 (provider_id = 'privada')
+            system test (
+            cpu.count=1 and
+            memory.size=512m and
+            net_interface.0.connection = 'net' and
+            net_interface.1.connection = 'net1' and
+            disk.0.os.name = 'linux' and
+            disk.0.image.url = 'one://server.com/1'
+            )"""
+        radl = radl_parse.parse_radl(radl_data)
+        radl.check()
+
+        auth = Authentication([{'id': 'one', 'type': 'OpenNebula', 'username': 'user',
+                                'password': 'pass', 'host': 'server.com:2633'}])
+        one_cloud = self.get_one_cloud()
+
+        inf = MagicMock()
+        vm1 = VirtualMachine(inf, "10908", one_cloud.cloud, radl, radl, one_cloud, 1)
+        vm2 = VirtualMachine(inf, "2", one_cloud.cloud, radl.clone(), radl.clone(), one_cloud, 2)
+
+        one_server = MagicMock()
+        vm_pool = "<VM_POOL>%s</VM_POOL>" % self.read_file_as_string("files/vm_info.xml")
+        one_server.system.listMethods.return_value = ["one.vmpool.info", "one.vmpool.infoextended"]
+        one_server.one.vmpool.infoextended.return_value = (True, vm_pool, 0)
+        one_server.one.vm.info.return_value = (False, "Error getting VM info", 0)
+        server_proxy.return_value = one_server
+
+        res = one_cloud.updateVMInfoBatch([vm1, vm2], auth)
+        self.assertEqual(one_server.one.vmpool.infoextended.call_args[0][1:], (-2, 2, 10908, -1))
+        self.assertEqual(one_server.one.vmpool.info.call_count, 0)
+        self.assertTrue(res[0][0])
+        self.assertEquals(vm1.info.systems[0].getValue("net_interface.0.ip"), "158.42.1.1")
+        # The VMs not returned by the pool are got individually
+        self.assertEqual(one_server.one.vm.info.call_args_list, [call(one_cloud.getSessionID(auth), 2)])
+        self.assertFalse(res[1][0])
+        self.assertEqual(res[1][1], "Error getting VM info")
+
+        # The supported functions are only listed once
+        one_cloud.updateVMInfoBatch([vm1], auth)
+        self.assertEqual(one_server.system.listMethods.call_count, 1)
+
+        # Old ONE versions without vmpool.infoextended
+        one_cloud = self.get_one_cloud()
+        one_server.system.listMethods.return_value = ["one.vmpool.info"]
+        one_server.one.vmpool.info.return_value = (True, vm_pool, 0)
+        res = one_cloud.updateVMInfoBatch([vm1], auth)
+        self.assertEqual(one_server.one.vmpool.info.call_args[0][1:], (-2, 10908, 10908, -1))
+        self.assertTrue(res[0][0])
+
     @patch('IM.connectors.OpenNebula.ServerProxy')
     def test_40_stop(self, server_proxy):
         auth = Authentication([{'id': 'one', 'type': 'OpenNebula', 'username': 'user',
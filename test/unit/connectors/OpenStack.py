@@ -17,6 +17,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import sys
+import time
+import datetime
+import threading
 import unittest
 
 sys.path.append(".")
@@ -445,6 +448,59 @@ class TestOSTConnector(TestCloudConnectorBase):
         self.assertEquals(vm.info.systems[0].getValue("net_interface.0.ipv6"), "2001:630:12:581:f816:3eff:fe92:2146")
         self.assertNotIn("ERROR", self.log.getvalue(), msg="ERROR found in log: %s" % self.log.getvalue())
 
+    @patch('libcloud.compute.drivers.openstack.OpenStackNodeDriver')
+    def test_31_updateVMInfoBatch(self, get_driver):
+        radl_data = """
+            network net (outbound = 'yes' and provider_id = 'pool1')
+            system test (
+            cpu.count=1 and
+            memory.size=512m and
+            net_interface.0.connection = 'net' and
+            disk.0.os.name = 'linux' and
+            disk.0.image.url = 'ost://server.com/ami-id'
+            )"""
+        radl = radl_parse.parse_radl(radl_data)
+        radl.check()
+
+        auth = Authentication([{'id': 'ost', 'type': 'OpenStack', 'username': 'user',
+                                'password': 'pass', 'tenant': 'tenant', 'host': 'https://server.com:5000'}])
+        ost_cloud = self.get_ost_cloud()
+
+        inf = MagicMock()
+        vms = [VirtualMachine(inf, str(i), ost_cloud.cloud, radl.clone(), radl.clone(), ost_cloud, i)
+               for i in range(3)]
+        inf.vm_list = vms
+
+        driver = MagicMock()
+        get_driver.return_value = driver
+
+        nodes = []
+        for i in range(2):
+            node = MagicMock()
+            node.id = str(i)
+            node.state = "running"
+            node.extra = {'flavorId': 'small'}
+            node.public_ips = ['8.8.8.%d' % i]
+            node.private_ips = ['10.0.0.%d' % i]
+            node.driver = driver
+            nodes.append(node)
+        driver.list_nodes.return_value = nodes
+
+        node_size = MagicMock()
+        node_size.ram = 512
+        node_size.price = 1
+        node_size.disk = 1
+        node_size.vcpus = 1
+        node_size.name = "small"
+        driver.ex_get_size.return_value = node_size
+
+        res = ost_cloud.updateVMInfoBatch(vms, auth)
+        self.assertEqual(driver.list_nodes.call_count, 1)
+        self.assertEqual(driver.ex_get_node_details.call_count, 0)
+        self.assertEqual(driver.ex_get_size.call_count, 1)
+        self.assertEqual([success for success, _ in res], [True, True, False])
+        self.assertEquals(vms[1].info.systems[0].getValue("net_interface.0.ip"), "8.8.8.1")
+
     @patch('libcloud.compute.drivers.openstack.OpenStackNodeDriver')
     def test_40_stop(self, get_driver):
         auth = Authentication([{'id': 'ost', 'type': 'OpenStack', 'username': 'user',
@@ -804,6 +860,73 @@ class TestOSTConnector(TestCloudConnectorBase):
         self.assertEqual(driver.delete_image.call_args_list, [call(image)])
         self.assertNotIn("ERROR", self.log.getvalue(), msg="ERROR found in log: %s" % self.log.getvalue())
 
+    @patch('libcloud.compute.drivers.openstack.OpenStackNodeDriver')
+    def test_get_driver_cache(self, get_driver):
+        auth = Authentication([{'id': 'ost', 'type': 'OpenStack', 'username': 'user',
+                                'password': 'pass', 'tenant': 'tenant', 'host': 'https://server.com:5000'}])
+        auth2 = Authentication([{'id': 'ost', 'type': 'OpenStack', 'username': 'user2',
+                                 'password': 'pass', 'tenant': 'tenant', 'host': 'https://server.com:5000'}])
+        get_driver.side_effect = lambda *args, **kwargs: MagicMock()
+
+        # The connectors with the same credentials share the driver
+        driver = self.get_ost_cloud().get_driver(auth)
+        self.assertIs(self.get_ost_cloud().get_driver(auth), driver)
+        self.assertEqual(get_driver.call_count, 1)
+        self.assertIsNot(self.get_ost_cloud().get_driver(auth2), driver)
+        self.assertEqual(get_driver.call_count, 2)
+
+        # The driver is renewed when its token is going to expire
+        driver.connection.auth_token_expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=10)
+        self.assertIsNot(self.get_ost_cloud().get_driver(auth), driver)
+        self.assertEqual(get_driver.call_count, 3)
+
+    @patch('libcloud.compute.drivers.openstack.OpenStackNodeDriver')
+    def test_get_driver_cache_threads(self, get_driver):
+        auth = Authentication([{'id': 'ost', 'type': 'OpenStack', 'username': 'user',
+                                'password': 'pass', 'tenant': 'tenant', 'host': 'https://server.com:5000'}])
+        lock = threading.Lock()
+        using = set()
+        errors = []
+
+        def list_nodes(driver):
+            # Fail if the driver is used concurrently by other thread
+            with lock:
+                if driver in using:
+                    errors.append(driver)
+                using.add(driver)
+            time.sleep(0.01)
+            with lock:
+                using.discard(driver)
+            return []
+
+        def new_driver(*args, **kwargs):
+            driver = MagicMock()
+            driver.list_nodes.side_effect = lambda: list_nodes(driver)
+            return driver
+
+        get_driver.side_effect = new_driver
+        ost_cloud = self.get_ost_cloud()
+        drivers = []
+
+        def use_driver():
+            for _ in range(5):
+                driver = ost_cloud.get_driver(auth)
+                driver.list_nodes()
+                with lock:
+                    drivers.append(driver)
+
+        threads = [threading.Thread(target=use_driver) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        # Each thread reuses its own driver
+        self.assertEqual(len(drivers), 20)
+        self.assertEqual(len(set(drivers)), 4)
+        self.assertEqual(get_driver.call_count, 4)
+
     def test_get_networks(self):
         radl_data = """
             network net1 (outbound = 'yes')
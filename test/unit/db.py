@@ -19,7 +19,7 @@
 import unittest
 import os
 
-from IM.db import DataBase
+from IM.db import DataBase, DataBasePool
 from mock import patch, MagicMock
 
 
@@ -41,8 +41,41 @@ class TestDataBase(unittest.TestCase):
         db.execute("insert into test (id, data, date) values (%s, %s, now())", (1, "Data"))
         res = db.select("select data from test where id = %s", (1,))
         self.assertEqual(res, [("Data",)])
+        self.assertEqual(db.select("PRAGMA journal_mode"), [("wal",)])
+        self.assertEqual(DataBase._sql_cache[(DataBase.SQLITE, "select data from test where id = %s")],
+                         "select data from test where id = ?")
         db.close()
 
+    def test_sqlite_pool(self):
+        filename = "/tmp/inf_pool.dat"
+        if os.path.exists(filename):
+            os.unlink(filename)
+        db_url = "sqlite://" + filename
+        pool = DataBasePool(db_url, max_size=1, timeout=1)
+        with pool.connection() as db:
+            db.execute("CREATE TABLE test(id int PRIMARY KEY, date TIMESTAMP, data LONGBLOB)")
+            # The pool is full
+            with self.assertRaises(Exception) as ex:
+                pool.get()
+            self.assertEqual(str(ex.exception), "Timeout waiting for a free connection to the DB.")
+
+        # The connection must be reused
+        with pool.connection() as db2:
+            self.assertIs(db2, db)
+            self.assertTrue(db2.table_exists("test"))
+
+        # A broken connection must be replaced by a new one
+        db.close()
+        with self.assertRaises(Exception):
+            with pool.connection() as db3:
+                db3.select("select * from test")
+        with pool.connection() as db4:
+            self.assertIsNot(db4, db)
+            self.assertTrue(db4.table_exists("test"))
+
+        pool.close()
+        self.assertIs(DataBasePool.get_pool(db_url), DataBasePool.get_pool(db_url))
+
     @patch('IM.db.mdb.connect')
     def test_mysql_db(self, mdb_conn):
         connection = MagicMock()
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from IM.logbuffer import LogBuffer, SpilledChunk
+from IM.InfrastructureList import InfrastructureList
+from IM.InfrastructureInfo import InfrastructureInfo
+from IM.config import Config
+from mock import patch
+
+
+class TestLogBuffer(unittest.TestCase):
+    """
+    Class to test the LogBuffer class
+    """
+
+    def setUp(self):
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+
+    def tearDown(self):
+        InfrastructureList._reinit()
+
+    @patch.object(Config, "MAX_CONT_MSG_SIZE", 0)
+    def test_memory(self):
+        log = LogBuffer("line1\n")
+        log.append("line2\n", ("1", 0))
+        self.assertEqual(log.get_value(), "line1\nline2\n")
+        self.assertEqual(len(log), 12)
+        # Reading a log again only appends the new part
+        log.replace_from(6, "line2\nline3\n")
+        self.assertEqual(log.get_parts(), ["line1\nline2\n", "line3\n"])
+        log.replace_from(6, "other\n")
+        self.assertEqual(log.get_value(), "line1\nother\n")
+        log.set("")
+        self.assertEqual(log.get_value(), "")
+        self.assertEqual(log.serialize(), "")
+
+    @patch.object(Config, "MAX_CONT_MSG_SIZE", 10)
+    def test_spill(self):
+        key = ("1", 0)
+        log = LogBuffer()
+        for i in range(5):
+            log.append("line%d\n" % i, key)
+        self.assertEqual(log.get_value(key), "line0\nline1\nline2\nline3\nline4\n")
+
+        # Only the last part is kept in memory and serialized
+        data = log.serialize()
+        self.assertEqual(data["spilled"], [7, 6, 6, 6])
+        self.assertEqual(data["data"], "ine4\n")
+        self.assertEqual(InfrastructureList.get_cont_msg_chunk("1", 0, 0), "line0\nl")
+
+        # The spilled chunks are only read when they are accessed
+        new_log = LogBuffer.deserialize(data)
+        self.assertEqual(len(new_log), 30)
+        parts = new_log.get_parts(key, lazy=True)
+        self.assertIsInstance(parts[0], SpilledChunk)
+        self.assertIsNone(parts[0]._data)
+        self.assertEqual(parts[4][-3:], "e4\n")
+        self.assertEqual(parts[3][:], "line0\nline1\nline2\nline3\nline4\n"[19:25])
+        self.assertIsNone(parts[0]._data)
+        self.assertEqual(new_log.get_value(key), "line0\nline1\nline2\nline3\nline4\n")
+
+        # Change a part of the log moved to the DB
+        new_log.replace_from(6, "other\n", key)
+        self.assertEqual(new_log.get_value(key), "line0\nother\n")
+        new_log.set("", key)
+        self.assertEqual(new_log.serialize(), "")
+        self.assertIsNone(InfrastructureList.get_cont_msg_chunk("1", 0, 0))
+
+    @patch.object(Config, "MAX_CONT_MSG_SIZE", 10)
+    def test_inf_cont_out(self):
+        inf = InfrastructureInfo()
+        inf.id = "1"
+        for i in range(5):
+            inf.add_cont_msg("msg%d" % i)
+        self.assertEqual(inf.cont_out.count("\n"), 5)
+        self.assertTrue(inf.cont_out.endswith(": msg4\n"))
+
+        # The full log is only included in the JSON format
+        data = inf.serialize(compress=True)
+        new_inf = InfrastructureInfo.deserialize(data)
+        self.assertEqual(new_inf.cont_out, inf.cont_out)
+        self.assertLessEqual(len(InfrastructureInfo.cont_out.get_data(inf)["data"]), 10)
+        self.assertEqual(InfrastructureInfo.deserialize(inf.serialize()).cont_out, inf.cont_out)
+        self.assertIn("msg0", inf.serialize())
+
+
+if __name__ == '__main__':
+    unittest.main()
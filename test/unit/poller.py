@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import threading
+import unittest
+
+from IM.poller import VMStatusPoller
+from IM.config import Config
+from IM.CloudInfo import CloudInfo
+from IM.VirtualMachine import VirtualMachine
+from IM.InfrastructureInfo import InfrastructureInfo
+from radl import radl_parse
+from mock import patch, MagicMock
+
+
+class TestVMStatusPoller(unittest.TestCase):
+    """
+    Class to test the VMStatusPoller class
+    """
+
+    def setUp(self):
+        self.patchers = [patch.object(VMStatusPoller, "TICK", 0.05), patch.object(VMStatusPoller, "JITTER", 0)]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        VMStatusPoller.stop()
+        for patcher in self.patchers:
+            patcher.stop()
+
+    @staticmethod
+    def gen_inf(num_vms, conn):
+        radl = radl_parse.parse_radl("system test ( cpu.count = 1 )")
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        cloud.server = "server.com"
+        inf = InfrastructureInfo()
+        inf.id = "inf1"
+        for i in range(num_vms):
+            vm = VirtualMachine(inf, str(i), cloud, radl, radl, conn, i)
+            vm.state = VirtualMachine.RUNNING
+            vm.creating = False
+            inf.add_vm(vm)
+        return inf
+
+    @staticmethod
+    def wait_calls(conn, num, timeout=5):
+        end = time.time() + timeout
+        while conn.updateVMInfo.call_count < num and time.time() < end:
+            time.sleep(0.05)
+
+    @patch.object(Config, "VM_POLLER_INTERVAL", 2)
+    @patch.object(Config, "VM_INFO_UPDATE_FREQUENCY", -1)
+    def test_cached_reads(self):
+        conn = MagicMock()
+        conn.updateVMInfo.side_effect = lambda vm, auth: (True, vm)
+        inf = self.gen_inf(1, conn)
+        vm = inf.get_vm_list()[0]
+        self.assertFalse(VMStatusPoller.watch(inf, "auth"))
+
+        VMStatusPoller.start()
+        # The first access contacts the cloud provider
+        vm.update_status("auth")
+        self.assertEqual(conn.updateVMInfo.call_count, 1)
+        # The next ones use the cached state
+        vm.update_status("auth")
+        self.assertEqual(conn.updateVMInfo.call_count, 1)
+        self.assertTrue(VMStatusPoller.watch(inf, "auth"))
+        self.assertEqual(VMStatusPoller.get_stats()["infrastructures"], 1)
+
+        # The state is updated in background with the last credentials
+        vm.update_status("auth2")
+        self.wait_calls(conn, 2)
+        self.assertGreaterEqual(conn.updateVMInfo.call_count, 2)
+        self.assertEqual(conn.updateVMInfo.call_args[0][1], "auth2")
+
+        # A forced update always contacts the cloud provider
+        num = conn.updateVMInfo.call_count
+        vm.update_status("auth", force=True)
+        self.assertGreater(conn.updateVMInfo.call_count, num)
+
+        # The deleted Infs are not polled anymore
+        inf.deleted = True
+        time.sleep(0.2)
+        self.assertEqual(VMStatusPoller.get_stats()["infrastructures"], 0)
+
+    @patch.object(Config, "VM_POLLER_INTERVAL", 0.1)
+    @patch.object(Config, "VM_POLLER_MAX_CLOUD_UPDATES", 2)
+    def test_cloud_limit(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def update(vm, auth):
+            with lock:
+                running[0] += 1
+                running[1] = max(running[0], running[1])
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+            return True, vm
+
+        conn = MagicMock()
+        conn.updateVMInfo.side_effect = update
+        inf = self.gen_inf(6, conn)
+        VMStatusPoller.start()
+        VMStatusPoller.watch(inf, "auth")
+        self.wait_calls(conn, 6)
+        self.assertGreaterEqual(conn.updateVMInfo.call_count, 6)
+        self.assertEqual(running[1], 2)
+
+    @patch.object(Config, "VM_POLLER_INTERVAL", 60)
+    @patch.object(Config, "VM_POLLER_TRANSITION_INTERVAL", 5)
+    def test_transition_interval(self):
+        inf = self.gen_inf(1, MagicMock())
+        vm = inf.get_vm_list()[0]
+        self.assertEqual(vm.get_status_poll_interval(), 60)
+        vm.state = VirtualMachine.PENDING
+        self.assertEqual(vm.get_status_poll_interval(), 5)
+        vm.state = VirtualMachine.RUNNING
+        vm.creating = True
+        self.assertEqual(vm.get_status_poll_interval(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
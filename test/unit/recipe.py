@@ -26,11 +26,12 @@ class TestRecipe(unittest.TestCase):
     """
     Class to test the Recipe class
     """
+    @patch("IM.recipe.DataBasePool")
     @patch("IM.recipe.DataBase")
-    def test_recipe(self, DataBase):
+    def test_recipe(self, DataBase, DataBasePool):
         DataBase.db_available = True
         db = MagicMock()
-        DataBase.return_value = db
+        DataBasePool.get_pool.return_value.connection.return_value.__enter__.return_value = db
 
         recipe = Recipe("app", "1.0", "mod", "rec", "desc", "req")
         db.execute.return_value = True
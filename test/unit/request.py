@@ -19,7 +19,7 @@
 import unittest
 import time
 
-from IM.request import Request, RequestQueue, AsyncRequest
+from IM.request import Request, RequestQueue, AsyncRequest, WorkerPool, get_worker_pool, get_lanes_stats
 
 
 class DummyRequest(AsyncRequest):
@@ -72,6 +72,35 @@ class TestRequest(unittest.TestCase):
         time.sleep(2.5)
         self.assertEqual(sr.status(), Request.STATUS_PROCESSED)
 
+    def test_priority(self):
+        queue = RequestQueue()
+        requests = [Request(), Request(), Request()]
+        queue.put((Request.PRIORITY_LOW, requests[0]))
+        queue.put((Request.PRIORITY_NORMAL, requests[1]))
+        queue.put((Request.PRIORITY_HIGH, requests[2]))
+        queue.put((Request.PRIORITY_NORMAL, requests[0]))
+        self.assertEqual([queue.get(False)[1] for _ in range(4)],
+                         [requests[2], requests[1], requests[0], requests[0]])
+        stats = queue.get_stats()
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["processed"], 4)
+
+    def test_worker_pool(self):
+        pool = WorkerPool("test", 2)
+        requests = [SleepRequest() for _ in range(4)]
+        for request in requests:
+            pool.put(Request.PRIORITY_NORMAL, request)
+        for request in requests:
+            request.wait()
+        # The number of threads is bounded
+        stats = pool.get_stats()
+        self.assertEqual(stats["workers"], 2)
+        self.assertEqual(stats["processed"], 4)
+        self.assertGreater(stats["max_wait"], 1)
+
+        self.assertIs(get_worker_pool(Request.LANE_READ), get_worker_pool(Request.LANE_READ))
+        self.assertIn(Request.LANE_READ, get_lanes_stats())
+
 
 if __name__ == '__main__':
     unittest.main()
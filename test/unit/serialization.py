@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+#
+# IM - Infrastructure Manager
+# Copyright (C) 2011 - GRyCAP - Universitat Politecnica de Valencia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "../.."))
+
+from IM.serialization import DataSerializer, RadlFragments, LazyValue
+from IM.InfrastructureInfo import InfrastructureInfo
+from IM.VirtualMachine import VirtualMachine
+from IM.CloudInfo import CloudInfo
+from IM.auth import Authentication
+from radl.radl_parse import parse_radl
+from mock import patch, MagicMock
+
+
+class TestSerialization(unittest.TestCase):
+    """
+    Class to test the DataSerializer and RadlFragments classes
+    """
+
+    radl_data = """
+        network publica (outbound = 'yes')
+        system front (
+        cpu.count>=1 and
+        memory.size>=512m and
+        net_interface.0.connection = 'publica' and
+        disk.0.image.url = 'mock0://linux.for.ev.er'
+        )
+        configure front (
+@begin
+- tasks:
+  - debug: msg="Some large recipe"
+@end
+        )
+        deploy front 2
+    """
+
+    def test_serializer(self):
+        data = DataSerializer.dumps({"a": 1, "b": ["c"]})
+        self.assertTrue(DataSerializer.is_compressed(data))
+        self.assertEqual(DataSerializer.loads(data), {"a": 1, "b": ["c"]})
+        self.assertEqual(DataSerializer.loads(bytearray(data)), {"a": 1, "b": ["c"]})
+        # Old JSON format
+        self.assertFalse(DataSerializer.is_compressed('{"a": 1}'))
+        self.assertEqual(DataSerializer.loads('{"a": 1}'), {"a": 1})
+        self.assertEqual(DataSerializer.loads(b'{"a": 1}'), {"a": 1})
+
+    def test_radl_fragments(self):
+        radl = parse_radl(self.radl_data)
+        fragments = RadlFragments()
+        refs1 = fragments.add(radl)
+        refs2 = fragments.add(radl)
+        self.assertEqual(refs1, refs2)
+        self.assertEqual(len(fragments.fragments), len(refs1))
+        self.assertEqual(str(RadlFragments.parse(fragments.get(refs1))), str(parse_radl(str(radl))))
+        self.assertEqual(fragments.get("system s ( )"), ["system s ( )"])
+
+    def test_inf_serialization(self):
+        radl = parse_radl(self.radl_data)
+        inf = InfrastructureInfo()
+        inf.auth = Authentication([{'type': 'InfrastructureManager', 'username': 'user', 'password': 'pass'}])
+        inf.radl = radl
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        for num in range(2):
+            vm = VirtualMachine(inf, str(num), cloud, radl, radl, None, num)
+            inf.vm_list.append(vm)
+        inf.vm_master = inf.vm_list[0]
+
+        json_data = inf.serialize()
+        data = inf.serialize(compress=True)
+        self.assertTrue(DataSerializer.is_compressed(data))
+        self.assertLess(len(data), len(json_data))
+        # The RADL fragments must be stored only once
+        self.assertLess(len(DataSerializer.loads(data)['radl_fragments']), 2 * len(RadlFragments.split(radl)))
+
+        for inf_data in [json_data, data]:
+            new_inf = InfrastructureInfo.deserialize(inf_data)
+            self.assertEqual(new_inf.radl.systems[0].getValue("disk.0.image.url"), "mock0://linux.for.ev.er")
+            self.assertEqual(len(new_inf.vm_list), 2)
+            self.assertEqual(new_inf.vm_master, new_inf.vm_list[0])
+            self.assertEqual(new_inf.vm_list[1].id, "1")
+            self.assertEqual(len(new_inf.vm_list[1].info.configures), 1)
+            self.assertEqual(new_inf.vm_list[1].requested_radl.deploys[0].vm_number, 2)
+
+        header, vms = inf.serialize_rows()
+        new_inf = InfrastructureInfo.deserialize(header, [vm_data for _, vm_data in vms])
+        self.assertEqual(len(new_inf.vm_list), 2)
+        self.assertEqual(new_inf.vm_list[0].info.networks[0].id, "publica")
+        self.assertEqual(new_inf.vm_list[0].cloud.type, "Dummy")
+
+        auth_inf = InfrastructureInfo.deserialize_auth(header)
+        self.assertEqual(auth_inf.auth.getAuthInfo("InfrastructureManager")[0]['username'], "user")
+
+    def test_lazy_deserialization(self):
+        radl = parse_radl(self.radl_data)
+        inf = InfrastructureInfo()
+        inf.radl = radl
+        tosca = MagicMock()
+        tosca.serialize.return_value = "tosca"
+        inf.extra_info = {"TOSCA": tosca}
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        inf.vm_list.append(VirtualMachine(inf, "0", cloud, radl, radl, None, 0))
+        inf.vm_list[0].configured = False
+        header, vms = inf.serialize_rows()
+
+        with patch('IM.tosca.Tosca.Tosca.deserialize') as tosca_deserialize:
+            tosca_deserialize.return_value = "tosca_obj"
+            new_inf = InfrastructureInfo.deserialize(header, [vm_data for _, vm_data in vms])
+            # Nothing has been parsed yet
+            self.assertIsInstance(new_inf.__dict__['radl'], LazyValue)
+            self.assertIsInstance(new_inf.__dict__['extra_info'], LazyValue)
+            self.assertIsInstance(new_inf.vm_list[0].__dict__['info'], LazyValue)
+            self.assertEqual(tosca_deserialize.call_count, 0)
+            # The unparsed data is stored as is
+            new_header, new_vms = new_inf.serialize_rows()
+            self.assertEqual(new_vms, vms)
+            self.assertEqual(DataSerializer.loads(new_header)['radl'], DataSerializer.loads(header)['radl'])
+            self.assertEqual(DataSerializer.loads(new_header)['extra_info'], {"TOSCA": "tosca"})
+
+            self.assertEqual(new_inf.vm_list[0].info.systems[0].name, "front")
+            self.assertNotIsInstance(new_inf.vm_list[0].__dict__['info'], LazyValue)
+            self.assertIsInstance(new_inf.vm_list[0].__dict__['requested_radl'], LazyValue)
+            self.assertEqual(new_inf.radl.systems[0].name, "front")
+            self.assertEqual(new_inf.extra_info["TOSCA"], "tosca_obj")
+            self.assertEqual(tosca_deserialize.call_count, 1)
+            new_inf.radl = parse_radl("system other ()")
+            self.assertEqual(new_inf.radl.systems[0].name, "other")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@
 
 import os
 import time
+import threading
 import logging
 import unittest
 import sys
@@ -44,7 +45,11 @@ from radl.radl_json import parse_radl as parse_radl_json
 from IM.CloudInfo import CloudInfo
 from IM.connectors.CloudConnector import CloudConnector
 from IM.SSH import SSH
-from IM.InfrastructureInfo import InfrastructureInfo
+from IM.InfrastructureInfo import InfrastructureInfo, IncorrectVMException
+from IM.db import DataBase
+from IM.serialization import DataSerializer
+from IM.events import ChangeEvents
+from IM.admission import AdmissionControl, BusyException
 
 
 def read_file_as_string(file_name):
@@ -238,6 +243,42 @@ class TestIM(unittest.TestCase):
                       " are asked to be deployed in different cloud providers",
                       str(ex.exception))
 
+    def test_inf_creation_admission(self):
+        """Create infrastructure with the admission control"""
+
+        radl = """
+            network publica (outbound = 'yes')
+            system front (
+            cpu.count>=1 and
+            memory.size>=512m and
+            net_interface.0.connection = 'publica' and
+            disk.0.image.url = 'mock0://linux.for.ev.er' and
+            disk.0.os.credentials.username = 'ubuntu' and
+            disk.0.os.credentials.password = 'yoyoyo' and
+            disk.0.os.name = 'linux'
+            )
+            deploy front 1 cloud1
+        """
+
+        auth0 = self.getAuth([0], [], [("Dummy", 0), ("Dummy", 1)])
+        with patch('IM.InfrastructureManager.AdmissionControl.admit', side_effect=AdmissionControl.admit) as admit:
+            infId = IM.CreateInfrastructure(radl, auth0)
+            # Only the slots of the cloud selected to launch the VMs are acquired
+            self.assertEqual([[cloud.id for cloud in (call[0][1] if len(call[0]) > 1 else [])]
+                              for call in admit.call_args_list], [[], [], ["cloud1"]])
+
+            admit.reset_mock()
+            IM.DestroyInfrastructure(infId, auth0)
+            self.assertEqual([cloud.id for cloud in admit.call_args[0][1]], ["cloud1"])
+
+        # The credentials are checked before waiting for a slot
+        with patch('IM.InfrastructureManager.AdmissionControl.admit', side_effect=BusyException()):
+            with self.assertRaises(Exception) as ex:
+                IM.CreateInfrastructure(radl, self.getAuth([], [], [("Dummy", 0)]))
+            self.assertEqual(str(ex.exception), "No credentials provided for the InfrastructureManager.")
+            with self.assertRaises(BusyException):
+                IM.CreateInfrastructure(radl, auth0)
+
     def test_00_inf_creation_errors(self):
         """Create infrastructure with errors"""
 
@@ -719,6 +760,29 @@ class TestIM(unittest.TestCase):
         self.assertNotIn("TESTMSG", header_contmsg)
         self.assertIn("Header", header_contmsg)
 
+        InfrastructureList.infrastructure_list[infId].vm_list[0].cont_out = "VM line1\nVM line2\n"
+        contmsg = IM.GetInfrastructureContMsg(infId, auth0)
+        chunks, offset = IM.GetInfrastructureContMsgFragment(infId, auth0, offset=3)
+        self.assertEqual("".join(chunks), contmsg[3:])
+        chunks, cursor = IM.GetInfrastructureContMsgFragment(infId, auth0, offset=offset)
+        self.assertEqual(chunks, [])
+        chunks, offset = IM.GetInfrastructureContMsgFragment(infId, auth0, tail=3)
+        self.assertEqual("".join(chunks), "VM line2\n\n" + "*" * 75 + "\n")
+        chunks, offset = IM.GetVMContMsgFragment(infId, "0", auth0, tail=1)
+        self.assertEqual("".join(chunks), "VM line2\n")
+        self.assertEqual(offset, len("VM line1\nVM line2\n"))
+        # The logs of the Inf and the VMs grow in the middle of the cont msg
+        InfrastructureList.infrastructure_list[infId].add_cont_msg("Inf line")
+        InfrastructureList.infrastructure_list[infId].vm_list[0].cont_out += "VM line3\n"
+        chunks, cursor = IM.GetInfrastructureContMsgFragment(infId, auth0, offset=cursor)
+        fragment = "".join(chunks)
+        self.assertTrue(fragment.endswith(" Inf line\nVM 0:\nVM line3\n\n" + "*" * 75 + "\n"))
+        self.assertNotIn("Header", fragment)
+        self.assertNotIn("VM line2", fragment)
+        chunks, cursor = IM.GetInfrastructureContMsgFragment(infId, auth0, offset=cursor)
+        self.assertEqual(chunks, [])
+        InfrastructureList.infrastructure_list[infId].vm_list[0].cont_out = ""
+
         state = IM.GetInfrastructureState(infId, auth0)
         self.assertEqual(state["state"], "running")
         self.assertEqual(state["vm_states"]["0"], "running")
@@ -729,6 +793,39 @@ class TestIM(unittest.TestCase):
 
         IM.DestroyInfrastructure(infId, auth0)
 
+    def test_get_vms_info(self):
+        """
+        Test GetVMsInfo.
+        """
+        radl = RADL()
+        radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er"),
+                               Feature("disk.0.os.credentials.username", "=", "user"),
+                               Feature("disk.0.os.credentials.password", "=", "pass")]))
+        radl.add(deploy("s0", 3))
+
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        infId = IM.CreateInfrastructure(str(radl), auth0)
+
+        # Force the update of the VMs info
+        for vm in InfrastructureList.infrastructure_list[infId].vm_list:
+            vm.last_update = 0
+        with patch('IM.connectors.Dummy.DummyCloudConnector.updateVMInfo') as updateVMInfo:
+            updateVMInfo.side_effect = lambda vm, auth: (True, vm)
+            vms_info = IM.GetVMsInfo(infId, None, auth0)
+            self.assertEqual(updateVMInfo.call_count, 3)
+        self.assertEqual(sorted(vms_info.keys()), ["0", "1", "2"])
+        self.assertEqual(vms_info["1"].systems[0].getValue("state"), "running")
+
+        vms_info = IM.GetVMsInfo(infId, "0,2", auth0, True)
+        self.assertEqual(sorted(vms_info.keys()), ["0", "2"])
+        self.assertEqual(parse_radl_json(vms_info["2"]).systems[0].getValue("disk.0.image.url"),
+                         "mock0://linux.for.ev.er")
+
+        with self.assertRaises(IncorrectVMException):
+            IM.GetVMsInfo(infId, ["0", "5"], auth0)
+
+        IM.DestroyInfrastructure(infId, auth0)
+
     @patch('IM.InfrastructureList.InfrastructureList.get_inf_ids')
     def test_get_inf_state(self, get_inf_ids):
         """
@@ -744,6 +841,7 @@ class TestIM(unittest.TestCase):
         inf.deleted = False
         inf.deleting = False
         inf.has_expired.return_value = False
+        inf.get_aggregated_state.side_effect = lambda vm_list: InfrastructureInfo.get_aggregated_state(inf, vm_list)
         vm1 = MagicMock()
         vm1.im_id = 0
         vm1.state = VirtualMachine.RUNNING
@@ -798,6 +896,159 @@ class TestIM(unittest.TestCase):
         state = IM.GetInfrastructureState("1", auth0)
         self.assertEqual(state["state"], "pending")
 
+    @patch('IM.InfrastructureList.InfrastructureList.get_inf_ids')
+    @patch.object(Config, "VM_INFO_UPDATE_TIMEOUT", 0.5)
+    def test_get_inf_state_timeout(self, get_inf_ids):
+        """
+        Test GetInfrastructureState with VMs that are not updated in time.
+        """
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+
+        inf = MagicMock()
+        get_inf_ids.return_value = ["1"]
+        InfrastructureList.infrastructure_list = {"1": inf}
+        inf.id = "1"
+        inf.auth = auth0
+        inf.deleted = False
+        inf.deleting = False
+        inf.has_expired.return_value = False
+        inf.get_aggregated_state.side_effect = lambda vm_list: InfrastructureInfo.get_aggregated_state(inf, vm_list)
+        vms = []
+        for i in range(10):
+            vm = MagicMock()
+            vm.im_id = i
+            vm.state = VirtualMachine.RUNNING
+            vm.update_status.side_effect = lambda auth: time.sleep(0.2)
+            vms.append(vm)
+        vms[3].update_status.side_effect = lambda auth: time.sleep(2)
+        inf.get_vm_list.return_value = vms
+
+        before = time.time()
+        state = IM.GetInfrastructureState("1", auth0)
+        self.assertLess(time.time() - before, 1.5)
+        self.assertEqual(state["state"], "running")
+        self.assertEqual(state["stale"], ["3"])
+        for vm in vms:
+            self.assertEqual(vm.update_status.call_count, 1)
+
+    @patch('IM.InfrastructureList.InfrastructureList.get_inf_ids')
+    @patch.object(Config, "VM_INFO_UPDATE_TIMEOUT", 30)
+    def test_wait_inf_state_timeout(self, get_inf_ids):
+        """
+        Test the wait for a change of an Inf with VMs that are not updated in time.
+        """
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+
+        inf = MagicMock()
+        get_inf_ids.return_value = ["1"]
+        InfrastructureList.infrastructure_list = {"1": inf}
+        inf.id = "1"
+        inf.auth = auth0
+        inf.deleted = False
+        inf.deleting = False
+        inf.has_expired.return_value = False
+        vms = []
+        for i in range(4):
+            vm = MagicMock()
+            vm.im_id = i
+            vm.state = VirtualMachine.RUNNING
+            vm.update_status.side_effect = lambda auth: time.sleep(0.1)
+            vms.append(vm)
+        vms[2].update_status.side_effect = lambda auth: time.sleep(3)
+        inf.get_vm_list.return_value = vms
+
+        # The VMs are updated in parallel and the wait ends in time although a VM is not updated
+        before = time.time()
+        IM._wait_infrastructure_change(inf, auth0, ChangeEvents.get_version("1"), 1)
+        self.assertLess(time.time() - before, 2)
+        for vm in vms:
+            self.assertGreaterEqual(vm.update_status.call_count, 1)
+
+    def test_wait_inf_state(self):
+        """
+        Test GetInfrastructureState waiting for a change.
+        """
+        radl = RADL()
+        radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er"),
+                               Feature("disk.0.os.credentials.username", "=", "user"),
+                               Feature("disk.0.os.credentials.password", "=", "pass")]))
+        radl.add(deploy("s0", 1))
+
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        infId = IM.CreateInfrastructure(str(radl), auth0)
+        state = IM.GetInfrastructureState(infId, auth0)
+        self.assertEqual(state["state"], "running")
+
+        # Without changes it returns when the timeout expires
+        start = time.time()
+        new_state = IM.GetInfrastructureState(infId, auth0, state["version"], 1)
+        self.assertGreaterEqual(time.time() - start, 1)
+        self.assertEqual(new_state["version"], state["version"])
+
+        def stop_vm():
+            time.sleep(0.5)
+            InfrastructureList.infrastructure_list[infId].vm_list[0].state = VirtualMachine.STOPPED
+
+        t = threading.Thread(target=stop_vm)
+        t.start()
+        start = time.time()
+        new_state = IM.GetInfrastructureState(infId, auth0, state["version"], 10)
+        t.join()
+        self.assertLess(time.time() - start, 10)
+        self.assertGreater(new_state["version"], state["version"])
+        self.assertEqual(new_state["state"], "stopped")
+
+        IM.DestroyInfrastructure(infId, auth0)
+
+    def test_get_inf_etag(self):
+        """
+        Test the entity tag of the content of an Inf.
+        """
+        radl = RADL()
+        radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er"),
+                               Feature("disk.0.os.credentials.username", "=", "user"),
+                               Feature("disk.0.os.credentials.password", "=", "pass")]))
+        radl.add(deploy("s0", 1))
+
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        infId = IM.CreateInfrastructure(str(radl), auth0)
+        inf = InfrastructureList.infrastructure_list[infId]
+        vm = inf.vm_list[0]
+
+        etag = IM.GetInfrastructureETag(infId, auth0, True, "state")
+        self.assertEqual(IM.GetInfrastructureETag(infId, auth0, True, "state"), etag)
+        self.assertEqual(IM.GetInfrastructureETag(infId, auth0, ["0"], "state"), etag)
+        # Other representation of the same content
+        self.assertNotEqual(IM.GetInfrastructureETag(infId, auth0, None, "radl"), etag)
+
+        # Any change of the content changes the tag
+        vm.state = VirtualMachine.STOPPED
+        new_etag = IM.GetInfrastructureETag(infId, auth0, None, "state")
+        self.assertNotEqual(new_etag, etag)
+        etag = new_etag
+
+        vm.cont_out += "Some output\n"
+        new_etag = IM.GetInfrastructureETag(infId, auth0, None, "state")
+        self.assertNotEqual(new_etag, etag)
+        etag = new_etag
+
+        # Saving the Inf without changes does not change the tag
+        InfrastructureList.save_data(infId, True)
+        etag = IM.GetInfrastructureETag(infId, auth0, None, "state")
+        InfrastructureList.save_data(infId, True)
+        self.assertEqual(IM.GetInfrastructureETag(infId, auth0, None, "state"), etag)
+        inf.radl.add(system("s1"))
+        InfrastructureList.save_data(infId, True)
+        new_etag = IM.GetInfrastructureETag(infId, auth0, None, "state")
+        self.assertNotEqual(new_etag, etag)
+        etag = new_etag
+
+        # A change stored in the DB by other IM process
+        with patch('IM.InfrastructureInfo.InfrastructureInfo.get_db_version', return_value=5):
+            self.assertNotEqual(IM.GetInfrastructureETag(infId, auth0, None, "state"), etag)
+
+        IM.DestroyInfrastructure(infId, auth0)
+
     def test_altervm(self):
         """Test AlterVM"""
         radl = RADL()
@@ -844,6 +1095,41 @@ class TestIM(unittest.TestCase):
 
         IM.DestroyInfrastructure(infId, auth0)
 
+    def test_altervm_evicted(self):
+        """Test that the changes of AlterVM are saved if the Inf is evicted from memory meanwhile"""
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        radl = RADL()
+        radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er"),
+                               Feature("disk.0.os.credentials.username", "=", "user"),
+                               Feature("disk.0.os.credentials.password", "=", "pass"),
+                               Feature("cpu.count", "=", 1)]))
+        radl.add(deploy("s0", 1))
+
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        infId = IM.CreateInfrastructure(str(radl), auth0)
+        inf = InfrastructureList.infrastructure_list[infId]
+
+        alter = VirtualMachine.alter
+        for reload_inf in [False, True]:
+            def alter_and_evict(vm, radl, auth):
+                res = alter(vm, radl, auth)
+                InfrastructureList.infrastructure_list.pop(infId)
+                if reload_inf:
+                    # Other request loads the Inf again from the DB
+                    self.assertIsNot(InfrastructureList.get_infrastructure(infId), inf)
+                return res
+
+            cpus = 3 if reload_inf else 2
+            with patch.object(VirtualMachine, "alter", alter_and_evict):
+                IM.AlterVM(infId, "0", "system s0 ( cpu.count = %d and memory.size = 512M )" % cpus, auth0)
+
+            self.assertIs(InfrastructureList.infrastructure_list[infId], inf)
+            db_inf = InfrastructureList._get_data_from_db(Config.DATA_DB, infId)[infId]
+            self.assertEqual(db_inf.vm_list[0].info.systems[0].getValue("cpu.count"), cpus)
+
+        IM.DestroyInfrastructure(infId, auth0)
+
     def test_start_stop(self):
         """Test Start and Stop operations"""
         radl = RADL()
@@ -1205,6 +1491,409 @@ configure step2 (
         self.assertEqual(res['1'].vm_master.info.systems[0].getValue("disk.0.image.url"), "mock0://linux.for.ev.er")
         self.assertTrue(res['1'].auth.compare(inf.auth, "InfrastructureManager"))
 
+    def test_db_vm_rows(self):
+        """ Test that only the changed rows are stored in the DB """
+        inf = InfrastructureInfo()
+        inf.id = "1"
+        inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        radl = RADL()
+        radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er")]))
+        radl.add(deploy("s0", 1))
+        vm1 = VirtualMachine(inf, "1", cloud, radl, radl, None, 1)
+        vm2 = VirtualMachine(inf, "2", cloud, radl, radl, None, 2)
+        inf.vm_list = [vm1, vm2]
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+
+        with InfrastructureList.get_db_pool().connection() as db:
+            # Store an old format blob
+            db.execute("replace into inf_list (id, deleted, data, date) values (%s, %s, %s, now())",
+                       (inf.id, 0, inf.serialize()))
+            db.execute("delete from vm_list where inf_id = %s", (inf.id,))
+
+        res = InfrastructureList._get_data_from_db(Config.DATA_DB, "1")
+        self.assertEqual(len(res['1'].vm_list), 2)
+
+        # Save it in the new format
+        success = InfrastructureList._save_data_to_db(Config.DATA_DB, res)
+        self.assertTrue(success)
+        with InfrastructureList.get_db_pool().connection() as db:
+            rows = db.select("select vm_id, version from vm_list where inf_id = %s order by vm_id", (inf.id,))
+            self.assertEqual(rows, [(1, 1), (2, 1)])
+            data = db.select("select data from inf_list where id = %s", (inf.id,))[0][0]
+            self.assertTrue(DataSerializer.is_compressed(data))
+            self.assertNotIn('vm_list', DataSerializer.loads(data))
+
+        inf = InfrastructureList._get_data_from_db(Config.DATA_DB, "1")['1']
+        self.assertEqual(len(inf.vm_list), 2)
+        self.assertEqual(inf.vm_list[1].id, "2")
+
+        InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": inf})
+        # Only the modified VMs (and the version of the header) must be written
+        inf.vm_list[1].state = VirtualMachine.RUNNING
+        inf.vm_list[0].destroy = True
+        with patch('IM.db.DataBase.execute', autospec=True, side_effect=DataBase.execute) as execute:
+            InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": inf})
+            self.assertEqual(execute.call_count, 3)
+            InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": inf})
+            self.assertEqual(execute.call_count, 3)
+
+        with InfrastructureList.get_db_pool().connection() as db:
+            rows = db.select("select vm_id, version from vm_list where inf_id = %s order by vm_id", (inf.id,))
+            self.assertEqual(rows, [(1, 2), (2, 2)])
+
+        # Removed VMs must be deleted from the DB
+        inf.vm_list = inf.vm_list[1:]
+        InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": inf})
+        res = InfrastructureList._get_data_from_db(Config.DATA_DB, "1")
+        self.assertEqual(len(res['1'].vm_list), 1)
+        self.assertEqual(res['1'].vm_list[0].state, VirtualMachine.RUNNING)
+
+    def test_db_version(self):
+        """ Test the versioning of the Infs shared by several IM nodes """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        inf = InfrastructureInfo()
+        inf.id = "1"
+        inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+        InfrastructureList.add_infrastructure(inf)
+        InfrastructureList.save_data("1", sync=True)
+        self.assertEqual(inf.get_db_version(), 1)
+        self.assertEqual(InfrastructureList._get_inf_version_from_db("1"), 1)
+
+        # The same Inf loaded in other IM node
+        other_inf = InfrastructureList._get_data_from_db(Config.DATA_DB, "1")["1"]
+        self.assertEqual(other_inf.get_db_version(), 1)
+        other_inf.vm_master = None
+        other_inf.radl = parse_radl("system s0 ()")
+        self.assertTrue(InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": other_inf}))
+        self.assertEqual(other_inf.get_db_version(), 2)
+
+        # The header and the VM rows are written in a single transaction
+        other_inf.radl = parse_radl("system s2 ()")
+        with patch('IM.InfrastructureList.InfrastructureList._save_vm_rows_to_db', side_effect=Exception("error")):
+            with self.assertRaises(Exception):
+                InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": other_inf})
+        self.assertEqual(InfrastructureList._get_inf_version_from_db("1"), 2)
+        self.assertEqual(other_inf.get_db_version(), 2)
+        other_inf.radl = parse_radl("system s0 ()")
+
+        # The changes of the first node are not stored over the other ones
+        inf.radl = parse_radl("system s1 ()")
+        self.assertFalse(InfrastructureList._save_data_to_db(Config.DATA_DB, {"1": inf}))
+        self.assertEqual(inf.get_db_version(), 1)
+        # The stale copy is evicted from memory and the sync saves report the conflict
+        self.assertNotIn("1", InfrastructureList.infrastructure_list)
+        with self.assertRaises(Exception) as ex:
+            InfrastructureList.save_data(inf, sync=True)
+        self.assertIn("modified by other IM node", str(ex.exception))
+        self.assertNotIn("1", InfrastructureList.infrastructure_list)
+
+        with patch('IM.InfrastructureInfo.InfrastructureInfo.has_expired', return_value=True):
+            with patch('IM.InfrastructureList.InfrastructureList._get_data_from_db',
+                       side_effect=InfrastructureList._get_data_from_db) as get_data_from_db:
+                # The expired Inf must be reloaded as it has been modified
+                new_inf = InfrastructureList.get_infrastructure("1")
+                self.assertIsNot(new_inf, inf)
+                self.assertEqual(new_inf.radl.systems[0].name, "s0")
+                self.assertEqual(get_data_from_db.call_count, 1)
+                # But not if the version has not changed
+                self.assertIs(InfrastructureList.get_infrastructure("1"), new_inf)
+                self.assertEqual(get_data_from_db.call_count, 1)
+
+        InfrastructureList._reinit()
+
+    def test_archive_deleted_infs(self):
+        """ Test that the deleted Infs are moved to the archive table """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        infs = {}
+        for inf_id in ["1", "2", "3"]:
+            inf = InfrastructureInfo()
+            inf.id = inf_id
+            inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+            radl = RADL()
+            radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er")]))
+            inf.vm_list = [VirtualMachine(inf, "1", cloud, radl, radl, None, 1)]
+            inf.deleted = inf_id != "2"
+            infs[inf_id] = inf
+        InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+        InfrastructureList.save_cont_msg_chunk("1", -1, 0, "log")
+
+        with InfrastructureList.get_db_pool().connection() as db:
+            self.assertTrue(db.index_exists("inf_list", "inf_list_deleted"))
+            # Only Infs deleted before the retention period must be archived
+            self.assertEqual(InfrastructureList.archive_deleted_infs(3600), 0)
+            db.execute("update inf_list set date = '2000-01-01'")
+
+            self.assertEqual(InfrastructureList.archive_deleted_infs(3600, batch_size=1), 2)
+            self.assertEqual(db.select("select id from inf_list"), [("2",)])
+            self.assertEqual(db.select("select inf_id from vm_list"), [("2",)])
+            res = db.select("select id, date, data from inf_archive order by id")
+            self.assertEqual([(inf_id, date) for inf_id, date, _ in res], [("1", "2000-01-01"), ("3", "2000-01-01")])
+            data = DataSerializer.loads(res[0][2])
+            self.assertEqual(data["inf"]["id"], "1")
+            self.assertEqual(len(data["vms"]), 1)
+            # The parts of the logs stored in the DB are also archived
+            self.assertEqual(data["cont_msg"], {"-1": "log"})
+            self.assertEqual(db.select("select inf_id from cont_msg_list"), [])
+
+        InfrastructureList._reinit()
+
+    def test_get_inf_ids_by_owner(self):
+        """ Test that the Infs of a user are listed using the owner column """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        auth1 = self.getAuth([1], [], [("Dummy", 0)])
+        infs = {}
+        for inf_id, auth in [("1", auth0), ("2", auth1), ("3", auth0)]:
+            inf = InfrastructureInfo()
+            inf.id = inf_id
+            inf.auth = auth
+            infs[inf_id] = inf
+        InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+
+        with InfrastructureList.get_db_pool().connection() as db:
+            # Simulate an Inf stored by a previous version
+            db.execute("update inf_list set owner = null where id = %s", ("3",))
+            res = db.select("select id from inf_list where owner = %s", (InfrastructureList._get_owner(auth0),))
+            self.assertEqual(res, [("1",)])
+
+        with patch('IM.InfrastructureList.InfrastructureList._get_data_from_db',
+                   side_effect=InfrastructureList._get_data_from_db) as get_data_from_db:
+            self.assertEqual(sorted(InfrastructureList.get_inf_ids(auth0)), ["1", "3"])
+            self.assertEqual(sorted(InfrastructureList.get_inf_ids(auth1)), ["2"])
+            # Only the Inf without owner has been loaded
+            self.assertEqual(get_data_from_db.call_count, 1)
+            self.assertEqual(get_data_from_db.call_args[0][1], "3")
+
+        self.assertEqual(InfrastructureList.get_inf_ids(self.getAuth([2])), [])
+        self.assertIsNone(InfrastructureList._get_owner(Authentication([{'type': 'InfrastructureManager',
+                                                                          'username': 'user'}])))
+        InfrastructureList._reinit()
+
+    def test_get_inf_list_pages(self):
+        """ Test the pagination and the projections of the list of Infs """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        cloud = CloudInfo()
+        cloud.type = "Dummy"
+        infs = {}
+        for inf_id, created in [("1", 300), ("2", 100), ("3", 200), ("4", None)]:
+            inf = InfrastructureInfo()
+            inf.id = inf_id
+            inf.auth = auth0
+            inf.creation_date = created
+            radl = RADL()
+            radl.add(system("s0", [Feature("disk.0.image.url", "=", "mock0://linux.for.ev.er")]))
+            inf.vm_list = [VirtualMachine(inf, str(i), cloud, radl, radl, None, i) for i in range(int(inf_id))]
+            for vm in inf.vm_list:
+                vm.state = VirtualMachine.RUNNING
+            infs[inf_id] = inf
+        InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+        InfrastructureList._new_inf_caches()
+
+        # Sorted by creation date, the Infs without date are the oldest ones
+        self.assertEqual(IM.GetInfrastructureList(auth0), ["1", "3", "2", "4"])
+        self.assertEqual(IM.GetInfrastructureList(auth0, limit=2), ["1", "3"])
+        self.assertEqual(IM.GetInfrastructureList(auth0, limit=2, after="3"), ["2", "4"])
+        self.assertEqual(IM.GetInfrastructureList(auth0, after="4"), [])
+        with self.assertRaises(Exception) as ex:
+            IM.GetInfrastructureList(auth0, after="5")
+        self.assertIn("Incorrect value in after parameter", str(ex.exception))
+
+        # The Inf used as cursor has been deleted
+        with InfrastructureList.get_db_pool().connection() as db:
+            db.execute("update inf_list set deleted = 1 where id = %s", ("3",))
+        self.assertEqual(IM.GetInfrastructureList(auth0, after="3"), ["2", "4"])
+
+        res = IM.GetInfrastructureList(auth0, limit=2, include="state,vm_count,creation_date")
+        self.assertEqual(res, [{"id": "1", "state": "running", "vm_count": 1, "creation_date": 300},
+                               {"id": "2", "state": "running", "vm_count": 2, "creation_date": 100}])
+        # The state and the number of VMs are got from the DB, without loading the Infs
+        self.assertNotIn("1", InfrastructureList.infrastructure_list)
+        self.assertNotIn("2", InfrastructureList.infrastructure_list)
+
+        # The Infs in memory use their current data
+        InfrastructureList.get_infrastructure("1").vm_list[0].state = VirtualMachine.STOPPED
+        res = IM.GetInfrastructureList(auth0, limit=1, include="state")
+        self.assertEqual(res, [{"id": "1", "state": "stopped"}])
+
+        # The Infs not stored since previous versions are loaded
+        with InfrastructureList.get_db_pool().connection() as db:
+            db.execute("update inf_list set state = null, vm_count = null where id = %s", ("2",))
+        res = IM.GetInfrastructureList(auth0, limit=1, after="1", include="state,vm_count")
+        self.assertEqual(res, [{"id": "2", "state": "running", "vm_count": 2}])
+        self.assertIn("2", InfrastructureList.infrastructure_list)
+        with self.assertRaises(Exception) as ex:
+            IM.GetInfrastructureList(auth0, include=["state", "other"])
+        self.assertIn("Invalid field other in include parameter", str(ex.exception))
+
+        # The page is sorted and limited in the DB
+        with patch('IM.InfrastructureList.InfrastructureList._get_inf_ids_by_owner_from_db',
+                   side_effect=InfrastructureList._get_inf_ids_by_owner_from_db) as get_inf_ids:
+            self.assertEqual(IM.GetInfrastructureList(auth0, limit=1, after="1"), ["2"])
+            self.assertEqual(get_inf_ids.call_args_list[0][0][2:], (1, (300, "1")))
+            self.assertEqual(get_inf_ids.call_count, 1)
+
+            # An Inf deleted in memory (not saved yet) is discarded before filling the page
+            InfrastructureList.get_infrastructure("1").deleted = True
+            get_inf_ids.reset_mock()
+            res = IM.GetInfrastructureList(auth0, limit=2, include="vm_count")
+            self.assertEqual(res, [{"id": "2", "vm_count": 2}, {"id": "4", "vm_count": 4}])
+            self.assertEqual(get_inf_ids.call_count, 2)
+        InfrastructureList._reinit()
+
+    def test_get_inf_ids_filter(self):
+        """ Test that the Infs are filtered using the search text stored in the DB """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        auth0 = self.getAuth([0], [], [("Dummy", 0)])
+        infs = {}
+        for inf_id, image in [("1", "one_image"), ("2", "two_image"), ("3", "one_image")]:
+            inf = InfrastructureInfo()
+            inf.id = inf_id
+            inf.auth = auth0
+            inf.radl = parse_radl("system s0 ( disk.0.image.url = 'mock0://%s' )" % image)
+            infs[inf_id] = inf
+        InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+
+        with InfrastructureList.get_db_pool().connection() as db:
+            # Simulate an Inf stored by a previous version
+            db.execute("update inf_list set search = null where id = %s", ("3",))
+
+        InfrastructureList._new_inf_caches()
+        with patch('IM.InfrastructureList.InfrastructureList._get_data_from_db',
+                   side_effect=InfrastructureList._get_data_from_db) as get_data_from_db:
+            self.assertEqual(InfrastructureList.get_inf_ids(auth0, "mock0://one_[a-z]+"), ["3", "1"])
+            # Only the Inf without search text has been loaded
+            self.assertEqual(get_data_from_db.call_count, 1)
+            self.assertEqual(get_data_from_db.call_args[0][1], "3")
+            self.assertEqual(InfrastructureList.get_inf_ids(auth0, "two|nonexist"), ["2"])
+            self.assertEqual(InfrastructureList.get_inf_ids(auth0, ".*nonexist.*"), [])
+
+        self.assertEqual(InfrastructureList._get_regex_literals(".*mock0://one_[a-z]+"), ["mock0://one_"])
+        self.assertEqual(InfrastructureList._get_regex_literals("(?i)one_image"), [])
+        self.assertEqual(InfrastructureList._escape_like("a_b%c!"), "a!_b!%c!!")
+        InfrastructureList._reinit()
+
+    def test_get_inf_on_demand(self):
+        """ Test that the Infs are loaded from the DB on demand """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        InfrastructureList._reinit()
+        infs = {}
+        for inf_id, configured in [("1", None), ("2", True)]:
+            inf = InfrastructureInfo()
+            inf.id = inf_id
+            inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+            inf.configured = configured
+            infs[inf_id] = inf
+        InfrastructureList._save_data_to_db(Config.DATA_DB, infs)
+
+        self.assertTrue(InfrastructureList.has_infrastructure("1"))
+        self.assertFalse(InfrastructureList.has_infrastructure("3"))
+        self.assertEqual(len(InfrastructureList.infrastructure_list), 0)
+
+        with patch('IM.InfrastructureList.InfrastructureList._get_data_from_db',
+                   side_effect=InfrastructureList._get_data_from_db) as get_data_from_db:
+            threads = [threading.Thread(target=InfrastructureList.get_infrastructure, args=("2",))
+                       for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            # Only loaded once
+            self.assertEqual(get_data_from_db.call_count, 1)
+            self.assertEqual(list(InfrastructureList.infrastructure_list.keys()), ["2"])
+            self.assertIsNone(InfrastructureList.get_infrastructure("3"))
+
+            # Only the Infs with the contextualization in progress are resumed
+            InfrastructureList._new_inf_caches()
+            InfrastructureList.resume_infrastructures(2).join()
+            self.assertEqual(list(InfrastructureList.infrastructure_list.keys()), ["1"])
+
+        InfrastructureList._reinit()
+
+    def test_inf_cache(self):
+        """ Test that the Infs in memory are bounded """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        with patch('IM.config.Config.INF_CACHE_SIZE', 2):
+            InfrastructureList._reinit()
+            for inf_id in ["1", "2", "3"]:
+                inf = InfrastructureInfo()
+                inf.id = inf_id
+                inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+                if inf_id == "1":
+                    inf.adding = True
+                InfrastructureList.add_infrastructure(inf)
+                InfrastructureList.save_data(inf_id, sync=True)
+
+            # The first one is pinned, so the second one is evicted
+            self.assertEqual(sorted(InfrastructureList.infrastructure_list.keys()), ["1", "3"])
+            inf = InfrastructureList.get_infrastructure("2")
+            self.assertEqual(inf.id, "2")
+            self.assertEqual(sorted(InfrastructureList.infrastructure_list.keys()), ["1", "2"])
+            InfrastructureList.get_infrastructure("2")
+            stats = InfrastructureList.get_cache_stats()["infrastructures"]
+            self.assertEqual(stats["evictions"], 2)
+            self.assertEqual(stats["hits"], 1)
+            self.assertEqual(stats["misses"], 1)
+
+            with patch('IM.InfrastructureManager.InfrastructureManager.logger') as logger:
+                IM.log_stats()
+                msg = logger.info.call_args[0][0]
+                self.assertTrue(msg.startswith("IM stats: "))
+                stats = json.loads(msg[10:])
+                self.assertEqual(stats["caches"]["infrastructures"]["evictions"], 2)
+                self.assertEqual(sorted(stats.keys()), ["admission", "caches", "poller", "requests"])
+
+        InfrastructureList._reinit()
+
+    def test_save_data_delayed(self):
+        """ Test that the delayed saves of an Inf are merged """
+        Config.DATA_DB = "sqlite:///tmp/ind.dat"
+        InfrastructureList.load_data()
+        inf = InfrastructureInfo()
+        inf.auth = self.getAuth([0], [], [("Dummy", 0)])
+        InfrastructureList.add_infrastructure(inf)
+
+        with patch('IM.InfrastructureList.InfrastructureList._save_data_to_db') as save_data_to_db:
+            save_data_to_db.return_value = True
+            with patch('IM.config.Config.SAVE_DATA_DELAY', 0.5):
+                InfrastructureList.save_data(inf.id)
+                InfrastructureList.save_data(inf.id)
+                self.assertEqual(save_data_to_db.call_count, 0)
+                time.sleep(1)
+                self.assertEqual(save_data_to_db.call_count, 1)
+                self.assertEqual(list(save_data_to_db.call_args[0][1].keys()), [inf.id])
+
+                InfrastructureList.save_data(inf.id)
+                InfrastructureList.flush()
+                self.assertEqual(save_data_to_db.call_count, 2)
+                # Nothing pending to save
+                InfrastructureList.flush()
+                self.assertEqual(save_data_to_db.call_count, 2)
+
+                # A sync save discards the pending one
+                InfrastructureList.save_data(inf.id)
+                InfrastructureList.save_data(inf.id, sync=True)
+                self.assertEqual(save_data_to_db.call_count, 3)
+                InfrastructureList.flush()
+                self.assertEqual(save_data_to_db.call_count, 3)
+
     def test_inf_remove_two_clouds(self):
         """ Test remove VMs from 2 cloud providers """
 
@@ -1290,11 +1979,11 @@ configure step2 (
         auth0 = self.getAuth([0])
         infId = IM.CreateInfrastructure("", auth0)
         inf = IM.get_infrastructure(infId, auth0)
-        inf.destroy_vms = Mock(side_effect=Exception())
-        with self.assertRaises(Exception):
-            IM.DestroyInfrastructure(infId, auth0)
-        self.assertEqual(inf.deleted, False)
-        IM.DestroyInfrastructure(infId, auth0, True)
+        with patch('IM.InfrastructureInfo.InfrastructureInfo.destroy_vms', side_effect=Exception()):
+            with self.assertRaises(Exception):
+                IM.DestroyInfrastructure(infId, auth0)
+            self.assertEqual(inf.deleted, False)
+            IM.DestroyInfrastructure(infId, auth0, True)
         self.assertEqual(inf.deleted, True)
 
     def sleep_5(self, _):